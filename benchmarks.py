@@ -0,0 +1,407 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+FEATURES = ['titrable_acidity', 'temperature', 'pH', 'conductivity']
+SEED = 42
+SUITES = ['parser', 'insert', 'storage', 'predict', 'realtime', 'serving', 'training']
+COUNTS = ('rows', 'lines', 'requests', 'clients', 'cpus', 'errors')
+# Changes smaller than this are treated as noise when comparing reports
+REGRESSION_PCT = 10
+
+
+def timed(fn, repeats=5, number=1):
+    """Median seconds per call of fn over `repeats` rounds of `number` calls."""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return float(np.median(samples))
+
+
+def load_readings(path='milk_data.csv'):
+    df = pd.read_csv(path, usecols=FEATURES + ['status'])
+    # Blank statuses get the parser's default, as they would in the service
+    df['status'] = df['status'].fillna('Unknown')
+    return df.dropna(subset=FEATURES).reset_index(drop=True)
+
+
+def bench_parser(readings, quick=False):
+    from sensor_protocol import legacy_parse, parse_buffer, parse_line
+    from simulator import format_line
+
+    lines = [format_line(*row[:4], str(row[4]).capitalize()) for row in readings.itertuples(index=False)]
+    lines = (lines * (2 if quick else 10))
+    buffer = ('\r\n'.join(lines) + '\r\n').encode()
+    n = len(lines)
+    return {
+        'lines': n,
+        'legacy_lines_per_s': n / timed(lambda: [legacy_parse(line) for line in lines]),
+        'parse_line_lines_per_s': n / timed(lambda: [parse_line(line) for line in lines]),
+        'parse_buffer_lines_per_s': n / timed(lambda: parse_buffer(buffer)),
+    }
+
+
+def write_through(connection, rows, batch_size=200, insert=None, device='bench'):
+    """Readings/s from SensorWriter.submit() until the last batch has committed."""
+    from sensor_writer import SensorWriter, insert_wide
+
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = SensorWriter(lambda: connection, lambda conn: None, csv_path=os.path.join(tmp, 'milk.csv'),
+                              batch_size=batch_size, flush_interval=0.05, max_queue=len(rows) + 1,
+                              insert=insert or insert_wide)
+        start = time.perf_counter()
+        writer.start()
+        for ta, temp, ph, cond, status in rows.itertuples(index=False):
+            writer.submit({'ta': ta, 'temp': temp, 'ph': ph, 'cond': cond, 'status': status, 'device_id': device})
+        while writer.snapshot()['written'] < len(rows):
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - start
+        writer.stop()
+    return len(rows) / elapsed
+
+
+def bench_insert(readings, quick=False):
+    """Readings/s through SensorWriter into the SQLite backend, with per-row commits
+    (how insert_sensor_data used to write) and with batching."""
+    from storage import SQLiteBackend
+
+    rows = readings.head(2000 if quick else len(readings))
+    report = {'rows': len(rows)}
+    for batch_size in (1, 200):
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = SQLiteBackend(os.path.join(tmp, 'milk.db'))
+            backend.init_schema()
+            connection = backend.connect()
+            report[f'batch{batch_size}_rows_per_s'] = write_through(connection, rows, batch_size)
+            connection.close()
+    return report
+
+
+def bench_storage(readings, quick=False):
+    """Writer throughput (per-reading and batched commits) and a one-day history query
+    per storage backend: SQLite as configured (WAL), SQLite with its default rollback
+    journal, and MySQL when CONFIG['db'] is reachable (rows are tagged and deleted
+    afterwards)."""
+    import history
+    from storage import MySQLBackend, SQLiteBackend
+
+    rows = readings.head(2000 if quick else len(readings))
+    end = datetime.now() + pd.Timedelta(minutes=1)
+    start = end - pd.Timedelta(days=1)
+    report = {'rows': len(rows)}
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            'sqlite_wal': SQLiteBackend(os.path.join(tmp, 'wal.db')),
+            'sqlite_default': SQLiteBackend(os.path.join(tmp, 'default.db'), tuned=False),
+        }
+        try:
+            backends['mysql'] = MySQLBackend()
+            backends['mysql'].connect().close()
+        except Exception as e:
+            backends.pop('mysql', None)
+            report['mysql'] = {'unavailable': str(e)}
+        for name, backend in backends.items():
+            insert = None
+            if backend.layout == 'normalised':
+                from bulk_ingest import insert_normalised as insert
+            backend.init_schema()
+            connection = backend.connect()
+            try:
+                result = {
+                    'batch1_rows_per_s': write_through(connection, rows, 1, insert, 'bench-storage'),
+                    'batch200_rows_per_s': write_through(connection, rows, 200, insert, 'bench-storage'),
+                }
+                result['history_query_ms'] = timed(
+                    lambda: history.query_buckets(connection, start, end, 60, use_rollups=False)) * 1000
+                report[name] = result
+            finally:
+                if name == 'mysql':
+                    cursor = connection.cursor()
+                    cursor.execute("DELETE FROM milk_test WHERE device_id = 'bench-storage'")
+                    connection.commit()
+                    cursor.close()
+                connection.close()
+    return report
+
+
+def bench_predict(readings, quick=False):
+    """Single-row and batch latency for every saved model, through sklearn and through
+    the compiled trees the service actually serves."""
+    from compiled_tree import compile_model
+    from model_bundle import load_bundle
+
+    models = {
+        'decision_tree': ('models training/decision_tree_model.pkl', joblib.load),
+        'bundle': ('milk_quality_bundle.joblib', lambda p: load_bundle(p, mmap_mode=None)),
+        'best_model': ('best_milk_quality_model.pkl', joblib.load),
+    }
+    X = readings[FEATURES].sample(n=min(1000, len(readings)), random_state=SEED).reset_index(drop=True)
+    row = X.iloc[:1]
+    values = row.to_numpy()
+    report = {}
+    for name, (path, loader) in models.items():
+        if not os.path.exists(path):
+            report[name] = {'missing': path}
+            continue
+        model = loader(path)
+        result = {
+            'sklearn_row_us': timed(lambda: model.predict(row), number=20 if quick else 100) * 1e6,
+            'sklearn_batch_us_per_row': timed(lambda: model.predict(X)) / len(X) * 1e6,
+        }
+        try:
+            compiled = compile_model(model)
+        except TypeError:
+            compiled = None
+        if compiled is not None:
+            result['compiled_row_us'] = timed(lambda: compiled.predict(values), number=1000) * 1e6
+            batch = X.to_numpy()[:compiled.BATCH_LIMIT]
+            result['compiled_batch_us_per_row'] = timed(lambda: compiled.predict(batch)) / len(batch) * 1e6
+        report[name] = result
+    return report
+
+
+def bench_realtime(readings, quick=False, clients=8):
+    """/api/realtime latency with several Flask test clients polling at once."""
+    from config import CONFIG
+
+    # The live service may be running on this checkout: leave its archive alone
+    CONFIG['archive']['readonly'] = True
+    import insert_data
+
+    insert_data.MODEL_REGISTRY.load_all()
+    for row in readings.head(insert_data.DATA_BUFFER.capacity).itertuples(index=False):
+        insert_data.DATA_BUFFER.append(
+            {'ta': row[0], 'temp': row[1], 'ph': row[2], 'cond': row[3]}, row[4], device='bench')
+    requests_per_client = 50 if quick else 300
+    latencies = [[] for _ in range(clients)]
+
+    def poll(samples):
+        client = insert_data.app.test_client()
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = client.get('/api/realtime?limit=20')
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200
+
+    threads = [threading.Thread(target=poll, args=(samples,)) for samples in latencies]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    flat = np.concatenate([np.asarray(s) for s in latencies]) * 1000
+    p50, p99 = np.percentile(flat, [50, 99])
+    return {
+        'clients': clients,
+        'requests': len(flat),
+        'requests_per_s': len(flat) / elapsed,
+        'p50_ms': p50,
+        'p99_ms': p99,
+    }
+
+
+def load_client(port, path, duration, start_event, results):
+    # One keep-alive connection per client process, so the clients are not GIL-bound
+    import http.client
+
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    latencies = []
+    errors = 0
+    start_event.wait()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    results.put((latencies, errors))
+
+
+def bench_serving(readings, quick=False, workers=(1, 2, 4), clients=8):
+    """/api/realtime requests/s against serve.py's worker processes reading a shared
+    ring filled with `readings`, for each worker count, from `clients` client processes."""
+    import multiprocessing
+
+    from serve import WorkerPool, listen
+    from shared_ring import SharedReadingRingBuffer, check_platform
+
+    try:
+        check_platform()
+    except RuntimeError as e:
+        return {'skipped': str(e)}
+    duration = 3.0 if quick else 10.0
+    ring = SharedReadingRingBuffer.create(f'milk_bench_{os.getpid()}', ('ta', 'temp', 'ph', 'cond'))
+    for row in readings.head(ring.capacity).itertuples(index=False):
+        # The status doubles as the prediction: workers only decode what ingest stored
+        ring.append({'ta': row[0], 'temp': row[1], 'ph': row[2], 'cond': row[3]}, row[4], device='bench',
+                    prediction=row[4])
+    # Forked: the clients need nothing but http.client and start in milliseconds
+    context = multiprocessing.get_context('fork')
+    report = {'clients': clients, 'cpus': os.cpu_count()}
+    try:
+        for n in workers:
+            sock = listen('127.0.0.1', 0)
+            pool = WorkerPool(sock, ring.name, n, access_log=False)
+            try:
+                pool.start()
+                pool.wait_ready()
+                results = context.Queue()
+                start_event = context.Event()
+                procs = [context.Process(target=load_client, args=(sock.getsockname()[1], '/api/realtime?limit=20',
+                                                                   duration, start_event, results))
+                         for _ in range(clients)]
+                for proc in procs:
+                    proc.start()
+                start_event.set()
+                outcomes = [results.get(timeout=duration + 60) for _ in procs]
+                for proc in procs:
+                    proc.join()
+            finally:
+                pool.stop()
+                sock.close()
+            flat = np.concatenate([np.asarray(latencies) for latencies, _ in outcomes]) * 1000
+            p50, p99 = np.percentile(flat, [50, 99])
+            report[f'workers_{n}'] = {
+                'requests': len(flat),
+                'errors': sum(errors for _, errors in outcomes),
+                'requests_per_s': len(flat) / duration,
+                'p50_ms': p50,
+                'p99_ms': p99,
+            }
+    finally:
+        ring.close()
+        ring.unlink()
+    return report
+
+
+def bench_training(quick=False):
+    """Wall time of the model fits the training scripts run, on cleaned_milk_data.csv."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.tree import DecisionTreeClassifier
+
+    from model_selection import Candidate, select_model
+
+    df = pd.read_csv('cleaned_milk_data.csv', usecols=FEATURES + ['status']).dropna()
+    X, y = df[FEATURES].to_numpy(), df['status'].astype(str).str.upper().to_numpy()
+    repeats = 1 if quick else 3
+    report = {
+        'rows': len(df),
+        'decision_tree_fit_s': timed(lambda: DecisionTreeClassifier(random_state=SEED).fit(X, y), repeats),
+        'random_forest_fit_s': timed(lambda: RandomForestClassifier(random_state=SEED).fit(X, y), repeats),
+    }
+    candidates = [
+        Candidate('decision_tree', DecisionTreeClassifier(random_state=SEED), {'max_depth': [5, 10, None]}),
+        Candidate('random_forest', RandomForestClassifier(random_state=SEED), {'n_estimators': [50]}),
+    ]
+    report['select_model_s'] = timed(lambda: select_model(X, y, candidates, n_splits=3, seed=SEED), 1)
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(suites=SUITES, quick=False):
+    readings = load_readings()
+    runners = {
+        'parser': lambda: bench_parser(readings, quick),
+        'insert': lambda: bench_insert(readings, quick),
+        'storage': lambda: bench_storage(readings, quick),
+        'predict': lambda: bench_predict(readings, quick),
+        'realtime': lambda: bench_realtime(readings, quick),
+        'serving': lambda: bench_serving(readings, quick),
+        'training': lambda: bench_training(quick),
+    }
+    results = {}
+    for suite in suites:
+        np.random.seed(SEED)
+        start = time.perf_counter()
+        results[suite] = runners[suite]()
+        print(f"{suite}: done in {time.perf_counter() - start:.1f}s")
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'quick': quick,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'sklearn': sklearn.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+def flatten(results, prefix=''):
+    out = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            out.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)):
+            out[name] = value
+    return out
+
+
+def compare(old, new):
+    """Per-metric change between two reports. Throughput (`_per_s`) regresses when it
+    falls; everything else is a time and regresses when it rises."""
+    before, after = flatten(old['results']), flatten(new['results'])
+    print(f"\n{'metric':<55} {old['meta']['commit'] or 'old':>12} {new['meta']['commit'] or 'new':>12}  change")
+    for name in sorted(before.keys() & after.keys()):
+        a, b = before[name], after[name]
+        # Input sizes are context, not measurements
+        if not a or name.rsplit('.', 1)[-1] in COUNTS:
+            continue
+        change = (b - a) / a * 100
+        worse = change < 0 if name.endswith('_per_s') else change > 0
+        flag = '  <-- slower' if worse and abs(change) > REGRESSION_PCT else ''
+        print(f"{name:<55} {a:>12.4g} {b:>12.4g}  {change:+6.1f}%{flag}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the ingest, inference, API and training hot paths")
+    parser.add_argument('--only', default=','.join(SUITES), help=f"comma-separated subset of {SUITES}")
+    parser.add_argument('--quick', action='store_true', help="smaller inputs and fewer repeats")
+    parser.add_argument('-o', '--output', default='benchmark_report.json')
+    parser.add_argument('--compare', help="earlier report to diff against")
+    args = parser.parse_args()
+
+    report = run([s for s in args.only.split(',') if s], args.quick)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Report saved as '{args.output}'")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
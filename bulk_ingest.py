@@ -0,0 +1,122 @@
+import argparse
+import itertools
+import logging
+import time
+from datetime import datetime
+
+import mysql.connector
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Rows per multi-row INSERT; keeps each statement well under max_allowed_packet
+CHUNK_ROWS = 1000
+
+# LAST_INSERT_ID(expr) hands the new value back in the OK packet (cursor.lastrowid),
+# so reserving a range is one round trip
+ALLOCATE_SQL = "UPDATE id_ranges SET next_id = LAST_INSERT_ID(next_id + %s) WHERE name = 'milk_test'"
+
+MILK_TEST_SQL = """
+    INSERT INTO milk_test (id, titrable_acidity, calculated_ta, status, is_simulated, device_id, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+TEMPERATURE_SQL = "INSERT INTO temperature (milk_test_id, temperature_value, created_at) VALUES (%s, %s, %s)"
+PH_SQL = "INSERT INTO ph (milk_test_id, ph_value, temperature_compensated, created_at) VALUES (%s, %s, %s, %s)"
+CONDUCTIVITY_SQL = "INSERT INTO conductivity (milk_test_id, conductivity_value, created_at) VALUES (%s, %s, %s)"
+
+
+def allocate_ids(cursor, n):
+    """Reserve n consecutive milk_test ids and return the first. The id_ranges row
+    stays locked until the transaction ends, so other writers (insert_sensor_data
+    included) queue behind it, and a rollback hands the range back."""
+    cursor.execute(ALLOCATE_SQL, (n,))
+    if cursor.rowcount != 1:
+        raise RuntimeError("id_ranges has no 'milk_test' row; see section 14 of milk_sensor_data.sql")
+    return cursor.lastrowid - n
+
+
+def insert_normalised(cursor, rows):
+    """Write writer rows (ta, temp, ph, cond, status, created_at, device_id) into
+    milk_test and its temperature/ph/conductivity tables with multi-row INSERTs.
+
+    The parent ids are reserved up front, so the child rows are built without reading
+    anything back: four statements per CHUNK_ROWS readings instead of four statements,
+    a LAST_INSERT_ID() and a commit per reading. Runs in the caller's transaction."""
+    if not rows:
+        return
+    first = allocate_ids(cursor, len(rows))
+    for offset in range(0, len(rows), CHUNK_ROWS):
+        chunk = list(zip(itertools.count(first + offset), rows[offset:offset + CHUNK_ROWS]))
+        cursor.executemany(MILK_TEST_SQL, [
+            (i, r[0], r[0], r[4], r[4] == 'Simulated', r[6], r[5]) for i, r in chunk])
+        cursor.executemany(TEMPERATURE_SQL, [(i, r[1], r[5]) for i, r in chunk])
+        # Same compensation the stored procedure applies
+        cursor.executemany(PH_SQL, [(i, r[2], r[2] + 0.03 * (r[1] - 20), r[5]) for i, r in chunk])
+        cursor.executemany(CONDUCTIVITY_SQL, [(i, r[3], r[5]) for i, r in chunk])
+
+
+def _next_id(cursor):
+    cursor.execute("SELECT next_id FROM id_ranges WHERE name = 'milk_test'")
+    return cursor.fetchone()[0]
+
+
+def benchmark(conn, rows=5000, batch_size=200):
+    """Rows/s into the normalised tables: one insert_sensor_data call per reading vs
+    insert_normalised per batch. Writes simulated rows to the configured database and
+    deletes them afterwards, so point it at a staging copy."""
+    from sensor_protocol import parse_line
+    from simulator import synthetic_lines
+
+    readings = [parse_line(line, 'bench-bulk') for line in itertools.islice(synthetic_lines(), rows)]
+    cursor = conn.cursor()
+    report = {'rows': rows, 'batch_size': batch_size}
+    start_id = _next_id(cursor)
+    conn.commit()
+    try:
+        start = time.perf_counter()
+        for r in readings:
+            cursor.callproc('insert_sensor_data', (r.ta, r.temp, None, r.ph, None, r.cond, None, 'Simulated', True))
+        report['procedure_rows_per_s'] = rows / (time.perf_counter() - start)
+
+        batch_rows = [(r.ta, r.temp, r.ph, r.cond, 'Simulated', datetime.now(), r.device_id) for r in readings]
+        start = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            insert_normalised(cursor, batch_rows[offset:offset + batch_size])
+            conn.commit()
+        report['bulk_rows_per_s'] = rows / (time.perf_counter() - start)
+        report['speedup'] = report['bulk_rows_per_s'] / report['procedure_rows_per_s']
+
+        # Every bulk reading must have all three child rows
+        cursor.execute("""
+            SELECT COUNT(*) FROM milk_test m
+            JOIN temperature t ON t.milk_test_id = m.id
+            JOIN ph p ON p.milk_test_id = m.id
+            JOIN conductivity c ON c.milk_test_id = m.id
+            WHERE m.device_id = 'bench-bulk' AND m.id >= %s
+        """, (start_id,))
+        report['bulk_rows_complete'] = cursor.fetchone()[0]
+    finally:
+        conn.rollback()
+        # The children go with their readings (ON DELETE CASCADE)
+        cursor.execute("DELETE FROM milk_test WHERE is_simulated AND id >= %s AND id < %s",
+                       (start_id, _next_id(cursor)))
+        conn.commit()
+        cursor.close()
+    return report
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Benchmark bulk ingest into the normalised schema against insert_sensor_data")
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=200)
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**CONFIG['db'])
+    try:
+        for key, value in benchmark(conn, args.rows, args.batch_size).items():
+            print(f"{key}: {value:,.1f}" if isinstance(value, float) else f"{key}: {value}")
+    finally:
+        conn.close()
@@ -1,13 +1,13 @@
 import pandas as pd
-import pymysql
 from sqlalchemy import create_engine
 
-# Connect to your database
-db_connection_str = 'mysql+pymysql://root:@localhost/milk_sensor_data'
-engine = create_engine(db_connection_str)
+from data_loading import database_url
+
+# Connect to the configured database (CONFIG['storage'])
+engine = create_engine(database_url())
 
 # Load the table
-df = pd.read_sql('SELECT * FROM milk_test', con=engine)
+df = pd.read_sql('SELECT * FROM milk_test LIMIT 5', con=engine)
 
 # Print all column names
 print(df.columns)
@@ -0,0 +1,61 @@
+# Shared configuration for the Flask service and the command-line tools
+CONFIG = {
+    'db': {
+        'host': 'localhost',
+        'user': 'root',
+        'password': '',
+        'database': 'milk_sensor_data'
+    },
+    'serial': {
+        # One entry per analyser; baudrate/timeout may be overridden per port
+        'ports': [
+            {'device_id': 'analyser-1', 'port': 'COM3'},
+        ],
+        'baudrate': 9600,
+        'timeout': 2,
+        'backoff_initial': 0.5,
+        'backoff_max': 30
+    },
+    'buffer': {
+        'capacity': 3600,
+        'default_points': 20
+    },
+    'archive': {
+        # Columnar reading archive (sensor_archive.py); milk_data.csv is only a legacy export
+        'root': 'archive',
+        'partition': 'hour',
+        # Set by tools that import insert_data (simulator, benchmarks) so they open the
+        # archive read-only and never compact the streams the running service appends to
+        'readonly': False
+    },
+    'storage': {
+        # 'mysql' (CONFIG['db']) or 'sqlite', an embedded file for boxes without a server
+        'backend': 'mysql',
+        'sqlite_path': 'milk_sensor_data.db',
+        # MySQL only, SQLite is always wide. 'wide': one milk_test row per reading
+        # (milk_partitioning.sql); 'normalised': milk_test plus temperature/ph/conductivity
+        # (milk_sensor_data.sql)
+        'layout': 'wide'
+    },
+    'partitions': {
+        # milk_test range partitions (milk_partitioning.sql, partitions.py)
+        'unit': 'day',
+        'days_ahead': 7,
+        'retention_days': 30,
+        'archive': False
+    },
+    'startup': {
+        # Serve / and the health checks at once and load models, heavy imports and DB
+        # connections in the background (/api/system/startup has the timings).
+        # False: warm up before listening, as before
+        'lazy': True
+    },
+    'serving': {
+        # serve.py: one ingest process owns the serial ports and publishes readings and
+        # predictions to a shared-memory ring read by this many HTTP worker processes
+        'workers': 4,
+        'ring': 'milk_readings',
+        # Set by serve.py in each process it starts; 'single' is plain `python insert_data.py`
+        'role': 'single'
+    }
+}
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+FEATURES = ['titrable_acidity', 'temperature', 'pH', 'conductivity']
+CHUNKSIZE = 50000
+TRAINING_SQL = ('SELECT titrable_acidity, temperature, pH, conductivity, status FROM {readings} '
+                'WHERE is_simulated = 0')
+
+
+def database_url(driver='pymysql'):
+    # SQLAlchemy URL of the configured storage backend; `driver` picks the MySQL DBAPI
+    from storage import get_backend
+
+    return get_backend().url(driver)
+
+
+def _prune(chunk, features):
+    chunk = chunk.loc[:, ~chunk.columns.str.contains('^Unnamed')]
+    for col in features:
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype(np.float32)
+    if 'status' in chunk.columns:
+        # Missing labels stay NaN (not 'nan'/'None') so dropna and normalise_status drop them
+        status = chunk['status']
+        chunk['status'] = status.where(status.isna(), status.astype(str))
+    return chunk
+
+
+def iter_csv_chunks(path, columns=None, chunksize=CHUNKSIZE, features=FEATURES):
+    """Yield DataFrame chunks of a CSV, reading only `columns` and with features as float32."""
+    columns = columns or features + ['status']
+    dtypes = {col: np.float32 for col in features if col in columns}
+    reader = pd.read_csv(path, usecols=lambda c: c in columns, dtype=dtypes, chunksize=chunksize)
+    for chunk in reader:
+        yield _prune(chunk, [f for f in features if f in chunk.columns])
+
+
+def iter_archive_chunks(root=None, columns=None, start=None, end=None, devices=None,
+                        features=FEATURES):
+    """Yield one DataFrame per archive partition overlapping [start, end), reading only
+    `columns` from disk."""
+    from sensor_archive import open_archive
+
+    columns = columns or features + ['status']
+    for table in open_archive(root, readonly=True).scan(columns, start, end, devices):
+        yield _prune(table.to_pandas(), [f for f in features if f in columns])
+
+
+def iter_reading_chunks(columns=None, chunksize=CHUNKSIZE, csv_path='milk_data.csv', features=FEATURES):
+    """Readings from the archive when it has any, otherwise from the legacy CSV."""
+    try:
+        from sensor_archive import open_archive
+        has_archive = open_archive(readonly=True).summary()['rows'] > 0
+    except ImportError:
+        has_archive = False
+    if has_archive:
+        return iter_archive_chunks(columns=columns, features=features)
+    return iter_csv_chunks(csv_path, columns, chunksize, features)
+
+
+def iter_sql_chunks(query=None, chunksize=CHUNKSIZE, engine=None, params=None, features=FEATURES, layout=None):
+    """Yield DataFrame chunks from the database through a server-side (unbuffered)
+    cursor, so the client never holds more than one chunk of the result set. The
+    default query reads the real (non-simulated) readings of the backend's layout."""
+    if query is None:
+        from storage import READINGS_SQL, get_backend
+
+        query = TRAINING_SQL.format(readings=READINGS_SQL[layout or get_backend().layout])
+    engine = engine or create_engine(database_url())
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(text(query), conn, params=params, chunksize=chunksize):
+            yield _prune(chunk, [f for f in features if f in chunk.columns])
+
+
+def normalise_status(chunk, valid=None, case='title'):
+    # Scripts disagree on label case; normalise once and keep only known labels
+    status = chunk['status'].str.strip()
+    status = getattr(status.str, case)()
+    chunk = chunk.assign(status=status)
+    if valid is not None:
+        chunk = chunk[chunk['status'].isin(valid)]
+    return chunk
+
+
+def reservoir_sample(chunks, k, seed=42):
+    """Uniform sample of at most k rows from a stream of DataFrame chunks (Algorithm R,
+    vectorised per chunk). Memory is bounded by k rows plus one chunk."""
+    rng = np.random.default_rng(seed)
+    sample = None
+    seen = 0
+    for chunk in chunks:
+        chunk = chunk.reset_index(drop=True)
+        if sample is None:
+            sample = chunk.iloc[:0].copy()
+        if len(sample) < k:
+            take = min(k - len(sample), len(chunk))
+            sample = pd.concat([sample, chunk.iloc[:take]], ignore_index=True)
+            seen += take
+            chunk = chunk.iloc[take:].reset_index(drop=True)
+            if chunk.empty:
+                continue
+        # Row i (0-based over the whole stream) replaces slot j when j = rand(0, i) < k
+        positions = np.arange(seen, seen + len(chunk))
+        slots = rng.integers(0, positions + 1)
+        keep = slots < k
+        if keep.any():
+            # Later rows must win when two rows draw the same slot, as in the serial algorithm
+            rows = np.flatnonzero(keep)
+            slots = slots[keep]
+            _, last = np.unique(slots[::-1], return_index=True)
+            last = len(slots) - 1 - last
+            dst, src = slots[last], rows[last]
+            for i, col in enumerate(sample.columns):
+                sample.iloc[dst, i] = chunk[col].to_numpy()[src]
+        seen += len(chunk)
+    if sample is None:
+        return pd.DataFrame()
+    return sample.astype({f: np.float32 for f in FEATURES if f in sample.columns})
+
@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+WAIT_SECONDS = REGISTRY.histogram('db_pool_wait_seconds', "Time to check a connection out of the pool")
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """Proxy around a DBAPI connection. close() hands it back to the pool instead of
+    closing the socket, which lets SQLAlchemy (NullPool + creator) share the pool."""
+
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if not self._returned:
+            self._returned = True
+            self._pool._release(self._conn, self._created_at)
+
+    def invalidate(self):
+        # Drop the underlying connection instead of returning it, e.g. after a
+        # lost-connection error
+        if not self._returned:
+            self._returned = True
+            self._pool._discard(self._conn)
+
+
+def default_ping(conn):
+    conn.ping()
+
+
+def default_reset(conn):
+    # Ends whatever the borrower left open, including the REPEATABLE READ snapshot a
+    # SELECT-only user never commits, so the next borrower sees current data
+    conn.rollback()
+
+
+class ConnectionPool:
+    """Bounded, thread-safe connection pool.
+
+    Checkout waits on a condition for up to `timeout` seconds when all `max_size`
+    connections are in use. Idle connections are pinged on borrow and replaced when
+    the ping fails or they are older than `max_lifetime`, so a database restart
+    costs one reconnect per stale connection instead of handing out dead ones.
+    Returned connections are rolled back before they are pooled again, and dropped
+    if that fails.
+    """
+
+    def __init__(self, creator, max_size=5, timeout=5.0, max_lifetime=3600, ping=default_ping,
+                 reset=default_reset):
+        self._creator = creator
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self._ping = ping
+        self._reset = reset
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self.stats = {
+            'created': 0,
+            'recycled': 0,
+            'reset_errors': 0,
+            'create_errors': 0,
+            'timeouts': 0,
+            'checkouts': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+        }
+
+    def prefill(self, n=None):
+        n = min(n or self.max_size, self.max_size)
+        conns = []
+        for _ in range(n):
+            try:
+                conns.append(self.connect(timeout=0))
+            except Exception as e:
+                logger.error(f"Pool prefill failed: {e}")
+                break
+        for conn in conns:
+            conn.close()
+        return len(conns)
+
+    def connect(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        while True:
+            conn, created_at = self._checkout(deadline)
+            if conn is None:
+                # A free slot was reserved for us: open a new connection outside the lock
+                try:
+                    conn = self._creator()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._in_use -= 1
+                        self.stats['create_errors'] += 1
+                        self._cond.notify()
+                    raise
+                created_at = time.monotonic()
+                with self._cond:
+                    self.stats['created'] += 1
+            elif not self._healthy(conn, created_at):
+                self._discard(conn, recycled=True)
+                continue
+            self._record_wait(time.monotonic() - start)
+            return PooledConnection(self, conn, created_at)
+
+    def _checkout(self, deadline):
+        with self._cond:
+            while True:
+                if self._idle:
+                    self._in_use += 1
+                    return self._idle.pop()
+                if self._open < self.max_size:
+                    self._open += 1
+                    self._in_use += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(f"All {self.max_size} database connections are in use")
+                self._cond.wait(remaining)
+
+    def _healthy(self, conn, created_at):
+        if self.max_lifetime and time.monotonic() - created_at > self.max_lifetime:
+            return False
+        try:
+            self._ping(conn)
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding stale pooled connection: {e}")
+            return False
+
+    def _record_wait(self, waited):
+        WAIT_SECONDS.observe(waited)
+        with self._cond:
+            self.stats['checkouts'] += 1
+            self.stats['wait_total'] += waited
+            if waited > self.stats['wait_max']:
+                self.stats['wait_max'] = waited
+
+    def _release(self, conn, created_at):
+        try:
+            self._reset(conn)
+        except Exception as e:
+            logger.warning(f"Discarding pooled connection that failed to reset: {e}")
+            with self._cond:
+                self.stats['reset_errors'] += 1
+            self._discard(conn)
+            return
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((conn, created_at))
+            self._cond.notify()
+
+    def _discard(self, conn, recycled=False):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._in_use -= 1
+            if recycled:
+                self.stats['recycled'] += 1
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def snapshot(self):
+        with self._cond:
+            report = dict(self.stats)
+            report['open'] = self._open
+            report['in_use'] = self._in_use
+            report['idle'] = len(self._idle)
+            report['max_size'] = self.max_size
+        checkouts = report['checkouts']
+        report['wait_avg_ms'] = report.pop('wait_total') / checkouts * 1000 if checkouts else 0.0
+        report['wait_max_ms'] = report.pop('wait_max') * 1000
+        return report
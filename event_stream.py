@@ -0,0 +1,95 @@
+import json
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, message):
+        # Slow consumer: drop its oldest pending message so the newest reading gets through
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class EventBroadcaster:
+    """Fans out events from a single producer to any number of SSE clients.
+
+    Each event is serialised once in publish() and the same string is queued for
+    every subscriber. Queues are bounded per client, so one slow browser only loses
+    its own oldest events and never stalls the producer or the other clients.
+    """
+
+    def __init__(self, client_queue_size=100):
+        self.client_queue_size = client_queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self):
+        sub = Subscriber(self.client_queue_size)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, data, event=None):
+        message = format_event(data, event)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.offer(message)
+        self.published += 1
+
+    def stream(self, initial=None, heartbeat=15.0):
+        """Generator of SSE frames for one client; use as a streaming response body.
+
+        `initial` is called after subscribing, so no event published in between is
+        lost; events may overlap the initial frame and carry a seq to dedupe on.
+        """
+        sub = self.subscribe()
+        try:
+            if initial is not None:
+                yield initial()
+            while True:
+                try:
+                    yield sub.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Comment frame keeps proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+        finally:
+            self.unsubscribe(sub)
+
+    def snapshot(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {
+            'clients': len(subscribers),
+            'published': self.published,
+            'dropped': sum(sub.dropped for sub in subscribers),
+        }
+
+
+def format_event(data, event=None):
+    frame = f"event: {event}\n" if event else ''
+    return f"{frame}data: {json.dumps(data, separators=(',', ':'))}\n\n"
@@ -1,31 +1,179 @@
-import pandas as pd
-import mysql.connector
-from sqlalchemy import create_engine
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
 
-# Database connection parameters (replace these with your actual credentials)
-host = 'localhost'  
-database = 'milk_sensor_data'  
-user = 'root'  
-password = ''  
+from config import CONFIG
+from storage import BACKENDS, get_backend
 
-# Create connection using SQLAlchemy (can be used for MySQL, PostgreSQL, etc.)
-engine = create_engine(f'mysql+mysqlconnector://{user}:{password}@{host}/{database}')
+logger = logging.getLogger(__name__)
 
-# SQL query to fetch required data (adjust the table name and columns as per your schema)
-query = """
-    SELECT titrable_acidity, temperature, pH, conductivity, status, created_at
-    FROM milk_test  -- Replace with your actual table name
-    WHERE conductivity IS NOT NULL  -- Ensure you're fetching rows with valid conductivity
-"""
+COLUMNS = ['titrable_acidity', 'temperature', 'pH', 'conductivity', 'status', 'created_at']
+CHUNK_ROWS = 10000
+# Rows younger than this are left for the next run, so a batch the writer commits
+# slightly out of id order is never skipped past
+DEFAULT_LAG = timedelta(seconds=60)
+# Not milk_data.csv: without pyarrow the service's SensorWriter appends there, and
+# recover() would truncate its rows as a torn append
+EXPORT_PATH = 'milk_export.csv'
+WRITER_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'milk_data.csv')
 
-# Fetch the data into a pandas DataFrame
-df = pd.read_sql(query, engine)
+# Keyset pagination on the primary key: every chunk is an index range scan starting
+# after the watermark, however large the table has grown
+CHUNK_SQL = {
+    'wide': """
+        SELECT id, titrable_acidity, temperature, pH, conductivity, status, created_at
+        FROM milk_test
+        WHERE id > %s AND conductivity IS NOT NULL
+        ORDER BY id
+        LIMIT %s
+    """,
+    'normalised': """
+        SELECT m.id, m.titrable_acidity, t.temperature_value, p.ph_value, c.conductivity_value,
+               m.status, m.created_at
+        FROM milk_test m
+        JOIN conductivity c ON c.milk_test_id = m.id
+        LEFT JOIN temperature t ON t.milk_test_id = m.id
+        LEFT JOIN ph p ON p.milk_test_id = m.id
+        WHERE m.id > %s
+        ORDER BY m.id
+        LIMIT %s
+    """,
+}
 
-# Format the 'created_at' column to a proper datetime format
-df['created_at'] = pd.to_datetime(df['created_at']).dt.strftime('%Y-%m-%d %H:%M:%S')
 
-# Save the data to a CSV file
-df.to_csv('milk_data.csv', index=False)
+def state_path(output):
+    return output + '.watermark.json'
 
-# Confirm success
-print(f"Data successfully fetched and saved to 'milk_data.csv'")
+
+def load_state(output):
+    try:
+        with open(state_path(output)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_state(output, state):
+    # Written beside the export and renamed over the old one, so it is never torn
+    tmp = state_path(output) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, state_path(output))
+
+
+def check_output(output):
+    if os.path.realpath(output) == os.path.realpath(WRITER_CSV):
+        raise ValueError(f"{output} is the service's own CSV copy of the readings; export to another file")
+
+
+def recover(output, state):
+    """Cut the export back to the size recorded with the watermark. A run that died
+    between appending a chunk and saving the watermark left those rows uncommitted;
+    they are extracted again."""
+    size = os.path.getsize(output)
+    if size < state['bytes']:
+        raise RuntimeError(f"{output} is shorter than its watermark records ({size} < {state['bytes']} bytes); "
+                           f"rebuild it with --full")
+    if size > state['bytes']:
+        logger.warning(f"Discarding {size - state['bytes']} bytes appended after the last watermark")
+        with open(output, 'r+b') as f:
+            f.truncate(state['bytes'])
+
+
+def extract(conn, output=EXPORT_PATH, layout=None, chunk_rows=CHUNK_ROWS, lag=DEFAULT_LAG):
+    """Append the rows added since the last run to `output`.
+
+    Each chunk is appended, fsynced and only then committed by advancing the watermark
+    (last id, created_at, file size) in output.watermark.json."""
+    check_output(output)
+    layout = layout or CONFIG['storage']['layout']
+    state = load_state(output)
+    if state is None:
+        if os.path.exists(output) and os.path.getsize(output) > 0:
+            raise RuntimeError(f"{output} has no watermark (written by a full export?); rebuild it with --full")
+        with open(output, 'w', newline='') as f:
+            csv.writer(f).writerow(COLUMNS)
+        state = {'last_id': 0, 'last_created_at': None, 'rows': 0, 'bytes': os.path.getsize(output)}
+        save_state(output, state)
+    else:
+        recover(output, state)
+
+    cutoff = datetime.now() - lag
+    added = 0
+    with open(output, 'a', newline='') as f:
+        writer = csv.writer(f)
+        while True:
+            # Unbuffered cursor: rows stream from the server as they are written out
+            cursor = conn.cursor(buffered=False)
+            try:
+                cursor.execute(CHUNK_SQL[layout], (state['last_id'], chunk_rows))
+                n = 0
+                last = None
+                reached_cutoff = False
+                for row in cursor:
+                    if row[6] is not None and row[6] >= cutoff:
+                        reached_cutoff = True
+                        break
+                    writer.writerow(row[1:6] + (row[6].strftime('%Y-%m-%d %H:%M:%S') if row[6] else '',))
+                    last = row
+                    n += 1
+                if reached_cutoff:
+                    # mysql.connector refuses to close a cursor with unread rows
+                    cursor.fetchall()
+            finally:
+                cursor.close()
+            if n:
+                f.flush()
+                os.fsync(f.fileno())
+                state.update(last_id=last[0], rows=state['rows'] + n, bytes=f.tell(),
+                             last_created_at=last[6].isoformat() if last[6] else state['last_created_at'])
+                save_state(output, state)
+                added += n
+                logger.info(f"Appended {n} rows up to id {last[0]}")
+            if reached_cutoff or n < chunk_rows:
+                break
+    return added
+
+
+def rebuild(conn, output=EXPORT_PATH, layout=None, chunk_rows=CHUNK_ROWS, lag=DEFAULT_LAG):
+    """Re-export everything into a side file and swap it in once complete, so the old
+    export stays usable until then."""
+    check_output(output)
+    tmp = output + '.rebuild'
+    for path in (tmp, state_path(tmp)):
+        if os.path.exists(path):
+            os.remove(path)
+    added = extract(conn, tmp, layout, chunk_rows, lag)
+    os.replace(tmp, output)
+    os.replace(state_path(tmp), state_path(output))
+    return added
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Append new milk_test rows to a CSV export")
+    parser.add_argument('-o', '--output', default=EXPORT_PATH)
+    parser.add_argument('--full', action='store_true', help="re-export every row instead of only new ones")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--lag', type=float, default=DEFAULT_LAG.total_seconds(),
+                        help="seconds; newer rows wait for the next run")
+    parser.add_argument('--layout', choices=sorted(CHUNK_SQL), help="default: the backend's layout")
+    parser.add_argument('--backend', choices=BACKENDS, help="default: CONFIG['storage']['backend']")
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend)
+    conn = backend.connect()
+    start = time.perf_counter()
+    try:
+        run = rebuild if args.full else extract
+        added = run(conn, args.output, args.layout or backend.layout, args.chunk_rows, timedelta(seconds=args.lag))
+    finally:
+        conn.close()
+    print(f"{added} rows {'exported' if args.full else 'appended'} to '{args.output}' "
+          f"in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,133 @@
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import rollups
+from storage import READINGS_SQL
+
+METRICS = {
+    'ta': 'titrable_acidity',
+    'temp': 'temperature',
+    'ph': 'pH',
+    'cond': 'conductivity',
+}
+
+DEFAULT_SPAN = timedelta(hours=24)
+DEFAULT_POINTS = 500
+
+
+def parse_time(value, default=None):
+    # Accepts epoch seconds or an ISO 8601 string
+    if value in (None, ''):
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        return datetime.fromisoformat(value)
+    try:
+        return datetime.fromtimestamp(seconds)
+    except (OverflowError, OSError) as e:
+        raise ValueError(f"timestamp out of range: {value}") from e
+
+
+def choose_bucket(start, end, points=DEFAULT_POINTS):
+    if points < 2:
+        raise ValueError("points must be at least 2")
+    span = (end - start).total_seconds()
+    return max(1, math.ceil(span / points))
+
+
+def bucket_query(layout='wide'):
+    aggregates = ',\n               '.join(
+        f"MIN({col}), AVG({col}), MAX({col})" for col in METRICS.values()
+    )
+    # Range scan on idx_created; grouping happens on the integer bucket number
+    return f"""
+        SELECT FLOOR(UNIX_TIMESTAMP(created_at) / %s) AS bucket_no,
+               COUNT(*),
+               {aggregates}
+        FROM {READINGS_SQL[layout]}
+        WHERE created_at >= %s AND created_at < %s
+        GROUP BY bucket_no
+        ORDER BY bucket_no
+    """
+
+
+def query_buckets(conn, start, end, bucket, use_rollups=True, layout='wide'):
+    # Buckets that are whole minutes or hours are served from the rollup tables
+    granularity = rollups.rollup_granularity(bucket) if use_rollups else None
+    sql = rollups.rollup_query(granularity) if granularity else bucket_query(layout)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, (bucket, start, end))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    return [bucket_row(row, bucket) for row in rows]
+
+
+def bucket_row(row, bucket):
+    out = {
+        'time': datetime.fromtimestamp(int(row[0]) * bucket).isoformat(),
+        'count': int(row[1]),
+    }
+    for i, key in enumerate(METRICS):
+        lo, avg, hi = row[2 + 3 * i: 5 + 3 * i]
+        out[key] = {
+            'min': _num(lo),
+            'avg': _num(avg),
+            'max': _num(hi),
+        }
+    return out
+
+
+def _num(value):
+    return None if value is None else float(value)
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the
+    visual shape of the (x, y) series."""
+    n = len(x)
+    if threshold < 2:
+        raise ValueError("threshold must be at least 2")
+    if threshold >= n:
+        return np.arange(n)
+    if threshold == 2:
+        # No bucket between the end points to pick a third vertex from
+        return np.array([0, n - 1])
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        # Average of the next bucket is the third triangle vertex
+        nhi = min(int((i + 2) * every) + 1, n)
+        avg_x = x[hi:nhi].mean()
+        avg_y = y[hi:nhi].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(buckets, points, metric='ta'):
+    if len(buckets) <= points:
+        return buckets
+    x = np.arange(len(buckets), dtype=np.float64)
+    y = np.array([b[metric]['avg'] if b[metric]['avg'] is not None else np.nan for b in buckets])
+    # Gaps would poison the triangle areas; carry the previous value across them
+    if np.isnan(y).any():
+        mask = np.isnan(y)
+        idx = np.where(~mask, np.arange(len(y)), 0)
+        np.maximum.accumulate(idx, out=idx)
+        y = np.nan_to_num(y[idx])
+    return [buckets[i] for i in lttb_indices(x, y, points)]
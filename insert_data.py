@@ -1,21 +1,33 @@
-from flask import Flask, render_template, jsonify, send_file
-import mysql.connector
-import serial
-import threading
-import time
+# First, so start-up timings are measured from the start of the process' imports
+from startup import STARTUP
+from flask import Flask, render_template, jsonify, send_file, request, Response, g
 from datetime import datetime
+from functools import partial
 import os
 from collections import deque
 import logging
 import socket 
-import pandas as pd
-from sqlalchemy import create_engine
-import joblib
-import pickle
+import time
+import numpy as np
 from werkzeug.serving import WSGIRequestHandler
+from config import CONFIG
+from db_pool import ConnectionPool, PoolTimeout
+from event_stream import EventBroadcaster, format_event
+import history
+from metrics import CONTENT_TYPE, REGISTRY as METRICS
+from model_bundle import BUNDLE_PATH, LEGACY_ARTIFACTS
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache
+from ring_buffer import ReadingRingBuffer
+import rollups
+from sensor_protocol import CONTROL_MARKERS, parse_line
+from sensor_writer import SensorWriter, insert_wide
+from serial_ingest import SerialIngest
+from storage import get_backend
 
 # Initialize logging
-logging.basicConfig(level=logging.DEBUG)
+# INFO by default: per-reading DEBUG logging costs more than parsing the line
+logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app
@@ -23,203 +35,240 @@ app = Flask(__name__,
             template_folder=os.path.join(os.path.dirname(__file__), 'templates'),
             static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 
-# Configuration
-CONFIG = {
-    'db': {
-        'host': 'localhost',
-        'user': 'root',
-        'password': '',
-        'database': 'milk_sensor_data'
-    },
-    'serial': {
-        'port': 'COM3',
-        'baudrate': 9600,
-        'timeout': 2
-    }
-}
-
-# SQLAlchemy Engine
-SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{CONFIG['db']['user']}:{CONFIG['db']['password']}@{CONFIG['db']['host']}/{CONFIG['db']['database']}"
-engine = create_engine(SQLALCHEMY_DATABASE_URI)
-
-# Load model and scaler
-model = joblib.load('milk_quality_model.pkl')
-scaler = joblib.load('scaler.pkl')
-
-# Data buffers
-DATA_BUFFER = {
-    'ta': deque(maxlen=20),
-    'temp': deque(maxlen=20),
-    'ph': deque(maxlen=20),
-    'cond': deque(maxlen=20),
-    'time': deque(maxlen=20),
-    'status': deque(maxlen=20),
-    'prediction': deque(maxlen=20),
-    'errors': deque(maxlen=5)
-}
-
-# Database connection pool
-DB_POOL = []
+# Model registry: artifacts are loaded once and hot-swapped when the files change
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Tree models are flattened into numpy arrays on load for fast single-reading inference.
+# compiled_tree pulls in sklearn (most of the start-up time), so it is imported by the
+# first load, which runs in the warm-up rather than at import
+def load_model(path):
+    from compiled_tree import load_compiled
+    return load_compiled(path)
+
+def load_model_bundle(path):
+    from compiled_tree import load_compiled
+    from model_bundle import load_bundle
+    return load_compiled(path, load_bundle)
+
+def load_legacy_model_bundle(path):
+    from compiled_tree import load_compiled
+    from model_bundle import legacy_bundle
+    return load_compiled(path, legacy_bundle)
+
+MODEL_REGISTRY = ModelRegistry(loader=load_model)
+MODEL_REGISTRY.register('decision_tree', os.path.join(BASE_DIR, 'models training', 'decision_tree_model.pkl'))
+if os.path.exists(os.path.join(BASE_DIR, BUNDLE_PATH)):
+    MODEL_REGISTRY.register('milk_quality', os.path.join(BASE_DIR, BUNDLE_PATH), loader=load_model_bundle)
+else:
+    # No bundle written yet: serve the one built from the legacy pickles, watching the model file
+    MODEL_REGISTRY.register('milk_quality', os.path.join(BASE_DIR, LEGACY_ARTIFACTS['model']),
+                            loader=load_legacy_model_bundle)
+# What predict_reading serves
+REQUIRED_MODELS = ('decision_tree',)
+
+# Readings repeat a lot at sensor resolution, so predictions are cached per quantised
+# reading and model version, and dropped whenever the registry swaps a model
+PREDICTION_CACHE = PredictionCache(maxsize=4096, ttl=300)
+MODEL_REGISTRY.add_listener(PREDICTION_CACHE.on_model_swap)
+
+# 'single': this process does everything. Under serve.py: 'ingest' reads the analysers
+# and writes DATA_BUFFER, 'worker' only serves HTTP from it (see use_shared_buffer)
+SERVING_ROLE = CONFIG['serving']['role']
+
+# Data buffers: one row per reading, shared lock-free with the API handlers
+DATA_BUFFER = ReadingRingBuffer(('ta', 'temp', 'ph', 'cond'), capacity=CONFIG['buffer']['capacity'])
+DATA_ERRORS = deque(maxlen=5)
+
+# Push channel for dashboards (/api/stream)
+EVENTS = EventBroadcaster(client_queue_size=100)
+
+# Storage backend (CONFIG['storage']): MySQL, or an embedded SQLite file
+with STARTUP.stage('storage'):
+    STORAGE = get_backend()
+    STORAGE.init_schema()
+
+# Database connection pool, shared by the DBAPI callers and the SQLAlchemy engine
 DB_POOL_SIZE = 5
 
+def create_database_connection():
+    return STORAGE.connect()
+
+DB_POOL = ConnectionPool(create_database_connection, max_size=DB_POOL_SIZE, timeout=5, max_lifetime=3600)
+
+_engine = None
+
+def get_engine():
+    # SQLAlchemy is only needed by the pandas readers, so it is imported on first use
+    global _engine
+    if _engine is None:
+        _engine = STORAGE.create_engine(creator=DB_POOL.connect)
+    return _engine
+
+def __getattr__(name):
+    # insert_data.engine keeps working for callers that used the module attribute
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def init_db_pool():
-    global DB_POOL
-    DB_POOL = []
-    for _ in range(DB_POOL_SIZE):
-        conn = create_database_connection()
-        if conn:
-            DB_POOL.append(conn)
+    if not DB_POOL.prefill():
+        raise RuntimeError("could not open any database connection")
 
 def get_db_connection():
-    if not DB_POOL:
-        init_db_pool()
-    return DB_POOL.pop() if DB_POOL else create_database_connection()
+    try:
+        return DB_POOL.connect()
+    except (PoolTimeout,) + STORAGE.errors as e:
+        logger.error(f"DB connection error: {e}")
+        return None
 
 def release_db_connection(conn):
-    if conn and len(DB_POOL) < DB_POOL_SIZE:
-        DB_POOL.append(conn)
-    elif conn:
+    if conn:
         conn.close()
 
-def create_database_connection():
-    for attempt in range(3):
-        try:
-            conn = mysql.connector.connect(**CONFIG['db'])
-            return conn
-        except mysql.connector.Error as e:
-            logger.error(f"DB connection error (attempt {attempt+1}): {e}")
-            time.sleep(2)
-    return None
+# Local copy of every reading: the partitioned columnar archive, or milk_data.csv when
+# pyarrow is not installed
+with STARTUP.stage('archive'):
+    try:
+        from sensor_archive import open_archive
+        # Only the process that writes readings may compact the archive
+        ARCHIVE = open_archive(os.path.join(BASE_DIR, CONFIG['archive']['root']),
+                               readonly=SERVING_ROLE == 'worker' or CONFIG['archive']['readonly'])
+    except ImportError:
+        logger.warning("pyarrow is not installed; readings are archived to milk_data.csv")
+        ARCHIVE = None
+
+# Batched writer for MySQL and the archive; also maintains the rollup tables
+if STORAGE.layout == 'normalised':
+    from bulk_ingest import insert_normalised as insert_batch
+else:
+    insert_batch = insert_wide
+SENSOR_WRITER = SensorWriter(get_db_connection, release_db_connection,
+                             csv_path=os.path.join(BASE_DIR, 'milk_data.csv'),
+                             on_batch=partial(rollups.update_rollups, dialect=STORAGE.dialect),
+                             archive=ARCHIVE, insert=insert_batch, is_data_error=STORAGE.is_data_error,
+                             dead_letter_path=os.path.join(BASE_DIR, 'rejected_readings.csv'))
+
+def use_shared_buffer(ring):
+    # The routes look DATA_BUFFER up on every request, so swapping it here is enough
+    global DATA_BUFFER
+    DATA_BUFFER = ring
 
 def buffer_sensor_data(data):
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    for key in ['ta', 'temp', 'ph', 'cond']:
-        DATA_BUFFER[key].append(data[key])
-    DATA_BUFFER['time'].append(timestamp)
-    DATA_BUFFER['status'].append(data['status'])
-    logger.info(f"Buffered data: {DATA_BUFFER}")
-
-def insert_sensor_data(data):
-    conn = None
-    cursor = None
+    if SERVING_ROLE == 'ingest':
+        # Workers have no models: each reading is published with its prediction
+        prediction = predict_reading([data['ta'], data['temp'], data['ph'], data['cond']])
+        seq = DATA_BUFFER.append(data, data['status'], device=data.get('device_id'),
+                                 prediction=str(prediction) if isinstance(prediction, str) else None)
+    else:
+        seq = DATA_BUFFER.append(data, data['status'], device=data.get('device_id'))
+    if EVENTS.has_subscribers:
+        publish_reading(seq, data)
+
+def predict_reading(values, name='decision_tree'):
     try:
-        conn = get_db_connection()
-        if not conn:
-            logger.error("Database connection failed.")
-            return False
-
-        cursor = conn.cursor()
-        logger.info(f"Inserting into milk_test: {data}")
-
-        cursor.execute(""" 
-            INSERT INTO milk_test (titrable_acidity, temperature, pH, conductivity, status, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (
-            data['ta'],
-            data['temp'],
-            data['ph'],
-            data['cond'],
-            data['status'],
-            datetime.now()
-        ))
-        conn.commit()
-        logger.info("Data inserted successfully.")
-
-        milk_data = {
-            'titrable_acidity': data['ta'],
-            'temperature': data['temp'],
-            'ph': data['ph'],
-            'conductivity': data['cond'],
-            'status': data['status'],
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-
-        milk_data_df = pd.DataFrame([milk_data])
-        milk_data_df.to_csv('milk_data.csv', mode='a', header=not os.path.exists('milk_data.csv'), index=False)
-        logger.info("Data saved to milk_data.csv.")
-
-        return True
-    except mysql.connector.Error as e:
-        logger.error(f"MySQL error: {e}")
-        if conn:
-            conn.rollback()
+        # One row in feature order: titrable_acidity, temperature, pH, conductivity
+        return PREDICTION_CACHE.get_or_compute(
+            name, MODEL_REGISTRY.version(name), values,
+            lambda features: MODEL_REGISTRY.predict(name, np.asarray([features], dtype=np.float64))[0]
+        )
+    except KeyError:
+        # Not loaded yet (still warming up) or not trained
+        return None
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        if conn:
-            conn.rollback()
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            release_db_connection(conn)
+        # Stored and streamed with the reading, so no prediction rather than an error value
+        logger.error(f"Prediction error: {e}")
+        return None
 
-def parse_serial_data(line):
-    try:
-        logger.debug(f"Raw sensor data: {line}")
-        if not line.strip():
-            logger.error("Received empty line from Arduino.")
-            return None
-        if "SIMULATION_MODE" in line or "READY" in line:
-            logger.warning("Arduino is in simulation/ready mode.")
-            return None
-
-        data = {}
-        for pair in line.split(','):
-            if '=' in pair:
-                key, value = pair.split('=', 1)
-                try:
-                    data[key.strip()] = float(value) if '.' in value else value
-                except ValueError:
-                    logger.error(f"Invalid value for key '{key}': {value}")
-                    return None
-
-        required = ['TA', 'Temp', 'pH', 'Conductivity']
-        if all(k in data for k in required):
-            parsed_data = {
-                'ta': data['TA'],
-                'temp': data['Temp'],
-                'ph': data['pH'],
-                'cond': data['Conductivity'],
-                'status': data.get('Status', 'Unknown')
-            }
-            logger.debug(f"Parsed data: {parsed_data}")
-            return parsed_data
-        else:
-            logger.error("Missing required fields in sensor data.")
-            return None
-    except Exception as e:
-        logger.error(f"Parse error: {e}")
+def latest_prediction(rows):
+    if not len(rows):
         return None
+    if SERVING_ROLE == 'worker':
+        return DATA_BUFFER.decode_predictions(rows[-1:])[0]
+    return predict_reading(rows[-1, 1:5].tolist())
+
+def publish_reading(seq, data):
+    # One prediction per reading, shared by every connected dashboard
+    EVENTS.publish({
+        'seq': seq,
+        'device': data.get('device_id'),
+        'time': datetime.now().strftime("%H:%M:%S"),
+        'ta': data['ta'],
+        'temp': data['temp'],
+        'ph': data['ph'],
+        'cond': data['cond'],
+        'status': data['status'],
+        'prediction': predict_reading([data['ta'], data['temp'], data['ph'], data['cond']])
+    }, 'reading')
 
-def serial_reader():
-    ser = None
-    while True:
-        try:
-            if ser is None or not ser.is_open:
-                logger.info(f"Connecting to serial port {CONFIG['serial']['port']}...")
-                ser = serial.Serial(**CONFIG['serial'])
-                logger.info("Connected to serial port.")
-                ser.flushInput()
-
-            if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8').strip()
-                logger.debug(f"Received: {line}")
-                data = parse_serial_data(line)
-                if data:
-                    buffer_sensor_data(data)
-                    insert_sensor_data(data)
-        except serial.SerialException as e:
-            logger.error(f"Serial error: {e}")
-            if ser:
-                ser.close()
-            ser = None
-            time.sleep(5)
-        except Exception as e:
-            logger.error(f"Unexpected serial reader error: {e}")
-            if ser:
-                ser.close()
-            ser = None
-            time.sleep(5)
+def insert_sensor_data(data):
+    # Hand the reading to the background writer; never blocks the serial loop
+    if not SENSOR_WRITER.submit(data):
+        logger.warning("Writer queue full, reading dropped.")
+        return False
+    return True
+
+# Hot-path instrumentation, served at /metrics and summarised at /api/system/status
+SERIAL_LINES = METRICS.counter('serial_lines_total', "Lines read from the analysers", ('device',))
+PARSE_FAILURES = METRICS.counter('parse_failures_total', "Lines rejected by the parser", ('device', 'reason'))
+REQUEST_SECONDS = METRICS.histogram('http_request_seconds', "Flask request latency",
+                                    ('route', 'method', 'status'))
+
+def handle_serial_line(device_id, line):
+    SERIAL_LINES.inc((device_id,))
+    reading = parse_line(line, device_id)
+    if reading is None:
+        if any(marker in line for marker in CONTROL_MARKERS):
+            logger.warning(f"{device_id} is in simulation/ready mode.")
+        else:
+            PARSE_FAILURES.inc((device_id, 'unparseable'))
+            DATA_ERRORS.append(f"{datetime.now():%H:%M:%S} {device_id}: unparseable line {line[:80]!r}")
+        return
+    if not reading.is_finite:
+        # A NaN/inf reading is a sensor fault; MySQL cannot store it either
+        PARSE_FAILURES.inc((device_id, 'non_finite'))
+        DATA_ERRORS.append(f"{datetime.now():%H:%M:%S} {device_id}: non-finite reading {reading.values}")
+        return
+    buffer_sensor_data(reading)
+    insert_sensor_data(reading)
+
+# Every configured analyser is read without busy-waiting and reconnected with backoff
+SERIAL_INGEST = SerialIngest(
+    CONFIG['serial']['ports'], handle_serial_line,
+    baudrate=CONFIG['serial']['baudrate'], timeout=CONFIG['serial']['timeout'],
+    backoff_initial=CONFIG['serial']['backoff_initial'], backoff_max=CONFIG['serial']['backoff_max'],
+)
+
+# Gauges are read from the live objects at scrape time only
+METRICS.gauge('buffer_readings', "Readings held in the realtime ring buffer", lambda: len(DATA_BUFFER))
+METRICS.gauge('writer_queue', "Readings waiting for the sensor writer",
+              lambda: {(k,): v for k, v in SENSOR_WRITER.snapshot().items() if k in ('queued', 'pending')},
+              ('state',))
+METRICS.gauge('writer_readings', "Sensor writer totals since start",
+              lambda: {(k,): v for k, v in SENSOR_WRITER.snapshot().items()
+                       if k in ('submitted', 'written', 'dropped', 'db_errors')},
+              ('outcome',))
+METRICS.gauge('db_pool_connections', "Database pool connections",
+              lambda: {(k,): v for k, v in DB_POOL.snapshot().items() if k in ('open', 'in_use', 'idle')},
+              ('state',))
+METRICS.gauge('sse_clients', "Connected /api/stream clients", lambda: EVENTS.snapshot()['clients'])
+METRICS.gauge('serial_connected', "1 while the analyser's port is open",
+              lambda: {(d,): int(s['connected']) for d, s in SERIAL_INGEST.snapshot().items()}, ('device',))
+METRICS.gauge('prediction_cache', "Prediction cache counters",
+              lambda: {(k,): v for k, v in PREDICTION_CACHE.snapshot().items()
+                       if k in ('size', 'hits', 'misses', 'evictions', 'invalidations')},
+              ('stat',))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - start, (route, request.method, response.status_code))
+    return response
 
 @app.route('/')
 def dashboard():
@@ -231,41 +280,278 @@ def dashboard():
 
 @app.route('/api/realtime')
 def get_realtime_data():
-    ta = DATA_BUFFER['ta'][-1] 
-    temp = DATA_BUFFER['temp'][-1] 
-    ph = DATA_BUFFER['ph'][-1] 
-    cond = DATA_BUFFER['cond'][-1] 
-    latest_data = [ta, temp, ph, cond]
-    
-    model= pickle.load(open('./models training/decision_tree_model.pkl', 'rb'))
+    # ?limit=N for the newest N readings, or ?from=&to= (epoch seconds) for a time window;
+    # ?device= keeps one analyser's readings
+    limit = request.args.get('limit', CONFIG['buffer']['default_points'], type=int)
+    start_ts = request.args.get('from', type=float)
+    end_ts = request.args.get('to', type=float)
+    device = request.args.get('device')
+    if start_ts is not None or end_ts is not None:
+        limit = request.args.get('limit', type=int)
+        rows = DATA_BUFFER.time_range(start_ts, end_ts, limit=None if device else limit)
+    else:
+        rows = DATA_BUFFER.snapshot(None if device else limit)
+    if device:
+        rows = DATA_BUFFER.for_device(rows, device)
+        if limit is not None:
+            # Same newest-N cut as the ring: limit=0 is no rows, not rows[-0:] (all of them)
+            rows = rows[max(0, len(rows) - limit):]
+
+    prediction = latest_prediction(rows)
+    payload = DATA_BUFFER.to_dict(rows)
+    payload.update({
+        'prediction': prediction,
+        'errors': recent_errors(),
+        'timestamp': datetime.now().isoformat()
+    })
+    return jsonify(payload)
+
+@app.route('/api/data')
+def get_historical_data():
+    # Per-bucket min/avg/max aggregated in MySQL, then LTTB-downsampled to ?points=
     try:
-        columns = ['titrable_acidity', 'temperature', 'pH', 'conductivity']
-        input_df = pd.DataFrame([latest_data], columns=columns)
-        prediction = model.predict(input_df)[0]
-    except Exception as e:
-        print("Prediction error:", e)
-        prediction = "Error during prediction", 500
+        end = history.parse_time(request.args.get('to'), datetime.now())
+        start = history.parse_time(request.args.get('from'), end - history.DEFAULT_SPAN)
+        points = request.args.get('points', history.DEFAULT_POINTS, type=int)
+        if points < 2:
+            raise ValueError("points must be at least 2")
+        bucket = request.args.get('bucket', type=int)
+        if bucket is None:
+            bucket = history.choose_bucket(start, end, points)
+        elif bucket < 1:
+            raise ValueError("bucket must be at least 1 second")
+        metric = request.args.get('metric', 'ta')
+        if metric not in history.METRICS:
+            return jsonify({'error': f"Unknown metric '{metric}'"}), 400
+    except (ValueError, OverflowError) as e:
+        # OverflowError: a 'to' so early that the default 'from' falls before year 1
+        return jsonify({'error': f"Invalid query: {e}"}), 400
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'Database unavailable'}), 503
+    try:
+        buckets = history.query_buckets(conn, start, end, bucket, layout=STORAGE.layout)
+    except STORAGE.errors as e:
+        logger.error(f"History query error: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        release_db_connection(conn)
 
     return jsonify({
-        'ta': list(DATA_BUFFER['ta']),
-        'temp': list(DATA_BUFFER['temp']),
-        'ph': list(DATA_BUFFER['ph']),
-        'cond': list(DATA_BUFFER['cond']),
-        'time': list(DATA_BUFFER['time']),
-        'status': list(DATA_BUFFER['status']),
-        'prediction': prediction,
-        'errors': list(DATA_BUFFER['errors']),
-        'timestamp': datetime.now().isoformat()
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'bucket': bucket,
+        'buckets': len(buckets),
+        'data': history.downsample(buckets, points, metric)
     })
 
+@app.route('/api/stream')
+def stream_realtime_data():
+    # Server-Sent Events: a snapshot of recent readings, then each new reading as it arrives
+    limit = request.args.get('limit', CONFIG['buffer']['default_points'], type=int)
+
+    def snapshot():
+        next_seq = DATA_BUFFER.count
+        rows = DATA_BUFFER.snapshot(limit)
+        payload = DATA_BUFFER.to_dict(rows)
+        payload['seq'] = next_seq
+        payload['prediction'] = latest_prediction(rows)
+        return format_event(payload, 'snapshot')
+
+    # Workers have no publisher to subscribe to, so they follow the shared ring
+    stream = follow_buffer(snapshot) if SERVING_ROLE == 'worker' else EVENTS.stream(snapshot)
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def follow_buffer(initial, interval=0.25, heartbeat=15.0):
+    # Same frames as EVENTS.stream(), polled from DATA_BUFFER. Readings that arrive
+    # while the snapshot is taken may be sent twice; clients dedupe on seq
+    seq = DATA_BUFFER.count
+    yield initial()
+    idle = 0.0
+    while True:
+        time.sleep(interval)
+        rows, next_seq = DATA_BUFFER.since(seq)
+        if not len(rows):
+            idle += interval
+            if idle >= heartbeat:
+                idle = 0.0
+                yield ': keepalive\n\n'
+            continue
+        idle = 0.0
+        payload = DATA_BUFFER.to_dict(rows)
+        predictions = DATA_BUFFER.decode_predictions(rows)
+        for i in range(len(rows)):
+            yield format_event({
+                'seq': next_seq - len(rows) + i,
+                'device': payload['device'][i],
+                'time': payload['time'][i],
+                'ta': payload['ta'][i],
+                'temp': payload['temp'][i],
+                'ph': payload['ph'][i],
+                'cond': payload['cond'][i],
+                'status': payload['status'][i],
+                'prediction': predictions[i],
+            }, 'reading')
+        seq = next_seq
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
+
+def database_connected():
+    # Borrowing pings the connection; a short timeout keeps a full pool from stalling this
+    try:
+        DB_POOL.connect(timeout=0.5).close()
+        return True
+    except Exception:
+        return False
+
+def ingest_snapshot():
+    """State of the serial ingest and the writer. A worker reads what the ingest
+    process last published (once a second) instead of its own idle copies."""
+    if SERVING_ROLE == 'worker':
+        return DATA_BUFFER.status() or {'ready': False, 'failed': {}, 'serial': {}, 'writer': {}, 'errors': []}
+    return {
+        'ready': STARTUP.ready,
+        'failed': STARTUP.failed,
+        'serial': SERIAL_INGEST.snapshot(),
+        'writer': SENSOR_WRITER.snapshot(),
+        'errors': list(DATA_ERRORS),
+    }
+
+def recent_errors():
+    if SERVING_ROLE == 'worker':
+        return ingest_snapshot()['errors']
+    return list(DATA_ERRORS)
+
+def service_ready():
+    if SERVING_ROLE == 'worker':
+        return STARTUP.ready and ingest_snapshot()['ready']
+    return STARTUP.ready
+
+def startup_failures():
+    # Required stages that failed, here and (for a worker) in the ingest process
+    failed = STARTUP.failed
+    if SERVING_ROLE == 'worker':
+        failed.update(ingest_snapshot().get('failed', {}))
+    return failed
+
+@app.route('/api/health')
+def get_health():
+    # Liveness: answers as soon as the server listens, warm or not
+    return jsonify({'status': 'ok', 'ready': service_ready(), 'uptime_s': STARTUP.snapshot()['uptime_s'],
+                    'pid': os.getpid()})
+
+@app.route('/api/ready')
+def get_readiness():
+    # Readiness: 503 until the models are loaded and the pool is filled, with the
+    # stages that failed if start-up could not get there
+    ready = service_ready()
+    return jsonify({'ready': ready, 'failed': startup_failures()}), 200 if ready else 503
+
+@app.route('/api/system/startup')
+def get_startup_timings():
+    return jsonify(STARTUP.snapshot())
+
+@app.route('/api/system/status')
+def get_system_status():
+    latest = DATA_BUFFER.latest()
+    ingest = ingest_snapshot()
+    writer = ingest['writer']
+    return jsonify({
+        'ready': service_ready(),
+        'role': SERVING_ROLE,
+        'database_connected': database_connected(),
+        'storage': STORAGE.name,
+        'serial_connected': any(s['connected'] for s in ingest['serial'].values()),
+        'devices': {d: s['connected'] for d, s in ingest['serial'].items()},
+        'last_update': datetime.fromtimestamp(latest[0]).strftime('%Y-%m-%d %H:%M:%S') if latest is not None else None,
+        'buffer_sizes': {
+            'readings': len(DATA_BUFFER),
+            'writer_queue': writer.get('queued'),
+            'writer_pending': writer.get('pending'),
+            'sse_clients': EVENTS.snapshot()['clients'],
+        },
+        'metrics': METRICS.summary(),
+    })
+
+@app.route('/api/db/pool')
+def get_pool_stats():
+    return jsonify(DB_POOL.snapshot())
+
+@app.route('/api/serial')
+def get_serial_stats():
+    return jsonify(ingest_snapshot()['serial'])
+
+@app.route('/api/writer')
+def get_writer_stats():
+    return jsonify(ingest_snapshot()['writer'])
+
+@app.route('/api/models')
+def get_model_stats():
+    return jsonify(MODEL_REGISTRY.stats())
+
+@app.route('/api/models/cache')
+def get_prediction_cache_stats():
+    return jsonify(PREDICTION_CACHE.snapshot())
+
+@app.route('/api/archive')
+def get_archive_stats():
+    if ARCHIVE is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(ARCHIVE.summary(), enabled=True))
+
 # ✅ CSV Download Route
 @app.route('/download-csv')
 def download_csv():
+    # Generated from the archive on demand; ?from=&to= (epoch or ISO) and ?device= narrow it
+    if ARCHIVE is None:
+        try:
+            return send_file('milk_data.csv', as_attachment=True)
+        except Exception as e:
+            logger.error(f"CSV download error: {e}")
+            return f"Failed to download CSV: {str(e)}", 500
     try:
-        return send_file('milk_data.csv', as_attachment=True)
-    except Exception as e:
-        logger.error(f"CSV download error: {e}")
-        return f"Failed to download CSV: {str(e)}", 500
+        start = history.parse_time(request.args.get('from'))
+        end = history.parse_time(request.args.get('to'))
+    except ValueError as e:
+        return f"Invalid time range: {e}", 400
+    device = request.args.get('device')
+    return Response(ARCHIVE.export_csv(start=start, end=end, devices=[device] if device else None),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=milk_data.csv'})
+
+# Imported up front by the warm-up, each timed, so the first request that needs one
+# does not pay for it
+WARM_UP_IMPORTS = ('sklearn.ensemble', 'sklearn.pipeline', 'joblib', 'compiled_tree', 'sqlalchemy')
+
+def load_models():
+    MODEL_REGISTRY.load_all()
+    # Started after the first load, so the watcher never races it
+    MODEL_REGISTRY.start_watcher()
+    stats = MODEL_REGISTRY.stats()
+    missing = [name for name in REQUIRED_MODELS if not stats[name]['loaded']]
+    if missing:
+        raise RuntimeError(f"models not loaded: {', '.join(missing)}")
+
+def warm_up():
+    # Ingest needs none of it: readings are buffered and queued for the writer from
+    # the first line, and get predictions once the models are loaded
+    steps = [
+        ('imports', lambda: STARTUP.import_modules(WARM_UP_IMPORTS)),
+        ('models', load_models),
+        ('db_pool', init_db_pool),
+    ]
+    # Slow imports are only a cost; without a model or a database the service is not ready
+    required = ('models', 'db_pool')
+    if CONFIG['startup']['lazy']:
+        STARTUP.run_background(steps, required)
+    else:
+        STARTUP.run(steps, required)
+
+STARTUP.mark('imported')
 
 # Run the app
 if __name__ == '__main__':
@@ -273,8 +559,10 @@ if __name__ == '__main__':
     os.makedirs(os.path.join(base_dir, 'templates'), exist_ok=True)
     os.makedirs(os.path.join(base_dir, 'static'), exist_ok=True)
 
-    init_db_pool()
-    threading.Thread(target=serial_reader, daemon=True).start()
+    warm_up()
+    SENSOR_WRITER.start()
+    SERIAL_INGEST.start()
+    STARTUP.mark('listening')
 
     port = 5000
     host = '127.0.0.1'
@@ -0,0 +1,245 @@
+import argparse
+import bisect
+import math
+import threading
+import time
+
+# Seconds; spans a parse (~2 us) up to a stalled DB commit
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+    def summary(self):
+        with self._lock:
+            values = dict(self._values)
+        if not self.labelnames:
+            return values.get((), 0)
+        return {'/'.join(map(str, labels)): value for labels, value in sorted(values.items())}
+
+
+class Histogram:
+    """Cumulative-bucket histogram, Prometheus style. observe() is one bisect and
+    three adds under a lock, cheap enough to leave on in the hot paths. `unit` names
+    what is observed; 'seconds' are summarised in milliseconds, anything else as is."""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, unit='seconds'):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.unit = unit
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, an overflow slot, then sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, labels=()):
+        return _Timer(self, labels)
+
+    def _snapshot(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+    def _quantile(self, series, count, q):
+        # Linear interpolation inside the bucket holding the q-th observation
+        rank = q * count
+        cumulative = 0
+        lower = 0.0
+        for bound, n in zip(self.buckets + (math.inf,), series[:-1]):
+            if n and cumulative + n >= rank:
+                if bound == math.inf:
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / n
+            cumulative += n
+            lower = bound
+        return lower
+
+    def summary(self):
+        scale, suffix = (1000, 'ms') if self.unit == 'seconds' else (1, self.unit)
+        report = {}
+        for labels, series in sorted(self._snapshot().items()):
+            count = sum(series[:-1])
+            key = '/'.join(map(str, labels)) or 'all'
+            report[key] = {
+                'count': count,
+                f'avg_{suffix}': series[-1] / count * scale if count else None,
+                f'p50_{suffix}': self._quantile(series, count, 0.5) * scale if count else None,
+                f'p99_{suffix}': self._quantile(series, count, 0.99) * scale if count else None,
+            }
+        return report if self.labelnames else report.get('all', {'count': 0})
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, self.labels)
+
+
+class Gauge:
+    """Value read from a callback at scrape time (queue depth, pool usage...), so the
+    hot path never pays for it. The callback returns a number or {labels: number}."""
+
+    def __init__(self, name, help, fn, labelnames=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def _values(self):
+        value = self.fn()
+        return value if isinstance(value, dict) else {(): value}
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self._values().items()):
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+    def summary(self):
+        values = self._values()
+        if not self.labelnames:
+            return values.get(())
+        return {'/'.join(map(str, labels)): value for labels, value in sorted(values.items())}
+
+
+class MetricsRegistry:
+    def __init__(self, prefix='milk_'):
+        self.prefix = prefix
+        self._metrics = {}
+
+    def _add(self, metric):
+        # Modules may be reloaded; keep the first registration of a name
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(self.prefix + name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, unit='seconds'):
+        return self._add(Histogram(self.prefix + name, help, labelnames, buckets, unit))
+
+    def gauge(self, name, help, fn, labelnames=()):
+        metric = Gauge(self.prefix + name, help, fn, labelnames)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        report = {}
+        for name, metric in self._metrics.items():
+            try:
+                report[name[len(self.prefix):]] = metric.summary()
+            except Exception as e:
+                report[name[len(self.prefix):]] = {'error': str(e)}
+        return report
+
+
+# Process-wide registry; modules register their metrics at import time
+REGISTRY = MetricsRegistry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def measure_overhead(n=200000):
+    """Nanoseconds per call of the instrumentation primitives, uncontended."""
+    registry = MetricsRegistry('bench_')
+    counter = registry.counter('c', 'bench', ('device',))
+    histogram = registry.histogram('h', 'bench', ('model',))
+    labels = ('analyser-1',)
+
+    def per_call(fn):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return (time.perf_counter() - start) / n * 1e9
+
+    baseline = per_call(lambda: None)
+    return {
+        'counter_inc_ns': per_call(lambda: counter.inc(labels)) - baseline,
+        'histogram_observe_ns': per_call(lambda: histogram.observe(0.0003, labels)) - baseline,
+        'perf_counter_ns': per_call(time.perf_counter) - baseline,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the cost of the metrics primitives")
+    parser.add_argument('-n', type=int, default=200000)
+    args = parser.parse_args()
+    for key, value in measure_overhead(args.n).items():
+        print(f"{key}: {value:.0f}")
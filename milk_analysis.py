@@ -7,8 +7,13 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report, accuracy_score
 
+from data_loading import iter_reading_chunks, reservoir_sample
+
+# Upper bound on rows held in memory; longer histories are uniformly sampled
+SAMPLE_SIZE = 500000
+
 # --------- STEP 1: LOAD AND EXPLORE DATA ---------
-df = pd.read_csv('milk_data.csv')
+df = reservoir_sample(iter_reading_chunks(), SAMPLE_SIZE).dropna()
 print("\nFirst 5 rows of dataset:\n", df.head())
 print("\nDataset Info:\n")
 print(df.info())
@@ -55,8 +60,16 @@ print("\nRandom Forest Classification Report:\n", classification_report(y_test,
 print("\nLogistic Regression Classification Report:\n", classification_report(y_test, logreg_preds))
 
 # --------- STEP 5: SAVE THE BEST MODEL ---------
-# Save the Random Forest model as the best performing one
-import joblib
-joblib.dump(rf_model, 'milk_quality_model.pkl')
+# Save the Random Forest model as the best performing one, bundled with the scaler it
+# was trained behind and the label encoding
+from model_bundle import BUNDLE_PATH, ModelBundle, make_pipeline, save_bundle
+
+bundle = ModelBundle(
+    make_pipeline(rf_model, scaler),
+    features=features,
+    labels=label_encoder.classes_,
+    metadata={'source': 'milk_analysis.py', 'training_rows': len(X_train)}
+)
+save_bundle(bundle, BUNDLE_PATH)
 
-print("\nModel saved successfully as 'milk_quality_model.pkl'!")
+print(f"\nModel bundle v{bundle.version} saved successfully as '{BUNDLE_PATH}'!")
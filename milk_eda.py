@@ -1,38 +1,61 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, accuracy_score
-import joblib
+from data_loading import FEATURES, iter_reading_chunks, normalise_status, reservoir_sample
+from model_bundle import BUNDLE_PATH, ModelBundle, make_pipeline, save_bundle
 
-# Load the dataset
-df = pd.read_csv('milk_data.csv')
+# Upper bound on rows held in memory; longer histories are uniformly sampled
+SAMPLE_SIZE = 500000
 
-# Remove any unnamed columns (e.g., 'Unnamed: 6')
-df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+# Handle missing or inconsistent labels
+valid_labels = ['BAD', 'SPOILED', 'ACCEPTABLE']
+
+# --------------------------------------------------------------------------------------
+# Acidity classification (vectorised, applied per chunk)
+# --------------------------------------------------------------------------------------
+def classify_acidity(df):
+    high = (df['titrable_acidity'] >= 0.15) & (df['pH'] <= 6.5) & (df['conductivity'] >= 1.1)
+    low = (df['titrable_acidity'] <= 0.13) & (df['pH'] >= 6.6) & (df['conductivity'] <= 1.0)
+    return np.select([high, low], ['High Acidity', 'Low Acidity'], default='Normal Acidity')
+
+# Stream the readings (archive, else milk_data.csv) once: clean each chunk, append it to cleaned_milk_data.csv and
+# feed it to the reservoir sample that the plots and the model below work on
+counts = {'raw': 0, 'clean': 0}
+
+def cleaned_chunks():
+    first = True
+    for chunk in iter_reading_chunks(columns=FEATURES + ['status', 'created_at']):
+        counts['raw'] += len(chunk)
+        # Standardize 'status' column to uppercase and keep only valid labels
+        chunk = normalise_status(chunk, valid_labels, case='upper')
+        chunk = chunk.assign(acidity_status=classify_acidity(chunk))
+        counts['clean'] += len(chunk)
+        chunk.to_csv('cleaned_milk_data.csv', mode='w' if first else 'a', header=first, index=False)
+        first = False
+        yield chunk
+
+df = reservoir_sample(cleaned_chunks(), SAMPLE_SIZE)
+print("Cleaned data saved to 'cleaned_milk_data.csv'")
 
 # Basic Information
-print(f"Data shape: {df.shape}")
+print(f"Data shape: ({counts['raw']}, {df.shape[1] - 1})")
 print(f"Data types:\n{df.dtypes}")
 print(f"Null values:\n{df.isnull().sum()}")
 
-# Standardize 'status' column to uppercase and convert to string
-df['status'] = df['status'].astype(str).str.upper()
-
-# Handle missing or inconsistent labels
-valid_labels = ['BAD', 'SPOILED', 'ACCEPTABLE']
-df = df[df['status'].isin(valid_labels)]  # Keep only valid labels
-df['status'] = df['status'].fillna(df['status'].mode()[0])  # Just in case
-
 # Recheck the shape of the data after cleaning
-print(f"Data shape after cleaning: {df.shape}")
+print(f"Data shape after cleaning: ({counts['clean']}, {df.shape[1]})")
+if counts['clean'] > len(df):
+    print(f"Analysing a uniform sample of {len(df)} rows")
 
 # Summary statistics
 print(f"Summary statistics:\n{df.describe()}")
 
 # Visualizations
-df.hist(bins=20, figsize=(12, 8))
+df[FEATURES].hist(bins=20, figsize=(12, 8))
 plt.suptitle('Histograms of Numerical Features')
 plt.show()
 
@@ -67,28 +90,11 @@ sns.pairplot(df[['titrable_acidity', 'temperature', 'pH', 'conductivity', 'statu
 plt.suptitle('Pairplot of Features')
 plt.show()
 
-# --------------------------------------------------------------------------------------
-# Add 'acidity_status' column
-# --------------------------------------------------------------------------------------
-def classify_acidity(row):
-    if row['titrable_acidity'] >= 0.15 and row['pH'] <= 6.5 and row['conductivity'] >= 1.1:
-        return 'High Acidity'
-    elif row['titrable_acidity'] <= 0.13 and row['pH'] >= 6.6 and row['conductivity'] <= 1.0:
-        return 'Low Acidity'
-    else:
-        return 'Normal Acidity'
-
-df['acidity_status'] = df.apply(classify_acidity, axis=1)
-
 plt.figure(figsize=(8, 6))
 sns.countplot(x='acidity_status', data=df, palette='Set3')
 plt.title('Distribution of Acidity Status')
 plt.show()
 
-# Save cleaned data
-df.to_csv('cleaned_milk_data.csv', index=False)
-print("Cleaned data saved to 'cleaned_milk_data.csv'")
-
 # --------------------------------------------------------------------------------------
 # Train RandomForest Model
 # --------------------------------------------------------------------------------------
@@ -117,6 +123,12 @@ print(f"Accuracy Score: {accuracy_score(y_test, y_pred)}")
 print("Classification Report:")
 print(classification_report(y_test, y_pred))
 
-# Save the model
-joblib.dump(model, 'milk_quality_model.pkl')
-print("Model saved as 'milk_quality_model.pkl'")
+# Save the model (unscaled features) with its label map as a bundle
+bundle = ModelBundle(
+    make_pipeline(model),
+    features=list(X.columns),
+    labels=['BAD', 'SPOILED', 'ACCEPTABLE'],
+    metadata={'source': 'milk_eda.py', 'training_rows': len(X_train)}
+)
+save_bundle(bundle, BUNDLE_PATH)
+print(f"Model bundle v{bundle.version} saved as '{BUNDLE_PATH}'")
@@ -0,0 +1,249 @@
+-- =============================================
+-- MILK QUALITY MONITORING DATABASE - PARTITIONED LAYOUT
+-- =============================================
+-- Migrates the schema from milk_sensor_data.sql to one wide milk_test table,
+-- range-partitioned by day on created_at. Expiring old readings becomes a
+-- DROP PARTITION (a metadata change) instead of the daily row-by-row DELETE that
+-- cascaded into temperature/ph/conductivity while the ingest writer was inserting.
+--
+-- Run once against an existing milk_sensor_data database (MySQL 8.0.16+). The
+-- ingest service can stay up: after step 3 new readings land in the new table
+-- while the last 30 days are copied across. Measure the difference with
+-- `python partitions.py --measure`.
+
+USE milk_sensor_data;
+
+-- 1. Wide reading table: one row per reading, sensor values side by side.
+-- Every unique key of a partitioned table must contain the partitioning column,
+-- hence PRIMARY KEY (id, created_at); partitioned InnoDB tables cannot have
+-- foreign keys, which the wide layout no longer needs.
+CREATE TABLE milk_test_wide (
+    id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    device_id VARCHAR(64) DEFAULT NULL, -- Analyser the reading came from (config serial.ports)
+    status ENUM('Fresh','Acceptable','Bad','Spoiled','Simulated','Unknown') NOT NULL DEFAULT 'Unknown',
+    is_simulated BOOLEAN NOT NULL DEFAULT FALSE,
+    titrable_acidity FLOAT NOT NULL,
+    calculated_ta FLOAT DEFAULT NULL,
+    temperature FLOAT DEFAULT NULL,
+    raw_temperature FLOAT DEFAULT NULL,
+    pH FLOAT DEFAULT NULL,
+    raw_ph FLOAT DEFAULT NULL,
+    ph_compensated FLOAT AS (pH + 0.03 * (temperature - 20)) VIRTUAL, -- was ph.temperature_compensated
+    conductivity FLOAT DEFAULT NULL,
+    raw_conductivity FLOAT DEFAULT NULL,
+    CONSTRAINT chk_reading_ta CHECK (titrable_acidity BETWEEN 0 AND 1),
+    CONSTRAINT chk_reading_temp CHECK (temperature BETWEEN -20 AND 100),
+    CONSTRAINT chk_reading_ph CHECK (pH BETWEEN 0 AND 14),
+    CONSTRAINT chk_reading_cond CHECK (conductivity >= 0),
+    PRIMARY KEY (id, created_at),
+    INDEX idx_created (created_at),
+    INDEX idx_status (status),
+    INDEX idx_device_created (device_id, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+PARTITION BY RANGE (TO_DAYS(created_at)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- Continue the id sequence so copied rows keep their ids
+SET @next_id = (SELECT COALESCE(MAX(id), 0) + 1 FROM milk_test);
+SET @ddl = CONCAT('ALTER TABLE milk_test_wide AUTO_INCREMENT = ', @next_id);
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 2. Swap the tables in one atomic rename. The foreign keys of temperature, ph and
+-- conductivity follow the old table to milk_test_legacy.
+RENAME TABLE milk_test TO milk_test_legacy,
+             milk_test_wide TO milk_test;
+
+-- 3. Partition maintenance
+DELIMITER //
+CREATE PROCEDURE run_ddl(IN p_sql TEXT)
+BEGIN
+    SET @run_ddl_sql = p_sql;
+    PREPARE stmt FROM @run_ddl_sql;
+    EXECUTE stmt;
+    DEALLOCATE PREPARE stmt;
+END //
+
+-- Splits pmax until partitions exist p_days_ahead into the future, then removes
+-- every partition whose rows are all older than p_retention_days. Partitions are
+-- named after their first day (p20240101) and are a day or a week ('week' starts
+-- on Monday) wide. With p_archive the expired partition is exchanged into its own
+-- table (milk_test_p20240101) for export instead of being dropped; both are
+-- metadata-only operations whatever the partition holds.
+CREATE PROCEDURE maintain_milk_partitions(
+    IN p_unit VARCHAR(4),
+    IN p_days_ahead INT,
+    IN p_retention_days INT,
+    IN p_archive BOOLEAN
+)
+BEGIN
+    DECLARE v_width INT DEFAULT IF(p_unit = 'week', 7, 1);
+    DECLARE v_start DATE;
+    DECLARE v_last INT;
+    DECLARE v_name VARCHAR(64);
+    DECLARE v_added INT DEFAULT 0;
+    DECLARE v_expired INT DEFAULT 0;
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_name = NULL;
+
+    -- Upper bound (TO_DAYS) of the newest bounded partition
+    SELECT MAX(CAST(PARTITION_DESCRIPTION AS SIGNED)) INTO v_last
+    FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'milk_test'
+      AND PARTITION_DESCRIPTION <> 'MAXVALUE';
+
+    IF v_last IS NULL THEN
+        -- Only pmax yet: start at the retention horizon. The first partition also
+        -- takes anything older, which the expiry pass below then drops.
+        SET v_start = CURDATE() - INTERVAL p_retention_days DAY;
+        IF v_width = 7 THEN
+            SET v_start = v_start - INTERVAL WEEKDAY(v_start) DAY;
+        END IF;
+        SET v_last = TO_DAYS(v_start);
+    END IF;
+
+    WHILE v_last <= TO_DAYS(CURDATE() + INTERVAL p_days_ahead DAY) DO
+        -- pmax is empty in steady state, so the split copies no rows
+        CALL run_ddl(CONCAT(
+            'ALTER TABLE milk_test REORGANIZE PARTITION pmax INTO (',
+            'PARTITION p', DATE_FORMAT(FROM_DAYS(v_last), '%Y%m%d'),
+            ' VALUES LESS THAN (', v_last + v_width, '), ',
+            'PARTITION pmax VALUES LESS THAN MAXVALUE)'));
+        SET v_last = v_last + v_width;
+        SET v_added = v_added + 1;
+    END WHILE;
+
+    expire: LOOP
+        SET v_name = NULL;
+        SELECT PARTITION_NAME INTO v_name
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'milk_test'
+          AND PARTITION_DESCRIPTION <> 'MAXVALUE'
+          AND CAST(PARTITION_DESCRIPTION AS SIGNED) <= TO_DAYS(CURDATE() - INTERVAL p_retention_days DAY)
+        ORDER BY PARTITION_ORDINAL_POSITION
+        LIMIT 1;
+        IF v_name IS NULL THEN
+            LEAVE expire;
+        END IF;
+        IF p_archive THEN
+            CALL run_ddl(CONCAT('CREATE TABLE milk_test_', v_name, ' LIKE milk_test'));
+            CALL run_ddl(CONCAT('ALTER TABLE milk_test_', v_name, ' REMOVE PARTITIONING'));
+            CALL run_ddl(CONCAT('ALTER TABLE milk_test EXCHANGE PARTITION ', v_name,
+                                ' WITH TABLE milk_test_', v_name, ' WITHOUT VALIDATION'));
+        END IF;
+        CALL run_ddl(CONCAT('ALTER TABLE milk_test DROP PARTITION ', v_name));
+        SET v_expired = v_expired + 1;
+    END LOOP;
+
+    INSERT INTO error_logs (message)
+    VALUES (CONCAT('Partition maintenance at ', NOW(), ': ', v_added, ' added, ', v_expired,
+                   IF(p_archive, ' archived', ' dropped')));
+END //
+DELIMITER ;
+
+-- Partitions for the last 30 days and the coming week
+CALL maintain_milk_partitions('day', 7, 30, FALSE);
+
+-- 4. Copy the retained readings across, one day per transaction so the copy never
+-- holds locks for long. Rows written by the service since step 2 are already there.
+DELIMITER //
+CREATE PROCEDURE migrate_milk_test_legacy(IN p_retention_days INT)
+BEGIN
+    DECLARE v_day DATE DEFAULT CURDATE() - INTERVAL p_retention_days DAY;
+    WHILE v_day <= CURDATE() DO
+        START TRANSACTION;
+        INSERT INTO milk_test (id, created_at, device_id, status, is_simulated, titrable_acidity,
+                               calculated_ta, temperature, raw_temperature, pH, raw_ph,
+                               conductivity, raw_conductivity)
+        SELECT m.id, m.created_at, m.device_id, m.status, m.is_simulated, m.titrable_acidity,
+               m.calculated_ta, t.temperature_value, t.raw_temperature_value, p.ph_value, p.raw_ph_value,
+               c.conductivity_value, c.raw_conductivity_value
+        FROM milk_test_legacy m
+        LEFT JOIN temperature t ON m.id = t.milk_test_id
+        LEFT JOIN ph p ON m.id = p.milk_test_id
+        LEFT JOIN conductivity c ON m.id = c.milk_test_id
+        WHERE m.created_at >= v_day AND m.created_at < v_day + INTERVAL 1 DAY;
+        COMMIT;
+        SET v_day = v_day + INTERVAL 1 DAY;
+    END WHILE;
+END //
+DELIMITER ;
+
+CALL migrate_milk_test_legacy(30);
+DROP PROCEDURE migrate_milk_test_legacy;
+
+-- 5. Point the view and the insert procedure at the wide table
+CREATE OR REPLACE VIEW sensor_readings AS
+SELECT
+    id,
+    titrable_acidity AS ta,
+    calculated_ta,
+    status,
+    is_simulated,
+    temperature AS temp,
+    raw_temperature AS raw_temp,
+    pH AS ph,
+    raw_ph,
+    ph_compensated AS adjusted_ph,
+    conductivity AS cond,
+    raw_conductivity AS raw_cond,
+    device_id,
+    created_at
+FROM milk_test
+ORDER BY created_at DESC;
+
+DROP PROCEDURE IF EXISTS insert_sensor_data;
+DELIMITER //
+CREATE PROCEDURE insert_sensor_data(
+    IN p_ta FLOAT,
+    IN p_temp FLOAT,
+    IN p_raw_temp FLOAT,
+    IN p_ph FLOAT,
+    IN p_raw_ph FLOAT,
+    IN p_cond FLOAT,
+    IN p_raw_cond FLOAT,
+    IN p_status VARCHAR(20),
+    IN p_is_simulated BOOLEAN
+)
+BEGIN
+    -- One row, so no explicit transaction is needed any more
+    INSERT INTO milk_test (titrable_acidity, calculated_ta, temperature, raw_temperature, pH, raw_ph,
+                           conductivity, raw_conductivity, status, is_simulated)
+    VALUES (p_ta, p_ta, p_temp, p_raw_temp, p_ph, p_raw_ph, p_cond, p_raw_cond, p_status, p_is_simulated);
+END //
+DELIMITER ;
+
+-- 6. Replace the DELETE purge with partition maintenance
+DROP EVENT IF EXISTS purge_old_data;
+
+DELIMITER //
+CREATE EVENT IF NOT EXISTS maintain_partitions
+ON SCHEDULE EVERY 1 DAY
+STARTS CURRENT_DATE + INTERVAL 1 DAY + INTERVAL 5 MINUTE
+DO
+BEGIN
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        GET DIAGNOSTICS CONDITION 1 @maintain_error = MESSAGE_TEXT;
+        INSERT INTO error_logs (message)
+        VALUES (LEFT(CONCAT('Partition maintenance failed at ', NOW(), ': ', COALESCE(@maintain_error, 'Unknown error')), 255));
+    END;
+
+    CALL maintain_milk_partitions('day', 7, 30, FALSE);
+END //
+DELIMITER ;
+
+-- 7. Verification queries
+SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+FROM information_schema.PARTITIONS
+WHERE TABLE_SCHEMA = 'milk_sensor_data' AND TABLE_NAME = 'milk_test'
+ORDER BY PARTITION_ORDINAL_POSITION;
+SELECT
+    (SELECT COUNT(*) FROM milk_test_legacy WHERE created_at >= CURDATE() - INTERVAL 30 DAY) AS legacy_rows,
+    (SELECT COUNT(*) FROM milk_test WHERE created_at >= CURDATE() - INTERVAL 30 DAY) AS migrated_rows;
+SHOW EVENTS FROM milk_sensor_data;
+
+-- 8. Once the counts match, drop the old layout:
+-- DROP TABLE conductivity, ph, temperature, milk_test_legacy;
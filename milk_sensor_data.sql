@@ -19,11 +19,13 @@ CREATE TABLE milk_test (
     calculated_ta FLOAT DEFAULT NULL, -- New column for Arduino-calculated TA
     status ENUM('Fresh','Acceptable','Bad','Spoiled','Simulated','Unknown') NOT NULL DEFAULT 'Unknown',
     is_simulated BOOLEAN NOT NULL DEFAULT FALSE,
+    device_id VARCHAR(64) DEFAULT NULL, -- Analyser the reading came from (config serial.ports)
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     CONSTRAINT chk_ta_range CHECK (titrable_acidity BETWEEN 0 AND 1),
     INDEX idx_status (status),
-    INDEX idx_created (created_at)
+    INDEX idx_created (created_at),
+    INDEX idx_device_created (device_id, created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- 5. Create temperature table
@@ -108,10 +110,12 @@ BEGIN
     
     START TRANSACTION;
     
-    INSERT INTO milk_test (titrable_acidity, calculated_ta, status, is_simulated)
-    VALUES (p_ta, p_ta, p_status, p_is_simulated); -- Store calculated TA
+    -- Ids come from id_ranges (section 14), shared with the bulk writer
+    UPDATE id_ranges SET next_id = LAST_INSERT_ID(next_id + 1) WHERE name = 'milk_test';
+    SET v_milk_id = LAST_INSERT_ID() - 1;
     
-    SET v_milk_id = LAST_INSERT_ID();
+    INSERT INTO milk_test (id, titrable_acidity, calculated_ta, status, is_simulated)
+    VALUES (v_milk_id, p_ta, p_ta, p_status, p_is_simulated); -- Store calculated TA
     
     INSERT INTO temperature (milk_test_id, temperature_value, raw_temperature_value)
     VALUES (v_milk_id, p_temp, p_raw_temp);
@@ -138,6 +142,7 @@ CREATE TABLE error_logs (
 SET GLOBAL event_scheduler = ON;
 
 -- 12. Create cleanup event with improved error handling
+-- (milk_partitioning.sql replaces this with partition drops on a partitioned milk_test)
 DELIMITER //
 CREATE EVENT IF NOT EXISTS purge_old_data
 ON SCHEDULE EVERY 1 DAY
@@ -158,7 +163,67 @@ BEGIN
 END //
 DELIMITER ;
 
--- 13. Verification queries
+-- 13. Rollup tables (count, sum, min, max, sum of squares per metric and status)
+-- Maintained incrementally by the ingest writer (rollups.py); rebuild with
+-- `python rollups.py --backfill`
+CREATE TABLE milk_rollup_minute (
+    bucket_start DATETIME NOT NULL, -- start of the minute
+    status ENUM('Fresh','Acceptable','Bad','Spoiled','Simulated','Unknown') NOT NULL DEFAULT 'Unknown',
+    n INT UNSIGNED NOT NULL DEFAULT 0,
+    ta_sum DOUBLE NOT NULL DEFAULT 0,
+    ta_min FLOAT DEFAULT NULL,
+    ta_max FLOAT DEFAULT NULL,
+    ta_sumsq DOUBLE NOT NULL DEFAULT 0,
+    temp_sum DOUBLE NOT NULL DEFAULT 0,
+    temp_min FLOAT DEFAULT NULL,
+    temp_max FLOAT DEFAULT NULL,
+    temp_sumsq DOUBLE NOT NULL DEFAULT 0,
+    ph_sum DOUBLE NOT NULL DEFAULT 0,
+    ph_min FLOAT DEFAULT NULL,
+    ph_max FLOAT DEFAULT NULL,
+    ph_sumsq DOUBLE NOT NULL DEFAULT 0,
+    cond_sum DOUBLE NOT NULL DEFAULT 0,
+    cond_min FLOAT DEFAULT NULL,
+    cond_max FLOAT DEFAULT NULL,
+    cond_sumsq DOUBLE NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_start, status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE milk_rollup_hour (
+    bucket_start DATETIME NOT NULL, -- start of the hour
+    status ENUM('Fresh','Acceptable','Bad','Spoiled','Simulated','Unknown') NOT NULL DEFAULT 'Unknown',
+    n INT UNSIGNED NOT NULL DEFAULT 0,
+    ta_sum DOUBLE NOT NULL DEFAULT 0,
+    ta_min FLOAT DEFAULT NULL,
+    ta_max FLOAT DEFAULT NULL,
+    ta_sumsq DOUBLE NOT NULL DEFAULT 0,
+    temp_sum DOUBLE NOT NULL DEFAULT 0,
+    temp_min FLOAT DEFAULT NULL,
+    temp_max FLOAT DEFAULT NULL,
+    temp_sumsq DOUBLE NOT NULL DEFAULT 0,
+    ph_sum DOUBLE NOT NULL DEFAULT 0,
+    ph_min FLOAT DEFAULT NULL,
+    ph_max FLOAT DEFAULT NULL,
+    ph_sumsq DOUBLE NOT NULL DEFAULT 0,
+    cond_sum DOUBLE NOT NULL DEFAULT 0,
+    cond_min FLOAT DEFAULT NULL,
+    cond_max FLOAT DEFAULT NULL,
+    cond_sumsq DOUBLE NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_start, status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 14. Id allocation for milk_test
+-- Writers reserve a block of ids up front (bulk_ingest.py) so child rows can be
+-- written with multi-row INSERTs without reading ids back
+CREATE TABLE id_ranges (
+    name VARCHAR(64) PRIMARY KEY,
+    next_id BIGINT UNSIGNED NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT INTO id_ranges (name, next_id)
+SELECT 'milk_test', COALESCE(MAX(id), 0) + 1 FROM milk_test;
+
+-- 15. Verification queries
 SHOW VARIABLES LIKE 'event_scheduler';
 SHOW EVENTS FROM milk_sensor_data;
 SELECT TABLE_NAME FROM information_schema.TABLES 
@@ -0,0 +1,158 @@
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+# joblib and sklearn are imported where used: the service imports this module for
+# BUNDLE_PATH long before it loads a model
+
+FORMAT_VERSION = 1
+FEATURES = ['titrable_acidity', 'temperature', 'pH', 'conductivity']
+BUNDLE_PATH = 'milk_quality_bundle.joblib'
+LEGACY_ARTIFACTS = {
+    'model': 'milk_quality_model.pkl',
+    'scaler': 'scaler.pkl',
+    'label_encoder': 'label_encoder.pkl',
+}
+
+
+class ModelBundle:
+    """Everything needed to score a reading: the fitted pipeline (preprocessing and
+    model together, so a scaler can never be applied twice or forgotten), the input
+    feature order, the class-index -> label map and training metadata."""
+
+    def __init__(self, pipeline, features=FEATURES, labels=None, metadata=None, version=None):
+        self.format_version = FORMAT_VERSION
+        self.pipeline = pipeline
+        self.features = list(features)
+        self.labels = None if labels is None else np.asarray(labels)
+        self.metadata = dict(metadata or {})
+        self.metadata.setdefault('created_at', datetime.now().isoformat(timespec='seconds'))
+        if 'sklearn_version' not in self.metadata:
+            import sklearn
+
+            self.metadata['sklearn_version'] = sklearn.__version__
+        self.version = version or datetime.now().strftime('%Y%m%d%H%M%S')
+
+    def _decode(self, predictions):
+        if self.labels is None:
+            return predictions
+        return self.labels[np.asarray(predictions, dtype=np.intp)]
+
+    def predict(self, X):
+        return self._decode(self.pipeline.predict(X))
+
+    def predict_proba(self, X):
+        return self.pipeline.predict_proba(X)
+
+    @property
+    def classes(self):
+        classes = self.pipeline.classes_
+        return list(self._decode(classes)) if self.labels is not None else list(classes)
+
+
+def make_pipeline(model, scaler=None):
+    from sklearn.pipeline import Pipeline
+
+    steps = [('scaler', scaler)] if scaler is not None else []
+    steps.append(('model', model))
+    return Pipeline(steps)
+
+
+def save_bundle(bundle, path=BUNDLE_PATH):
+    # Uncompressed so numpy arrays can be memory-mapped on load; written to a temp
+    # file and renamed so the model registry never picks up a half-written bundle
+    import joblib
+
+    tmp = f"{path}.tmp"
+    joblib.dump(bundle, tmp, compress=0)
+    os.replace(tmp, path)
+    return path
+
+
+def load_bundle(path=BUNDLE_PATH, mmap_mode='r'):
+    """Load a bundle with its numpy arrays memory-mapped read-only, so several Flask
+    workers on one box share the same page-cache pages."""
+    import joblib
+
+    bundle = joblib.load(path, mmap_mode=mmap_mode)
+    if getattr(bundle, 'format_version', None) != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} model bundle")
+    return bundle
+
+
+def bundle_from_legacy(model_path=LEGACY_ARTIFACTS['model'], scaler_path=LEGACY_ARTIFACTS['scaler'],
+                       label_encoder_path=LEGACY_ARTIFACTS['label_encoder'], scaled=True):
+    """Wrap the separate model/scaler/label encoder pickles written by train_model.py."""
+    import joblib
+
+    model = joblib.load(model_path)
+    scaler = joblib.load(scaler_path) if scaled else None
+    encoder = joblib.load(label_encoder_path) if label_encoder_path else None
+    return ModelBundle(
+        make_pipeline(model, scaler),
+        labels=encoder.classes_ if encoder is not None else None,
+        metadata={'source': 'legacy', 'model_path': model_path},
+    )
+
+
+def legacy_bundle(model_path=LEGACY_ARTIFACTS['model']):
+    """bundle_from_legacy() with the scaler and label encoder from model_path's directory."""
+    directory = os.path.dirname(model_path)
+    return bundle_from_legacy(model_path, os.path.join(directory, LEGACY_ARTIFACTS['scaler']),
+                              os.path.join(directory, LEGACY_ARTIFACTS['label_encoder']))
+
+
+def load_or_build_bundle(path=BUNDLE_PATH, mmap_mode='r'):
+    """load_bundle(path), or until `model_bundle.py --from-legacy` (or a training script)
+    has written it, the bundle built from the legacy pickles beside it."""
+    if os.path.exists(path):
+        return load_bundle(path, mmap_mode)
+    return legacy_bundle(os.path.join(os.path.dirname(path), LEGACY_ARTIFACTS['model']))
+
+
+def benchmark_load(bundle_path=BUNDLE_PATH, legacy=LEGACY_ARTIFACTS, repeats=5):
+    """Median cold-ish load time of the bundle (mmap and in-memory) against loading the
+    separate legacy pickles the service used to load at startup."""
+    import joblib
+
+    def timed(fn):
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        return float(np.median(samples)) * 1000
+
+    return {
+        'legacy_multi_pickle_ms': timed(lambda: [joblib.load(p) for p in legacy.values()]),
+        'bundle_ms': timed(lambda: load_bundle(bundle_path, mmap_mode=None)),
+        'bundle_mmap_ms': timed(lambda: load_bundle(bundle_path, mmap_mode='r')),
+        'bundle_bytes': os.path.getsize(bundle_path),
+        'legacy_bytes': sum(os.path.getsize(p) for p in legacy.values()),
+    }
+
+
+if __name__ == '__main__':
+    # Go through the importable module so pickles reference model_bundle.ModelBundle,
+    # not __main__.ModelBundle
+    import model_bundle
+
+    parser = argparse.ArgumentParser(description="Build, inspect or benchmark the model bundle")
+    parser.add_argument('--from-legacy', action='store_true',
+                        help="build the bundle from milk_quality_model.pkl, scaler.pkl and label_encoder.pkl")
+    parser.add_argument('--benchmark', action='store_true', help="compare bundle and legacy load times")
+    parser.add_argument('--path', default=BUNDLE_PATH)
+    args = parser.parse_args()
+
+    if args.from_legacy:
+        model_bundle.save_bundle(model_bundle.bundle_from_legacy(), args.path)
+        print(f"Bundle saved as '{args.path}'")
+    bundle = model_bundle.load_bundle(args.path)
+    print(f"Bundle v{bundle.version}: features={bundle.features} classes={bundle.classes}")
+    print(f"Metadata: {bundle.metadata}")
+    if args.benchmark:
+        for key, value in model_bundle.benchmark_load(args.path).items():
+            print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,208 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PREDICT_SECONDS = REGISTRY.histogram('predict_seconds', "Model predict() time", ('model',))
+
+
+class ModelEntry:
+    """Immutable snapshot of one loaded artifact. Swapped as a whole, never mutated."""
+    __slots__ = ('name', 'path', 'obj', 'mtime', 'size', 'checksum', 'loaded_at', 'load_time')
+
+    def __init__(self, name, path, obj, mtime, size, checksum, load_time):
+        self.name = name
+        self.path = path
+        self.obj = obj
+        self.mtime = mtime
+        self.size = size
+        self.checksum = checksum
+        self.loaded_at = time.time()
+        self.load_time = load_time
+
+    @property
+    def version(self):
+        return self.checksum[:12]
+
+    def with_mtime(self, mtime):
+        # Same object and load time, for a file that was touched but not changed
+        entry = ModelEntry(self.name, self.path, self.obj, mtime, self.size, self.checksum, self.load_time)
+        entry.loaded_at = self.loaded_at
+        return entry
+
+
+def joblib_load(path):
+    # joblib is imported on first load, not when the service imports this module
+    import joblib
+
+    return joblib.load(path)
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """Keeps model artifacts resident and hot-swaps them when the file on disk changes.
+
+    Readers always get a complete ModelEntry: a reload builds the new entry first and
+    then replaces the dict slot in one assignment, so a request never sees a half-loaded
+    model. Changes are detected by mtime/size and confirmed by checksum, so touching a
+    file without changing its content does not trigger a swap.
+    """
+
+    def __init__(self, loader=joblib_load):
+        self._loader = loader
+        self._paths = {}
+        self._entries = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self._listeners = []
+
+    def register(self, name, path, loader=None):
+        self._paths[name] = (path, loader or self._loader)
+        self._stats[name] = {
+            'swaps': 0,
+            'load_errors': 0,
+            'inference_count': 0,
+            'inference_total': 0.0,
+            'inference_max': 0.0,
+        }
+
+    def add_listener(self, callback):
+        """Call callback(name, entry) after a model is swapped for a new version."""
+        self._listeners.append(callback)
+
+    def _load(self, name, checksum=None):
+        path, loader = self._paths[name]
+        st = os.stat(path)
+        checksum = checksum or file_checksum(path)
+        start = time.perf_counter()
+        obj = loader(path)
+        load_time = time.perf_counter() - start
+        return ModelEntry(name, path, obj, st.st_mtime, st.st_size, checksum, load_time)
+
+    def load_all(self):
+        for name in self._paths:
+            try:
+                entry = self._load(name)
+            except FileNotFoundError:
+                # Not trained yet; the watcher loads it as soon as it appears
+                logger.warning(f"Model '{name}' not found at {self._paths[name][0]}")
+                continue
+            except Exception as e:
+                self._stats[name]['load_errors'] += 1
+                logger.error(f"Failed to load model '{name}': {e}")
+                continue
+            with self._lock:
+                self._entries[name] = entry
+            logger.info(f"Loaded model '{name}' v{entry.version} in {entry.load_time * 1000:.1f} ms")
+
+    def refresh(self):
+        """Reload every artifact whose file changed. Returns the names that were swapped."""
+        swapped = []
+        for name, (path, _) in self._paths.items():
+            current = self._entries.get(name)
+            try:
+                st = os.stat(path)
+                if current and (st.st_mtime, st.st_size) == (current.mtime, current.size):
+                    continue
+                checksum = file_checksum(path)
+                if current and checksum == current.checksum:
+                    # Touched but identical: remember the new mtime, keep the loaded object
+                    with self._lock:
+                        self._entries[name] = current.with_mtime(st.st_mtime)
+                    continue
+                entry = self._load(name, checksum)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                self._stats[name]['load_errors'] += 1
+                logger.error(f"Failed to reload model '{name}': {e}")
+                continue
+            with self._lock:
+                self._entries[name] = entry
+                if current:
+                    self._stats[name]['swaps'] += 1
+            swapped.append(name)
+            logger.info(f"Swapped model '{name}' to v{entry.version}")
+            for callback in self._listeners:
+                try:
+                    callback(name, entry)
+                except Exception as e:
+                    logger.error(f"Model swap listener failed for '{name}': {e}")
+        return swapped
+
+    def start_watcher(self, interval=5.0):
+        if self._watcher and self._watcher.is_alive():
+            return
+
+        def watch():
+            while not self._stop.wait(interval):
+                self.refresh()
+
+        self._stop.clear()
+        self._watcher = threading.Thread(target=watch, name='model-registry-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+
+    def entry(self, name):
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"Model '{name}' is not loaded")
+        return entry
+
+    def get(self, name):
+        return self.entry(name).obj
+
+    def version(self, name):
+        return self.entry(name).version
+
+    def predict(self, name, X):
+        model = self.get(name)
+        start = time.perf_counter()
+        result = model.predict(X)
+        self.record_inference(name, time.perf_counter() - start)
+        return result
+
+    def record_inference(self, name, elapsed):
+        PREDICT_SECONDS.observe(elapsed, (name,))
+        stats = self._stats[name]
+        with self._lock:
+            stats['inference_count'] += 1
+            stats['inference_total'] += elapsed
+            if elapsed > stats['inference_max']:
+                stats['inference_max'] = elapsed
+
+    def stats(self):
+        report = {}
+        with self._lock:
+            for name, stats in self._stats.items():
+                entry = self._entries.get(name)
+                count = stats['inference_count']
+                report[name] = {
+                    'path': self._paths[name][0],
+                    'loaded': entry is not None,
+                    'version': entry.version if entry else None,
+                    'loaded_at': entry.loaded_at if entry else None,
+                    'load_time_ms': entry.load_time * 1000 if entry else None,
+                    'swaps': stats['swaps'],
+                    'load_errors': stats['load_errors'],
+                    'inference_count': count,
+                    'inference_avg_ms': stats['inference_total'] / count * 1000 if count else None,
+                    'inference_max_ms': stats['inference_max'] * 1000,
+                }
+        return report
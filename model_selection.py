@@ -0,0 +1,127 @@
+import itertools
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+
+class Candidate:
+    def __init__(self, name, estimator, param_grid=None, scaled=False):
+        self.name = name
+        self.estimator = estimator
+        self.param_grid = param_grid or {}
+        # Scale-sensitive models (SVM, logistic regression) get the cached scaled folds
+        self.scaled = scaled
+
+    def configs(self):
+        for params in ParameterGrid(self.param_grid):
+            yield self.name, clone(self.estimator).set_params(**params), params, self.scaled
+
+
+def build_folds(X, y, n_splits=5, seed=42):
+    """Split once and scale once per fold; every candidate reuses the same arrays."""
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    folds = []
+    for train_idx, test_idx in StratifiedKFold(n_splits, shuffle=True, random_state=seed).split(X, y):
+        scaler = StandardScaler().fit(X[train_idx])
+        folds.append({
+            'raw': (X[train_idx], X[test_idx]),
+            'scaled': (scaler.transform(X[train_idx]), scaler.transform(X[test_idx])),
+            'y': (y[train_idx], y[test_idx]),
+        })
+    return folds
+
+
+def evaluate_fold(estimator, fold, scaled, latency_repeats=50):
+    X_train, X_test = fold['scaled' if scaled else 'raw']
+    y_train, y_test = fold['y']
+    start = time.perf_counter()
+    estimator.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = estimator.predict(X_test)
+    batch_time = time.perf_counter() - start
+
+    # Single-row latency is what the ingest box pays per reading
+    row = X_test[:1]
+    start = time.perf_counter()
+    for _ in range(latency_repeats):
+        estimator.predict(row)
+    row_time = (time.perf_counter() - start) / latency_repeats
+
+    return {
+        'accuracy': accuracy_score(y_test, predictions),
+        'fit_s': fit_time,
+        'predict_batch_us_per_row': batch_time / len(X_test) * 1e6,
+        'predict_row_us': row_time * 1e6,
+    }
+
+
+def _run(tasks, folds, n_jobs):
+    return Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(evaluate_fold)(clone(estimator), folds[f], scaled)
+        for (_, estimator, _, scaled), f in tasks
+    )
+
+
+def select_model(X, y, candidates, n_splits=5, n_jobs=-1, prune_margin=0.05, seed=42):
+    """Cross-validate every candidate configuration in parallel and rank them.
+
+    All configurations are scored on the first fold; any that trail the best first-fold
+    accuracy by more than `prune_margin` are dropped before the remaining folds run.
+    Returns (leaderboard DataFrame sorted best-first, list of configs in that order).
+    """
+    folds = build_folds(X, y, n_splits, seed)
+    configs = [config for candidate in candidates for config in candidate.configs()]
+
+    first = _run([(config, 0) for config in configs], folds, n_jobs)
+    best_first = max(result['accuracy'] for result in first)
+    survivors = [i for i, result in enumerate(first) if result['accuracy'] >= best_first - prune_margin]
+    logger.info(f"{len(survivors)}/{len(configs)} configurations survive the first fold")
+
+    tasks = [(i, f) for i, f in itertools.product(survivors, range(1, n_splits))]
+    rest = _run([(configs[i], f) for i, f in tasks], folds, n_jobs)
+
+    results = {i: [first[i]] for i in range(len(configs))}
+    for (i, _), result in zip(tasks, rest):
+        results[i].append(result)
+
+    rows = []
+    for i, (name, _, params, scaled) in enumerate(configs):
+        fold_results = pd.DataFrame(results[i])
+        rows.append({
+            'model': name,
+            'params': params,
+            'scaled': scaled,
+            'folds': len(fold_results),
+            'pruned': i not in survivors,
+            'accuracy_mean': fold_results['accuracy'].mean(),
+            'accuracy_std': fold_results['accuracy'].std(ddof=0),
+            'fit_s': fold_results['fit_s'].mean(),
+            'predict_batch_us_per_row': fold_results['predict_batch_us_per_row'].mean(),
+            'predict_row_us': fold_results['predict_row_us'].mean(),
+        })
+    leaderboard = pd.DataFrame(rows)
+    order = leaderboard.sort_values(
+        ['pruned', 'accuracy_mean', 'predict_row_us'], ascending=[True, False, True]
+    ).index
+    return leaderboard.loc[order].reset_index(drop=True), [configs[i] for i in order]
+
+
+def refit_best(config, X, y):
+    _, estimator, _, scaled = config
+    model = clone(estimator)
+    if scaled:
+        model = make_pipeline(StandardScaler(), model)
+    return model.fit(X, y)
@@ -0,0 +1,259 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+
+from config import CONFIG
+from simulator import percentiles
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS_SQL = """
+    SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS, DATA_LENGTH + INDEX_LENGTH
+    FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    ORDER BY PARTITION_ORDINAL_POSITION
+"""
+
+# Throwaway tables for --measure, one set per layout
+BENCH_TABLE = 'milk_purge_bench'
+BENCH_CHILDREN = ('temperature', 'ph', 'conductivity')
+
+
+def list_partitions(conn, table='milk_test'):
+    """Partitions of `table` oldest first: name, exclusive upper bound (None for
+    pmax), approximate rows and bytes. Empty when the table is not partitioned."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(PARTITIONS_SQL, (table,))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    partitions = []
+    for name, description, n, size in rows:
+        if name is None:
+            continue
+        less_than = None if description == 'MAXVALUE' else date.fromordinal(int(description) - 365)
+        partitions.append({'name': name, 'less_than': less_than, 'rows': int(n or 0), 'bytes': int(size or 0)})
+    return partitions
+
+
+def maintain(conn, unit='day', days_ahead=7, retention_days=30, archive=False):
+    """Run the maintenance the maintain_partitions event does daily, for servers
+    without the event scheduler. Returns the partitions added and expired."""
+    before = {p['name'] for p in list_partitions(conn)}
+    cursor = conn.cursor()
+    try:
+        cursor.callproc('maintain_milk_partitions', (unit, days_ahead, retention_days, archive))
+        conn.commit()
+    finally:
+        cursor.close()
+    after = {p['name'] for p in list_partitions(conn)}
+    changes = {'added': sorted(after - before), 'expired': sorted(before - after)}
+    logger.info(f"Partitions added: {changes['added'] or 'none'}; "
+                f"{'archived' if archive else 'dropped'}: {changes['expired'] or 'none'}")
+    return changes
+
+
+def _create_bench_tables(cursor, layout, first_day, days):
+    if layout == 'normalised':
+        # milk_sensor_data.sql: the reading plus three FK-linked value tables
+        cursor.execute(f"""
+            CREATE TABLE {BENCH_TABLE} (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                titrable_acidity FLOAT NOT NULL,
+                status VARCHAR(20) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_created (created_at)
+            ) ENGINE=InnoDB
+        """)
+        for child in BENCH_CHILDREN:
+            cursor.execute(f"""
+                CREATE TABLE {BENCH_TABLE}_{child} (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    milk_test_id INT NOT NULL,
+                    value FLOAT NOT NULL,
+                    FOREIGN KEY (milk_test_id) REFERENCES {BENCH_TABLE}(id) ON DELETE CASCADE
+                ) ENGINE=InnoDB
+            """)
+    else:
+        partitions = ',\n'.join(
+            f"PARTITION p{(first_day + timedelta(days=i)):%Y%m%d} VALUES LESS THAN "
+            f"(TO_DAYS('{first_day + timedelta(days=i + 1)}'))"
+            for i in range(days + 1)
+        )
+        cursor.execute(f"""
+            CREATE TABLE {BENCH_TABLE} (
+                id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                status VARCHAR(20) NOT NULL,
+                titrable_acidity FLOAT NOT NULL,
+                temperature FLOAT,
+                pH FLOAT,
+                conductivity FLOAT,
+                PRIMARY KEY (id, created_at),
+                INDEX idx_created (created_at)
+            ) ENGINE=InnoDB
+            PARTITION BY RANGE (TO_DAYS(created_at)) (
+                {partitions},
+                PARTITION pmax VALUES LESS THAN MAXVALUE
+            )
+        """)
+
+
+def _drop_bench_tables(cursor):
+    for child in BENCH_CHILDREN:
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}_{child}")
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+
+
+def _fill(conn, layout, first_day, days, rows, chunk=5000):
+    cursor = conn.cursor()
+    step = timedelta(days=days) / rows
+    start = datetime.combine(first_day, datetime.min.time())
+    try:
+        for offset in range(0, rows, chunk):
+            stamps = [start + step * i for i in range(offset, min(offset + chunk, rows))]
+            if layout == 'normalised':
+                cursor.executemany(
+                    f"INSERT INTO {BENCH_TABLE} (titrable_acidity, status, created_at) VALUES (%s, %s, %s)",
+                    [(0.16, 'Fresh', ts) for ts in stamps])
+            else:
+                cursor.executemany(
+                    f"INSERT INTO {BENCH_TABLE} (titrable_acidity, temperature, pH, conductivity, status, created_at)"
+                    f" VALUES (%s, %s, %s, %s, %s, %s)",
+                    [(0.16, 24.0, 6.6, 1.0, 'Fresh', ts) for ts in stamps])
+            conn.commit()
+        if layout == 'normalised':
+            for child in BENCH_CHILDREN:
+                cursor.execute(f"INSERT INTO {BENCH_TABLE}_{child} (milk_test_id, value) "
+                               f"SELECT id, titrable_acidity FROM {BENCH_TABLE}")
+                conn.commit()
+    finally:
+        cursor.close()
+
+
+def _probe(layout, stop, samples, rate):
+    # One reading per transaction, the way insert_sensor_data writes
+    conn = mysql.connector.connect(**CONFIG['db'])
+    cursor = conn.cursor()
+    interval = 1.0 / rate
+    try:
+        while not stop.is_set():
+            began = time.perf_counter()
+            if layout == 'normalised':
+                cursor.execute(f"INSERT INTO {BENCH_TABLE} (titrable_acidity, status) VALUES (0.16, 'Fresh')")
+                parent = cursor.lastrowid
+                for child in BENCH_CHILDREN:
+                    cursor.execute(f"INSERT INTO {BENCH_TABLE}_{child} (milk_test_id, value) VALUES (%s, 1.0)",
+                                   (parent,))
+            else:
+                cursor.execute(f"INSERT INTO {BENCH_TABLE} (titrable_acidity, temperature, pH, conductivity, status)"
+                               f" VALUES (0.16, 24.0, 6.6, 1.0, 'Fresh')")
+            conn.commit()
+            samples.append((began, time.perf_counter() - began))
+            time.sleep(max(0.0, interval - (time.perf_counter() - began)))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def measure_purge(layout, rows=500000, days=30, rate=50, baseline=5.0, after=2.0):
+    """Insert latency while the oldest day is expired, in throwaway tables.
+
+    'normalised' runs the old purge, a cascading DELETE over four tables;
+    'partitioned' drops the oldest day partition of a wide table. A probe thread
+    inserts `rate` readings/s throughout; latencies are split into before and
+    during the purge."""
+    first_day = date.today() - timedelta(days=days)
+    conn = mysql.connector.connect(**CONFIG['db'])
+    cursor = conn.cursor()
+    try:
+        _drop_bench_tables(cursor)
+        _create_bench_tables(cursor, layout, first_day, days)
+        logger.info(f"Filling {rows} {layout} rows over {days} days")
+        _fill(conn, layout, first_day, days, rows)
+
+        stop = threading.Event()
+        samples = []
+        probe = threading.Thread(target=_probe, args=(layout, stop, samples, rate), daemon=True)
+        probe.start()
+        time.sleep(baseline)
+        purge_start = time.perf_counter()
+        if layout == 'normalised':
+            cursor.execute(f"DELETE FROM {BENCH_TABLE} WHERE created_at < %s",
+                           (first_day + timedelta(days=1),))
+            purged = cursor.rowcount
+            conn.commit()
+        else:
+            purged = list_partitions(conn, BENCH_TABLE)[0]['rows']
+            cursor.execute(f"ALTER TABLE {BENCH_TABLE} DROP PARTITION p{first_day:%Y%m%d}")
+        purge_end = time.perf_counter()
+        time.sleep(after)
+        stop.set()
+        probe.join()
+    finally:
+        _drop_bench_tables(cursor)
+        cursor.close()
+        conn.close()
+
+    return {
+        'layout': layout,
+        'rows': rows,
+        'rows_purged': purged,
+        'purge_s': purge_end - purge_start,
+        'baseline': percentiles([lat for began, lat in samples if began < purge_start]),
+        'during_purge': percentiles([lat for began, lat in samples if purge_start <= began < purge_end]),
+    }
+
+
+def print_measurement(report):
+    print(f"\n{report['layout']}: purged {report['rows_purged']} of {report['rows']} rows in {report['purge_s']:.3f}s")
+    for phase in ('baseline', 'during_purge'):
+        stats = report[phase]
+        if stats:
+            print(f"  {phase:<13} n {stats['n']:5d}  p50 {stats['p50_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  "
+                  f"max {stats['max_ms']:8.2f} ms")
+        else:
+            print(f"  {phase:<13} no inserts started")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    settings = CONFIG['partitions']
+    parser = argparse.ArgumentParser(description="Maintain milk_test partitions or measure purge impact")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--status', action='store_true', help="list partitions with approximate sizes")
+    action.add_argument('--maintain', action='store_true', help="pre-create and expire partitions now")
+    action.add_argument('--measure', action='store_true',
+                        help="insert latency during a DELETE purge vs a partition drop (throwaway tables)")
+    parser.add_argument('--archive', action='store_true', default=settings['archive'],
+                        help="exchange expired partitions into milk_test_<partition> tables instead of dropping")
+    parser.add_argument('--rows', type=int, default=500000, help="--measure: rows spread over the retention window")
+    parser.add_argument('--rate', type=float, default=50, help="--measure: probe inserts per second")
+    parser.add_argument('--json', help="--measure: also write the reports to this file")
+    args = parser.parse_args()
+
+    if args.measure:
+        reports = []
+        for layout in ('normalised', 'partitioned'):
+            report = measure_purge(layout, args.rows, settings['retention_days'], args.rate)
+            print_measurement(report)
+            reports.append(report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(reports, f, indent=2, default=float)
+    else:
+        conn = mysql.connector.connect(**CONFIG['db'])
+        try:
+            if args.maintain:
+                maintain(conn, settings['unit'], settings['days_ahead'], settings['retention_days'], args.archive)
+            for p in list_partitions(conn):
+                bound = p['less_than'] or 'MAXVALUE'
+                print(f"{p['name']:<12} < {bound!s:<10} {p['rows']:>10} rows {p['bytes'] / 1e6:>9.1f} MB")
+        finally:
+            conn.close()
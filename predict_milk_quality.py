@@ -1,44 +1,131 @@
-import joblib
+import argparse
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.preprocessing import LabelEncoder
+from model_bundle import BUNDLE_PATH, load_or_build_bundle
+
+IMPUTE_STRATEGIES = ['zero', 'constant', 'mean', 'median', 'drop']
+
+# Per-process bundle, loaded once by the worker initializer (memory-mapped, so the
+# workers share the model's pages instead of each holding a copy)
+_bundle = None
+
+
+def _init_worker(bundle_path):
+    global _bundle
+    _bundle = load_or_build_bundle(bundle_path)
+
+
+def impute(chunk, features, strategy='zero', fill_value=0.0):
+    """Fill missing feature columns and NaNs in this chunk. mean/median use the chunk's
+    own statistics; a column that is absent altogether falls back to fill_value."""
+    for feature in features:
+        if feature not in chunk.columns:
+            chunk[feature] = np.nan
+    if strategy == 'drop':
+        return chunk.dropna(subset=features)
+    values = chunk[features]
+    if strategy == 'mean':
+        fill = values.mean()
+    elif strategy == 'median':
+        fill = values.median()
+    elif strategy == 'constant':
+        fill = pd.Series(fill_value, index=features)
+    else:
+        fill = pd.Series(0.0, index=features)
+    chunk[features] = values.fillna(fill.fillna(fill_value))
+    return chunk
+
+
+def predict_chunk(chunk, strategy='zero', fill_value=0.0, bundle=None):
+    bundle = bundle or _bundle
+    chunk = impute(chunk, bundle.features, strategy, fill_value)
+    # One vectorised call per chunk
+    chunk['predicted_status'] = bundle.predict(chunk[bundle.features]) if len(chunk) else []
+    return chunk
+
+
+class ChunkWriter:
+    """Appends prediction chunks to CSV (file or stdout) or Parquet as they are ready."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self._writer = None
+        self._first = True
 
-# Load the saved model, scaler, and label encoder
-model = joblib.load('milk_quality_model.pkl')
-scaler = joblib.load('scaler.pkl')
-label_encoder = joblib.load('label_encoder.pkl')
+    def write(self, chunk):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            target = sys.stdout if self.path == '-' else self.path
+            chunk.to_csv(target, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
 
-# Load new data (replace 'new_data.csv' with the actual path of the new data file)
-new_data = pd.read_csv('new_data.csv')
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
 
-# Check the structure of the new data to ensure it's consistent
-print("\nFirst 5 rows of new data:")
-print(new_data.head())
 
-# Make sure the new data contains the same features as the training data
-required_features = ['titrable_acidity', 'temperature', 'pH', 'conductivity']
-for feature in required_features:
-    if feature not in new_data.columns:
-        print(f"Warning: '{feature}' is missing from the new data.")
-        # You can choose how to handle missing features, like setting them to 0 or using mean/median imputation.
-        new_data[feature] = 0  # Example: Filling missing features with 0 (You can change this logic)
+def run(input_path, output_path, bundle_path=BUNDLE_PATH, chunksize=100000, workers=0,
+        strategy='zero', fill_value=0.0, log=sys.stderr):
+    reader = pd.read_csv(sys.stdin if input_path == '-' else input_path, chunksize=chunksize)
+    writer = ChunkWriter(output_path)
+    rows = 0
+    start = time.perf_counter()
 
-# Preprocess the new data (Standardizing the numerical columns)
-new_data_scaled = scaler.transform(new_data[['titrable_acidity', 'temperature', 'pH', 'conductivity']])
+    def report(chunk):
+        nonlocal rows
+        writer.write(chunk)
+        rows += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"{rows} rows scored ({rows / elapsed:,.0f} rows/s)", file=log)
 
-# Make predictions
-predictions = model.predict(new_data_scaled)
+    try:
+        if workers > 0:
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(bundle_path,)) as pool:
+                # Keep a bounded window of chunks in flight so input is never read far ahead
+                pending = deque()
+                for chunk in reader:
+                    pending.append(pool.submit(predict_chunk, chunk, strategy, fill_value))
+                    if len(pending) >= workers * 2:
+                        report(pending.popleft().result())
+                while pending:
+                    report(pending.popleft().result())
+        else:
+            bundle = load_or_build_bundle(bundle_path)
+            for chunk in reader:
+                report(predict_chunk(chunk, strategy, fill_value, bundle))
+    finally:
+        writer.close()
 
-# Decode the predictions (from numerical values back to the original 'status' labels)
-decoded_predictions = label_encoder.inverse_transform(predictions)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)", file=log)
+    return rows
 
-# Add the predicted labels to the new data
-new_data['predicted_status'] = decoded_predictions
 
-# Show the results with the predictions
-print("\nPredictions for new data:")
-print(new_data)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score milk readings with the saved model bundle")
+    parser.add_argument('input', nargs='?', default='new_data.csv', help="CSV file, or '-' for stdin")
+    parser.add_argument('-o', '--output', default='predicted_milk_status.csv',
+                        help="CSV or .parquet file, or '-' for stdout")
+    parser.add_argument('--bundle', default=BUNDLE_PATH)
+    parser.add_argument('--chunksize', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=0, help="worker processes (0 = score in this process)")
+    parser.add_argument('--impute', choices=IMPUTE_STRATEGIES, default='zero',
+                        help="how to fill missing features: per-chunk mean/median, a constant, zero, or drop the row")
+    parser.add_argument('--fill-value', type=float, default=0.0)
+    args = parser.parse_args()
 
-# Save the predictions to a new CSV file
-new_data.to_csv('predicted_milk_status.csv', index=False)
-print("\nPredictions saved to 'predicted_milk_status.csv'!")
+    run(args.input, args.output, args.bundle, args.chunksize, args.workers, args.impute, args.fill_value)
+    if args.output != '-':
+        print(f"\nPredictions saved to '{args.output}'!", file=sys.stderr)
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Resolution the sensors report at: TA 3 decimals, temperature 0.1, pH and conductivity 2
+SENSOR_PRECISION = (3, 1, 2, 2)
+
+
+def quantise(values, precision=SENSOR_PRECISION):
+    return tuple(round(float(v), p) for v, p in zip(values, precision))
+
+
+class PredictionCache:
+    """LRU cache of model predictions with a TTL.
+
+    Keys are (model name, model version, quantised feature tuple), so a new model
+    version can never be served an old answer; invalidate() additionally drops a
+    model's entries as soon as the registry swaps it, instead of letting them age out.
+    The model is always run on the quantised tuple, so a cached result is exactly what
+    a fresh prediction for that key would return.
+    """
+
+    def __init__(self, maxsize=4096, ttl=300.0, precision=SENSOR_PRECISION):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.precision = precision
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, name, version, values, compute):
+        """Cached prediction for `values`, calling compute(quantised_values) on a miss.
+        Exceptions from compute propagate and nothing is cached."""
+        features = quantise(values, self.precision)
+        key = (name, version, features)
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                if now - item[1] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return item[0]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+
+        # Computed outside the lock; two threads missing on the same key both run the model
+        result = compute(features)
+        with self._lock:
+            self._entries[key] = (result, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def invalidate(self, name=None):
+        """Drop every entry for model `name`, or everything. Returns how many were dropped."""
+        with self._lock:
+            if name is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [key for key in self._entries if key[0] == name]
+                for key in stale:
+                    del self._entries[key]
+                dropped = len(stale)
+            self.invalidations += dropped
+        return dropped
+
+    def on_model_swap(self, name, entry):
+        # ModelRegistry listener
+        self.invalidate(name)
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_s': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
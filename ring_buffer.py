@@ -0,0 +1,170 @@
+import threading
+import time
+
+import numpy as np
+
+
+class SnapshotRetry(Exception):
+    pass
+
+
+class ReadingRingBuffer:
+    """Fixed-capacity, row-per-reading ring buffer backed by one float64 array.
+
+    Column 0 is the reading timestamp (epoch seconds), followed by `fields`, then a
+    status code that indexes into `labels` and a device code that indexes into
+    `devices`. Writers serialise on a small lock and
+    publish a row by bumping `count` only after the row is fully written. Readers
+    never take the lock: they copy the rows they need and re-check `count`
+    afterwards (seqlock style), retrying if the writer lapped them. A snapshot can
+    therefore never contain a torn row.
+
+    `buffer` places the count (one int64) and the rows in caller-provided memory,
+    e.g. shared memory (see shared_ring.py), instead of private arrays.
+    """
+
+    def __init__(self, fields, capacity=3600, extra_columns=(), buffer=None):
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2")
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.columns = ('time',) + self.fields + ('status', 'device') + tuple(extra_columns)
+        self._status_col = self.columns.index('status')
+        self._device_col = self.columns.index('device')
+        shape = (capacity, len(self.columns))
+        if buffer is None:
+            buffer = bytearray(self.nbytes(len(self.columns), capacity))
+        # A memoryview reads the count back as a plain int, cheaper than a numpy scalar
+        self._counter = memoryview(buffer)[:8].cast('q')
+        self._data = np.ndarray(shape, dtype=np.float64, buffer=buffer, offset=8)
+        self._write_lock = threading.Lock()
+        self.labels = []
+        self._label_codes = {}
+        self.devices = []
+        self._device_codes = {}
+
+    @staticmethod
+    def nbytes(n_columns, capacity):
+        # Size of the `buffer` a ring with n_columns columns needs
+        return 8 + n_columns * capacity * 8
+
+    @property
+    def _count(self):
+        return self._counter[0]
+
+    @_count.setter
+    def _count(self, value):
+        self._counter[0] = value
+
+    def __len__(self):
+        return min(self._count, self.capacity - 1)
+
+    @property
+    def count(self):
+        # Total number of readings ever appended; doubles as a sequence number
+        return self._count
+
+    @staticmethod
+    def _code(label, labels, codes):
+        code = codes.get(label)
+        if code is None:
+            code = len(labels)
+            labels.append(label)
+            codes[label] = code
+        return code
+
+    def append(self, values, status='Unknown', timestamp=None, device=None):
+        row = [time.time() if timestamp is None else timestamp]
+        row.extend(values[f] for f in self.fields)
+        with self._write_lock:
+            row.append(self._code(status, self.labels, self._label_codes))
+            row.append(self._code(device, self.devices, self._device_codes))
+            seq = self._count
+            self._data[seq % self.capacity] = row
+            self._count = seq + 1
+        return seq
+
+    def _copy(self, start, stop):
+        # Copy logical rows [start, stop) which may wrap around the end of the array
+        cap = self.capacity
+        lo, hi = start % cap, stop % cap
+        if stop - start <= 0:
+            return self._data[:0].copy()
+        if lo < hi:
+            return self._data[lo:hi].copy()
+        return np.concatenate((self._data[lo:], self._data[:hi]))
+
+    def _read(self, pick, retries=10):
+        for _ in range(retries):
+            count = self._count
+            start, stop = pick(count)
+            rows = self._copy(start, stop)
+            # Rows are intact unless the writer has since started overwriting `start`
+            if self._count - start < self.capacity:
+                return rows, start
+        raise SnapshotRetry("ring buffer snapshot kept being overwritten")
+
+    def _oldest(self, count):
+        # One slot is kept free so the row being written is never part of a snapshot
+        return max(0, count - (self.capacity - 1))
+
+    def snapshot(self, limit=None):
+        """Copy of the newest `limit` rows (all retained rows if None), oldest first."""
+        def pick(count):
+            start = self._oldest(count)
+            if limit is not None:
+                start = max(start, count - limit)
+            return start, count
+        return self._read(pick)[0]
+
+    def since(self, seq):
+        """Rows appended after sequence number `seq`, plus the next sequence number."""
+        def pick(count):
+            return max(seq, self._oldest(count)), count
+        rows, start = self._read(pick)
+        return rows, start + len(rows)
+
+    def time_range(self, start_ts=None, end_ts=None, limit=None):
+        """Rows with start_ts <= time < end_ts, found by binary search over the ring."""
+        def pick(count):
+            oldest = self._oldest(count)
+            lo = self._search(oldest, count, start_ts) if start_ts is not None else oldest
+            hi = self._search(lo, count, end_ts) if end_ts is not None else count
+            if limit is not None:
+                lo = max(lo, hi - limit)
+            return lo, hi
+        return self._read(pick)[0]
+
+    def _search(self, lo, hi, ts):
+        data, cap = self._data, self.capacity
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if data[mid % cap, 0] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def latest(self):
+        rows = self.snapshot(1)
+        return rows[0] if len(rows) else None
+
+    def decode_status(self, codes):
+        labels = self.labels
+        return [labels[int(c)] for c in codes]
+
+    def for_device(self, rows, device):
+        """The subset of `rows` read from `device`."""
+        code = self._device_codes.get(device)
+        if code is None:
+            return rows[:0]
+        return rows[rows[:, self._device_col] == code]
+
+    def to_dict(self, rows, time_format='%H:%M:%S'):
+        out = {'time': [time.strftime(time_format, time.localtime(t)) for t in rows[:, 0]]}
+        for i, field in enumerate(self.fields, start=1):
+            out[field] = rows[:, i].tolist()
+        out['status'] = self.decode_status(rows[:, self._status_col])
+        devices = self.devices
+        out['device'] = [devices[int(c)] for c in rows[:, self._device_col]]
+        return out
@@ -0,0 +1,180 @@
+import argparse
+import logging
+import math
+from datetime import datetime, timedelta
+
+from storage import BACKENDS, READINGS_SQL, get_backend
+
+logger = logging.getLogger(__name__)
+
+# Rollup table per granularity, with the strftime/DATE_FORMAT pattern that truncates
+# a timestamp to the start of its bucket
+GRANULARITIES = {
+    'minute': ('milk_rollup_minute', 60, '%Y-%m-%d %H:%M:00', '%%Y-%%m-%%d %%H:%%i:00'),
+    'hour': ('milk_rollup_hour', 3600, '%Y-%m-%d %H:00:00', '%%Y-%%m-%%d %%H:00:00'),
+}
+
+# metric prefix -> milk_test column; order matches the writer's row tuples
+METRICS = (
+    ('ta', 'titrable_acidity'),
+    ('temp', 'temperature'),
+    ('ph', 'pH'),
+    ('cond', 'conductivity'),
+)
+
+_STAT_COLUMNS = [f"{m}_{stat}" for m, _ in METRICS for stat in ('sum', 'min', 'max', 'sumsq')]
+
+
+def _upsert_sql(table, dialect='mysql'):
+    if dialect == 'sqlite':
+        new, conflict = 'excluded.{}'.format, 'ON CONFLICT (bucket_start, status) DO UPDATE SET'
+        lesser, greater = 'min', 'max'
+    else:
+        new, conflict = 'VALUES({})'.format, 'ON DUPLICATE KEY UPDATE'
+        lesser, greater = 'LEAST', 'GREATEST'
+    updates = [f"n = n + {new('n')}"]
+    for m, _ in METRICS:
+        updates += [
+            f"{m}_sum = {m}_sum + {new(f'{m}_sum')}",
+            f"{m}_min = {lesser}({m}_min, {new(f'{m}_min')})",
+            f"{m}_max = {greater}({m}_max, {new(f'{m}_max')})",
+            f"{m}_sumsq = {m}_sumsq + {new(f'{m}_sumsq')}",
+        ]
+    columns = ['bucket_start', 'status', 'n'] + _STAT_COLUMNS
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"{conflict} {', '.join(updates)}"
+    )
+
+
+UPSERT_SQL = {
+    dialect: {name: _upsert_sql(spec[0], dialect) for name, spec in GRANULARITIES.items()}
+    for dialect in BACKENDS
+}
+
+
+def aggregate(rows, granularity):
+    """Fold writer rows (ta, temp, ph, cond, status, created_at) into per-bucket stats."""
+    fmt = GRANULARITIES[granularity][2]
+    groups = {}
+    for row in rows:
+        key = (row[5].strftime(fmt), row[4])
+        acc = groups.get(key)
+        if acc is None:
+            acc = groups[key] = [0] + [0.0, math.inf, -math.inf, 0.0] * len(METRICS)
+        acc[0] += 1
+        for i in range(len(METRICS)):
+            v = float(row[i])
+            j = 1 + 4 * i
+            acc[j] += v
+            if v < acc[j + 1]:
+                acc[j + 1] = v
+            if v > acc[j + 2]:
+                acc[j + 2] = v
+            acc[j + 3] += v * v
+    return [key + tuple(acc) for key, acc in groups.items()]
+
+
+def update_rollups(cursor, rows, dialect='mysql'):
+    # Runs inside the writer's batch transaction, so rollups commit together with the rows
+    for granularity in GRANULARITIES:
+        cursor.executemany(UPSERT_SQL[dialect][granularity], aggregate(rows, granularity))
+
+
+def backfill_sql(granularity, layout='wide'):
+    table, _, _, sql_fmt = GRANULARITIES[granularity]
+    stats = ',\n               '.join(
+        f"SUM({col}), MIN({col}), MAX({col}), SUM({col} * {col})" for _, col in METRICS
+    )
+    return f"""
+        INSERT INTO {table} (bucket_start, status, n, {', '.join(_STAT_COLUMNS)})
+        SELECT DATE_FORMAT(created_at, '{sql_fmt}') AS bucket, status, COUNT(*),
+               {stats}
+        FROM {READINGS_SQL[layout]}
+        WHERE created_at >= %s AND created_at < %s
+        GROUP BY bucket, status
+    """
+
+
+def backfill(conn, start, end, granularities=tuple(GRANULARITIES), layout='wide'):
+    """Rebuild rollups for [start, end) from milk_test. Bounds are widened to whole
+    hours so partially covered buckets are recomputed completely. Run it over closed
+    hours, or with ingest stopped, so it does not race the writer's upserts."""
+    start = start.replace(minute=0, second=0, microsecond=0)
+    end_hour = end.replace(minute=0, second=0, microsecond=0)
+    end = end_hour if end == end_hour else end_hour + timedelta(hours=1)
+    cursor = conn.cursor()
+    try:
+        for granularity in granularities:
+            table = GRANULARITIES[granularity][0]
+            cursor.execute(f"DELETE FROM {table} WHERE bucket_start >= %s AND bucket_start < %s", (start, end))
+            cursor.execute(backfill_sql(granularity, layout), (start, end))
+            logger.info(f"Rebuilt {cursor.rowcount} {granularity} rollup rows")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def rollup_granularity(bucket):
+    # Coarsest rollup table whose buckets tile the requested bucket size evenly
+    for granularity in ('hour', 'minute'):
+        if bucket % GRANULARITIES[granularity][1] == 0:
+            return granularity
+    return None
+
+
+def rollup_query(granularity):
+    table = GRANULARITIES[granularity][0]
+    aggregates = ',\n               '.join(
+        f"MIN({m}_min), SUM({m}_sum) / SUM(n), MAX({m}_max)" for m, _ in METRICS
+    )
+    return f"""
+        SELECT FLOOR(UNIX_TIMESTAMP(bucket_start) / %s) AS bucket_no,
+               SUM(n),
+               {aggregates}
+        FROM {table}
+        WHERE bucket_start >= %s AND bucket_start < %s
+        GROUP BY bucket_no
+        ORDER BY bucket_no
+    """
+
+
+def summary_query(granularity):
+    """Per bucket and status: count, mean and population stddev of every metric."""
+    table = GRANULARITIES[granularity][0]
+    columns = ',\n               '.join(
+        f"{m}_sum / n AS {m}_mean, "
+        f"SQRT(GREATEST({m}_sumsq / n - POW({m}_sum / n, 2), 0)) AS {m}_std, "
+        f"{m}_min, {m}_max"
+        for m, _ in METRICS
+    )
+    return f"""
+        SELECT bucket_start, status, n,
+               {columns}
+        FROM {table}
+        WHERE bucket_start >= %s AND bucket_start < %s
+        ORDER BY bucket_start
+    """
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Rebuild milk_test rollup tables from raw rows")
+    parser.add_argument('--backfill', action='store_true', required=True)
+    parser.add_argument('--from', dest='start', type=datetime.fromisoformat, default=datetime(1970, 1, 2))
+    parser.add_argument('--to', dest='end', type=datetime.fromisoformat, default=None)
+    parser.add_argument('--granularity', choices=sorted(GRANULARITIES), action='append')
+    parser.add_argument('--backend', choices=BACKENDS, help="default: CONFIG['storage']['backend']")
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend)
+    conn = backend.connect()
+    try:
+        backfill(conn, args.start, args.end or datetime.now(), tuple(args.granularity or GRANULARITIES),
+                 backend.layout)
+    finally:
+        conn.close()
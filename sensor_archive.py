@@ -0,0 +1,367 @@
+import argparse
+import csv
+import glob
+import io
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = pa.schema([
+    ('titrable_acidity', pa.float64()),
+    ('temperature', pa.float64()),
+    ('pH', pa.float64()),
+    ('conductivity', pa.float64()),
+    ('status', pa.string()),
+    ('created_at', pa.timestamp('us')),
+    ('device_id', pa.string()),
+])
+COLUMNS = SCHEMA.names
+# strftime pattern of the partition key; one file per key
+PARTITIONS = {'hour': '%Y-%m-%dT%H', 'day': '%Y-%m-%d'}
+INDEX_FILE = 'index.json'
+
+
+class SensorArchive:
+    """Append-only columnar archive of sensor readings, partitioned by hour or day.
+
+    Rows from the sensor writer are buffered and appended to the open partition as
+    Arrow record batches (an uncompressed IPC stream, so a crash loses at most the
+    buffer). When the clock moves into the next partition the stream is compacted to a
+    zstd Parquet file. index.json lists every partition with its row count, time range
+    and devices, so readers open only the files and columns they need.
+
+    Only the service should open the archive for writing. Scripts and HTTP workers
+    open it with readonly=True, which never compacts or rewrites files the service
+    still owns and re-reads index.json whenever the writer has replaced it.
+    """
+
+    def __init__(self, root, partition='hour', flush_rows=1000, flush_interval=60.0, readonly=False):
+        if partition not in PARTITIONS:
+            raise ValueError(f"partition must be one of {sorted(PARTITIONS)}")
+        self.root = root
+        self.partition = partition
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._key_format = PARTITIONS[partition]
+        self._lock = threading.Lock()
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self._key = None
+        self._stream = None
+        self._sink = None
+        self._open_meta = None
+        self.readonly = readonly
+        if not readonly:
+            os.makedirs(root, exist_ok=True)
+        self._index_version = self._index_stat()
+        self.index = self._load_index()
+        if not readonly:
+            self._recover()
+
+    # Index
+
+    def _index_path(self):
+        return os.path.join(self.root, INDEX_FILE)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'partition': self.partition, 'partitions': {}}
+
+    def _index_stat(self):
+        # _save_index replaces the file, so inode + mtime change on every save
+        try:
+            st = os.stat(self._index_path())
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _refresh_index(self, force=False):
+        # Read-only openers follow the writer as it opens and compacts partitions
+        if not self.readonly:
+            return
+        version = self._index_stat()
+        if force or version != self._index_version:
+            self._index_version = version
+            self.index = self._load_index()
+
+    def _save_index(self):
+        tmp = self._index_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._index_path())
+
+    def _recover(self):
+        # Streams left open by a crash or restart are compacted before anything else
+        for path in sorted(glob.glob(os.path.join(self.root, '*.arrow'))):
+            key = os.path.basename(path)[:-len('.arrow')]
+            self._compact(key, path)
+        self._save_index()
+
+    # Writing
+
+    def write(self, rows):
+        """Buffer writer rows (ta, temp, ph, cond, status, created_at[, device_id])."""
+        if self.readonly:
+            raise RuntimeError("archive was opened read-only")
+        with self._lock:
+            self._rows.extend(rows)
+            if (len(self._rows) >= self.flush_rows
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        if self.readonly:
+            return
+        with self._lock:
+            self._flush()
+            if self._key is not None:
+                self._close_partition()
+            self._save_index()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        # Rows arrive in time order, so a batch splits into runs of one partition each
+        start = 0
+        for i in range(1, len(rows) + 1):
+            if i == len(rows) or self._partition_key(rows[i][5]) != self._partition_key(rows[start][5]):
+                self._append(self._partition_key(rows[start][5]), rows[start:i])
+                start = i
+        self._save_index()
+
+    def _partition_key(self, created_at):
+        return created_at.strftime(self._key_format)
+
+    def _append(self, key, rows):
+        if key != self._key:
+            if self._key is not None:
+                self._close_partition()
+            self._open_partition(key)
+        columns = list(zip(*rows))
+        device = columns[6] if len(columns) > 6 else [None] * len(rows)
+        batch = pa.record_batch(list(columns[:6]) + [device], schema=SCHEMA)
+        self._stream.write_batch(batch)
+        self._sink.flush()
+        meta = self._open_meta
+        meta['rows'] += len(rows)
+        meta['start'] = min(meta['start'] or rows[0][5].isoformat(), rows[0][5].isoformat())
+        meta['end'] = max(meta['end'] or rows[-1][5].isoformat(), rows[-1][5].isoformat())
+        meta['devices'] = sorted(set(meta['devices']) | {d for d in device if d is not None})
+
+    def _open_partition(self, key):
+        existing = self.index['partitions'].get(key)
+        if existing is not None and existing['format'] == 'parquet':
+            # Late rows for a partition that was already compacted: reopen it as a stream
+            # seeded with the compacted rows, to be compacted again on close
+            table = pq.read_table(os.path.join(self.root, existing['file']))
+        else:
+            table = None
+        self._key = key
+        self._sink = open(os.path.join(self.root, f'{key}.arrow'), 'wb')
+        self._stream = pa.ipc.new_stream(self._sink, SCHEMA)
+        self._open_meta = self.index['partitions'][key] = {
+            'file': f'{key}.arrow', 'format': 'arrow', 'rows': 0,
+            'start': None, 'end': None, 'devices': [],
+        }
+        if table is not None:
+            self._stream.write_table(table.cast(SCHEMA))
+            self._sink.flush()
+            # The stream now holds those rows; on a crash _recover rebuilds the Parquet file
+            os.remove(os.path.join(self.root, existing['file']))
+            self._open_meta.update({k: existing[k] for k in ('rows', 'start', 'end', 'devices')})
+
+    def _close_partition(self):
+        self._stream.close()
+        self._sink.close()
+        key = self._key
+        self._key = self._stream = self._sink = self._open_meta = None
+        self._compact(key, os.path.join(self.root, f'{key}.arrow'))
+
+    def _compact(self, key, path):
+        table = read_stream(path).sort_by('created_at')
+        target = os.path.join(self.root, f'{key}.parquet')
+        if len(table):
+            tmp = target + '.tmp'
+            pq.write_table(table, tmp, compression='zstd')
+            os.replace(tmp, target)
+            devices = pc.unique(table['device_id']).drop_null().to_pylist()
+            times = table['created_at']
+            self.index['partitions'][key] = {
+                'file': f'{key}.parquet', 'format': 'parquet', 'rows': len(table),
+                'start': pc.min(times).as_py().isoformat(), 'end': pc.max(times).as_py().isoformat(),
+                'devices': sorted(devices), 'bytes': os.path.getsize(target),
+            }
+        else:
+            self.index['partitions'].pop(key, None)
+        os.remove(path)
+
+    # Reading
+
+    def partitions(self, start=None, end=None, devices=None):
+        """Index entries overlapping [start, end) and holding any of `devices`."""
+        with self._lock:
+            self._refresh_index()
+            entries = sorted((key, dict(meta)) for key, meta in self.index['partitions'].items())
+        selected = []
+        for key, meta in entries:
+            if not meta['rows']:
+                continue
+            if start is not None and meta['end'] < start.isoformat():
+                continue
+            if end is not None and meta['start'] >= end.isoformat():
+                continue
+            if devices is not None and not set(devices) & set(meta['devices']):
+                continue
+            selected.append(dict(meta, key=key))
+        return selected
+
+    def scan(self, columns=None, start=None, end=None, devices=None):
+        """Yield one pyarrow Table per matching partition, filtered to the window and
+        devices and restricted to `columns`. Buffered rows are flushed first."""
+        self.flush()
+        columns = list(columns or COLUMNS)
+        needed = list(dict.fromkeys(columns + (['created_at'] if start or end else [])
+                                    + (['device_id'] if devices else [])))
+        for meta in self.partitions(start, end, devices):
+            try:
+                table = self._read_partition(meta, needed)
+            except FileNotFoundError:
+                # Compacted between listing and reading: the index now points at the Parquet file
+                with self._lock:
+                    self._refresh_index(force=True)
+                    meta = self.index['partitions'].get(meta['key'])
+                if meta is None:
+                    continue
+                table = self._read_partition(meta, needed)
+            mask = None
+            if start is not None:
+                mask = pc.greater_equal(table['created_at'], pa.scalar(start, pa.timestamp('us')))
+            if end is not None:
+                upper = pc.less(table['created_at'], pa.scalar(end, pa.timestamp('us')))
+                mask = upper if mask is None else pc.and_(mask, upper)
+            if devices is not None:
+                in_devices = pc.is_in(table['device_id'], pa.array(list(devices), pa.string()))
+                mask = in_devices if mask is None else pc.and_(mask, in_devices)
+            if mask is not None:
+                table = table.filter(mask)
+            if len(table):
+                yield table.select(columns)
+
+    def _read_partition(self, meta, columns):
+        path = os.path.join(self.root, meta['file'])
+        if meta['format'] == 'parquet':
+            return pq.read_table(path, columns=columns)
+        return read_stream(path).select(columns)
+
+    def read(self, columns=None, start=None, end=None, devices=None):
+        tables = list(self.scan(columns, start, end, devices))
+        if not tables:
+            return SCHEMA.empty_table().select(list(columns or COLUMNS)).to_pandas()
+        return pa.concat_tables(tables).to_pandas()
+
+    def export_csv(self, columns=None, start=None, end=None, devices=None):
+        """CSV text generated partition by partition, for streaming downloads."""
+        columns = list(columns or COLUMNS)
+        header = io.StringIO()
+        csv.writer(header).writerow(columns)
+        yield header.getvalue()
+        for table in self.scan(columns, start, end, devices):
+            frame = table.to_pandas()
+            if 'created_at' in frame.columns:
+                frame['created_at'] = frame['created_at'].dt.strftime('%Y-%m-%d %H:%M:%S')
+            # Same \r\n line ends as the csv module's header row
+            yield frame.to_csv(header=False, index=False, lineterminator='\r\n')
+
+    def import_csv(self, path, chunksize=50000):
+        """Load a legacy milk_data.csv into the archive (timestamps in either format)."""
+        import pandas as pd
+
+        imported = 0
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            chunk['created_at'] = pd.to_datetime(chunk['created_at'], format='mixed', errors='coerce')
+            chunk = chunk.dropna(subset=['titrable_acidity', 'temperature', 'pH', 'conductivity', 'created_at'])
+            chunk = chunk.sort_values('created_at', kind='stable')
+            if 'device_id' not in chunk.columns:
+                chunk['device_id'] = None
+            rows = [
+                (ta, temp, ph, cond, str(status), created_at.to_pydatetime(), device)
+                for ta, temp, ph, cond, status, created_at, device in chunk[COLUMNS].itertuples(index=False)
+            ]
+            self.write(rows)
+            imported += len(rows)
+        self.close()
+        return imported
+
+    def summary(self):
+        with self._lock:
+            self._refresh_index()
+            partitions = list(self.index['partitions'].values())
+        return {
+            'partition': self.partition,
+            'partitions': len(partitions),
+            'rows': sum(p['rows'] for p in partitions) + len(self._rows),
+            'buffered': len(self._rows),
+            'bytes': sum(p.get('bytes', 0) for p in partitions),
+            'open': self._key,
+        }
+
+
+def read_stream(path):
+    """Every complete record batch of an IPC stream, tolerating a torn tail."""
+    batches = []
+    try:
+        with pa.OSFile(path, 'rb') as source, pa.ipc.open_stream(source) as reader:
+            for batch in reader:
+                batches.append(batch)
+    except (pa.ArrowInvalid, OSError) as e:
+        logger.warning(f"Archive stream {path} ends early ({e}); keeping {len(batches)} batches")
+    return pa.Table.from_batches(batches, schema=SCHEMA)
+
+
+def open_archive(root=None, partition=None, readonly=False):
+    archive_config = CONFIG['archive']
+    return SensorArchive(root or archive_config['root'], partition or archive_config['partition'],
+                         readonly=readonly)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect, import into or export from the sensor archive")
+    parser.add_argument('--root', default=CONFIG['archive']['root'])
+    parser.add_argument('--import-csv', metavar='PATH', help="load a legacy milk_data.csv into the archive")
+    parser.add_argument('--export-csv', metavar='PATH', help="write the archive (or a window of it) as CSV")
+    parser.add_argument('--from', dest='start', help="ISO start time for --export-csv")
+    parser.add_argument('--to', dest='end', help="ISO end time for --export-csv")
+    args = parser.parse_args()
+
+    # Exporting from a live archive must not touch the partition the service is writing
+    archive = open_archive(args.root, readonly=not args.import_csv)
+    if args.import_csv:
+        print(f"Imported {archive.import_csv(args.import_csv)} rows from '{args.import_csv}'")
+    if args.export_csv:
+        start = datetime.fromisoformat(args.start) if args.start else None
+        end = datetime.fromisoformat(args.end) if args.end else None
+        with open(args.export_csv, 'w', newline='') as f:
+            for text in archive.export_csv(start=start, end=end):
+                f.write(text)
+        print(f"Archive exported to '{args.export_csv}'")
+    print(archive.summary())
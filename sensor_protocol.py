@@ -0,0 +1,182 @@
+import argparse
+import math
+import re
+import time
+
+# Arduino key -> reading attribute, in the order the firmware prints them
+FIELDS = (('TA', 'ta'), ('Temp', 'temp'), ('pH', 'ph'), ('Conductivity', 'cond'))
+KEYS = dict(FIELDS)
+DEFAULT_STATUS = 'Unknown'
+# Banner lines the firmware prints instead of readings
+CONTROL_MARKERS = ('SIMULATION_MODE', 'READY')
+
+# Integer, decimal, exponent or NaN, optionally followed by a unit (24.1C, 1.02mS/cm, 0.15%)
+_NUMBER_RE = re.compile(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[nN][aA][nN])\s*(?:[A-Za-z%°µ/]+)?\s*$')
+# Fast path: the canonical "TA=..,Temp=..,pH=..,Conductivity=..[,Status=..]" line. The
+# values are handed straight to float(); anything float() rejects (units, stray spaces
+# around keys) falls through to the slower pair-by-pair parse
+_LINE_RE = re.compile(
+    ','.join(f'{key}=([^,]*)' for key, _ in FIELDS) + r'(?:,Status=([^,]*))?$'
+)
+
+
+class Reading:
+    """One parsed sensor line. Slotted, and indexable like the dict the old parser
+    returned (reading['ta'], reading.get('device_id')) so the pipeline takes either."""
+    __slots__ = ('ta', 'temp', 'ph', 'cond', 'status', 'device_id', 'created_at')
+
+    def __init__(self, ta, temp, ph, cond, status=DEFAULT_STATUS, device_id=None, created_at=None):
+        self.ta = ta
+        self.temp = temp
+        self.ph = ph
+        self.cond = cond
+        self.status = status
+        self.device_id = device_id
+        self.created_at = created_at
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    @property
+    def values(self):
+        return (self.ta, self.temp, self.ph, self.cond)
+
+    @property
+    def is_finite(self):
+        return all(math.isfinite(v) for v in self.values)
+
+    def __repr__(self):
+        return (f"Reading(ta={self.ta}, temp={self.temp}, ph={self.ph}, cond={self.cond}, "
+                f"status={self.status!r}, device_id={self.device_id!r})")
+
+
+def _parse_pairs(line, device_id):
+    # Any field order, extra keys ignored; every schema field must be present
+    found = {}
+    status = DEFAULT_STATUS
+    for pair in line.split(','):
+        key, sep, value = pair.partition('=')
+        if not sep:
+            continue
+        key = key.strip()
+        if key == 'Status':
+            status = value.strip() or DEFAULT_STATUS
+        elif key in KEYS:
+            match = _NUMBER_RE.match(value)
+            if match is None:
+                return None
+            found[KEYS[key]] = float(match.group(1))
+    if len(found) != len(FIELDS):
+        return None
+    return Reading(found['ta'], found['temp'], found['ph'], found['cond'], status, device_id)
+
+
+def parse_line(line, device_id=None):
+    """Parse one protocol line into a Reading, or None for banners, blank or malformed
+    lines. Values may be integers, decimals, NaN or carry a unit suffix."""
+    match = _LINE_RE.match(line)
+    if match is not None:
+        ta, temp, ph, cond, status = match.groups()
+        try:
+            return Reading(float(ta), float(temp), float(ph), float(cond), status or DEFAULT_STATUS, device_id)
+        except ValueError:
+            pass
+    if not line or line.isspace() or any(marker in line for marker in CONTROL_MARKERS):
+        return None
+    return _parse_pairs(line, device_id)
+
+
+def parse_buffer(buffer, device_id=None):
+    """Parse every complete line in a bytes buffer in one call.
+
+    Returns (readings, rest): rest is the trailing partial line to prepend to the next
+    buffer. Lines that do not parse are skipped."""
+    end = buffer.rfind(b'\n') + 1
+    text = buffer[:end].decode('utf-8', errors='replace').replace('\r', '')
+    readings = []
+    append = readings.append
+    match = _LINE_RE.match
+    for line in text.split('\n'):
+        m = match(line)
+        if m is not None:
+            ta, temp, ph, cond, status = m.groups()
+            try:
+                append(Reading(float(ta), float(temp), float(ph), float(cond), status or DEFAULT_STATUS, device_id))
+                continue
+            except ValueError:
+                pass
+        reading = parse_line(line.strip(), device_id)
+        if reading is not None:
+            append(reading)
+    return readings, buffer[end:]
+
+
+def legacy_parse(line):
+    """The dict-building parser insert_data.py used before this module, kept only as
+    the benchmark baseline. Its two DEBUG log calls are left out, so this understates
+    what it cost in the service."""
+    try:
+        if not line.strip():
+            return None
+        if "SIMULATION_MODE" in line or "READY" in line:
+            return None
+        data = {}
+        for pair in line.split(','):
+            if '=' in pair:
+                key, value = pair.split('=', 1)
+                try:
+                    data[key.strip()] = float(value) if '.' in value else value
+                except ValueError:
+                    return None
+        required = ['TA', 'Temp', 'pH', 'Conductivity']
+        if all(k in data for k in required):
+            return {
+                'ta': data['TA'],
+                'temp': data['Temp'],
+                'ph': data['pH'],
+                'cond': data['Conductivity'],
+                'status': data.get('Status', 'Unknown')
+            }
+        return None
+    except Exception:
+        return None
+
+
+def benchmark(lines=100000):
+    sample = [
+        f"TA={0.12 + (i % 50) / 1000:.3f},Temp={20 + (i % 100) / 10:.1f},pH={6.4 + (i % 30) / 100:.2f},"
+        f"Conductivity={0.9 + (i % 40) / 100:.2f},Status=Fresh"
+        for i in range(1000)
+    ]
+    text = [sample[i % len(sample)] for i in range(lines)]
+    buffer = ('\r\n'.join(text) + '\r\n').encode()
+
+    def timed(fn, repeats=5):
+        # Best of several runs; a shared box is noisy
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return lines / best
+
+    return {
+        'legacy_lines_per_s': timed(lambda: [legacy_parse(line) for line in text]),
+        'parse_line_lines_per_s': timed(lambda: [parse_line(line) for line in text]),
+        'parse_buffer_lines_per_s': timed(lambda: parse_buffer(buffer)),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the sensor line parser")
+    parser.add_argument('--lines', type=int, default=100000)
+    args = parser.parse_args()
+
+    for key, value in benchmark(args.lines).items():
+        print(f"{key}: {value:,.0f}")
@@ -0,0 +1,305 @@
+import csv
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+INSERT_SECONDS = REGISTRY.histogram('db_insert_seconds', "Insert time per writer batch, rollups included")
+COMMIT_SECONDS = REGISTRY.histogram('db_commit_seconds', "Commit time per writer batch")
+BATCH_ROWS = REGISTRY.histogram('db_batch_rows', "Rows per committed writer batch",
+                                buckets=(1, 5, 10, 25, 50, 100, 200, 500, 1000), unit='rows')
+
+CSV_COLUMNS = ['titrable_acidity', 'temperature', 'pH', 'conductivity', 'status', 'created_at', 'device_id']
+
+INSERT_SQL = """
+    INSERT INTO milk_test (titrable_acidity, temperature, pH, conductivity, status, created_at, device_id,
+                           is_simulated)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+def insert_wide(cursor, rows):
+    # One wide milk_test row per reading (milk_partitioning.sql layout); simulator
+    # readings are flagged the same way insert_normalised does it
+    cursor.executemany(INSERT_SQL, [row + (row[4] == 'Simulated',) for row in rows])
+
+
+class SensorWriter:
+    """Background stage that persists readings in batches.
+
+    The serial thread only calls submit(), which never blocks: readings go into a
+    bounded queue and a worker thread drains it, writing each batch with one
+    executemany + commit and one CSV write on a persistent file handle. A batch is
+    flushed when it reaches batch_size or when flush_interval seconds have passed
+    since its first reading. If the database is down the batch is kept and retried;
+    once the queue fills up new readings are dropped and counted. A batch the
+    database rejects for its data (is_data_error) is bisected instead: the good rows
+    are committed and each bad one goes to the dead-letter CSV, so one bad reading
+    cannot hold up the rest.
+    """
+
+    def __init__(self, get_connection, release_connection, csv_path='milk_data.csv',
+                 max_queue=10000, batch_size=200, flush_interval=1.0, max_pending=50000,
+                 on_batch=None, on_commit=None, archive=None, insert=insert_wide,
+                 is_data_error=None, dead_letter_path='rejected_readings.csv'):
+        self._get_connection = get_connection
+        self._release_connection = release_connection
+        # insert(cursor, rows) writes a batch for the schema layout in use
+        self._insert = insert
+        # Optional hook(cursor, rows) run in the batch transaction before commit
+        self._on_batch = on_batch
+        # Optional hook(rows) run after a batch has committed
+        self._on_commit = on_commit
+        # is_data_error(exc) tells rows the database refuses (constraints, bad ENUM
+        # values) from transient failures worth retrying as they are
+        self._is_data_error = is_data_error or (lambda error: False)
+        self.dead_letter_path = dead_letter_path
+        self.csv_path = csv_path
+        # When an archive (anything with write(rows)/close()) is given, batches go there
+        # instead of the CSV file
+        self._archive = archive
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._high_water = int(max_queue * 0.8)
+        self._pending = []
+        self._csv_file = None
+        self._csv_writer = None
+        self._csv_device = True
+        self._thread = None
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'written': 0,
+            'batches': 0,
+            'dropped': 0,
+            'backpressure': 0,
+            'db_errors': 0,
+            'rejected': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': None,
+        }
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def submit(self, data):
+        row = (
+            data['ta'],
+            data['temp'],
+            data['ph'],
+            data['cond'],
+            data['status'],
+            data.get('created_at') or datetime.now(),
+            data.get('device_id'),
+        )
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('submitted')
+        if self._queue.qsize() >= self._high_water:
+            self._count('backpressure')
+        return True
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sensor-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._csv_file:
+            self._csv_file.close()
+            self._csv_file = None
+        if self._archive is not None:
+            self._archive.close()
+
+    def snapshot(self):
+        with self._stats_lock:
+            report = dict(self.stats)
+        report['queued'] = self._queue.qsize()
+        report['pending'] = len(self._pending)
+        return report
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._collect()
+            if batch:
+                self._write_local(batch)
+                self._pending.extend(batch)
+                if len(self._pending) > self.max_pending:
+                    overflow = len(self._pending) - self.max_pending
+                    del self._pending[:overflow]
+                    self._count('dropped', overflow)
+            elif self._archive is not None:
+                # Idle tick: lets the archive flush its time-based buffer
+                self._write_local([])
+            # Keep flushing full batches while the database keeps up, so a backlog
+            # built up during an outage shrinks instead of growing
+            while self._pending and self._flush_db() and len(self._pending) >= self.batch_size:
+                pass
+        while self._pending and self._flush_db():
+            pass
+
+    def _collect(self):
+        # Block for the first row, then keep draining until the batch is full or the
+        # flush interval since that first row has expired
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_local(self, batch):
+        if self._archive is None:
+            self._write_csv(batch)
+            return
+        try:
+            self._archive.write(batch)
+        except Exception as e:
+            logger.error(f"Archive write error: {e}")
+
+    def _write_csv(self, batch):
+        try:
+            if self._csv_file is None:
+                new_file = not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) == 0
+                if not new_file:
+                    # Files started before device tagging keep their original six columns
+                    with open(self.csv_path, newline='') as f:
+                        self._csv_device = 'device_id' in next(csv.reader(f), [])
+                self._csv_file = open(self.csv_path, 'a', newline='')
+                self._csv_writer = csv.writer(self._csv_file)
+                if new_file:
+                    self._csv_writer.writerow(CSV_COLUMNS)
+            width = 7 if self._csv_device else 6
+            self._csv_writer.writerows(
+                (row[:5] + (row[5].strftime('%Y-%m-%d %H:%M:%S'),) + row[6:])[:width] for row in batch
+            )
+            self._csv_file.flush()
+        except OSError as e:
+            logger.error(f"CSV write error: {e}")
+
+    def _write_dead_letters(self, rows, error):
+        try:
+            new_file = not os.path.exists(self.dead_letter_path) or os.path.getsize(self.dead_letter_path) == 0
+            with open(self.dead_letter_path, 'a', newline='') as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(CSV_COLUMNS + ['error'])
+                writer.writerows(row[:5] + (row[5].strftime('%Y-%m-%d %H:%M:%S'),) + row[6:] + (str(error),)
+                                 for row in rows)
+        except OSError as e:
+            logger.error(f"Dead-letter write error: {e}")
+
+    def _commit_batch(self, conn, batch):
+        # Writes the head of _pending in one transaction and removes it on success
+        cursor = conn.cursor()
+        try:
+            insert_start = time.perf_counter()
+            self._insert(cursor, batch)
+            if self._on_batch:
+                self._on_batch(cursor, batch)
+            commit_start = time.perf_counter()
+            conn.commit()
+        finally:
+            cursor.close()
+        INSERT_SECONDS.observe(commit_start - insert_start)
+        COMMIT_SECONDS.observe(time.perf_counter() - commit_start)
+        BATCH_ROWS.observe(len(batch))
+        del self._pending[:len(batch)]
+        if self._on_commit:
+            self._on_commit(batch)
+        with self._stats_lock:
+            self.stats['written'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['last_batch_size'] = len(batch)
+
+    def _isolate(self, conn, batch):
+        # Bisect a batch rejected for its data, left half first so everything ahead of
+        # the part being tried is already committed or dead-lettered. A transient error
+        # on the way propagates and the remainder is retried as usual.
+        parts = [batch]
+        while parts:
+            part = parts.pop()
+            try:
+                self._commit_batch(conn, part)
+                continue
+            except Exception as e:
+                conn.rollback()
+                if not self._is_data_error(e):
+                    raise
+                error = e
+            if len(part) > 1:
+                mid = len(part) // 2
+                parts.append(part[mid:])
+                parts.append(part[:mid])
+                continue
+            logger.error(f"Rejected reading {part[0]}: {error}")
+            self._write_dead_letters(part, error)
+            del self._pending[:1]
+            self._count('rejected')
+
+    def _flush_db(self):
+        conn = None
+        start = time.perf_counter()
+        try:
+            conn = self._get_connection()
+            if not conn:
+                self._count('db_errors')
+                logger.error("Database connection failed, keeping batch for retry.")
+                self._stop.wait(self.flush_interval)
+                return False
+            batch = self._pending[:self.batch_size]
+            try:
+                self._commit_batch(conn, batch)
+            except Exception as e:
+                if not self._is_data_error(e):
+                    raise
+                logger.warning(f"Batch of {len(batch)} rejected ({e}); isolating the bad rows")
+                conn.rollback()
+                self._isolate(conn, batch)
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                self.stats['last_flush_ms'] = elapsed
+            logger.debug(f"Inserted batch of {len(batch)} readings in {elapsed:.1f} ms")
+            return True
+        except Exception as e:
+            self._count('db_errors')
+            logger.error(f"Batch insert error: {e}")
+            if conn:
+                try:
+                    conn.rollback()
+                except Exception:
+                    # The connection itself is broken: drop it rather than pool it
+                    if hasattr(conn, 'invalidate'):
+                        conn.invalidate()
+                        conn = None
+            self._stop.wait(self.flush_interval)
+            return False
+        finally:
+            if conn:
+                self._release_connection(conn)
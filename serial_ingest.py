@@ -0,0 +1,258 @@
+import argparse
+import logging
+import random
+import selectors
+import threading
+import time
+
+import serial
+
+logger = logging.getLogger(__name__)
+
+
+class SerialPort:
+    """One analyser connection: opens the port, frames bytes into lines and tracks its
+    own reconnect backoff. Used by SerialIngest, never shared between threads."""
+
+    def __init__(self, device_id, port, opener, backoff_initial=0.5, backoff_max=30.0,
+                 max_line=1024, **options):
+        self.device_id = device_id
+        self.port = port
+        self.options = options
+        self._opener = opener
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_line = max_line
+        self.ser = None
+        self.failures = 0
+        self.next_attempt = 0.0
+        self._buffer = bytearray()
+        self.stats = {
+            'connected': False,
+            'lines': 0,
+            'bytes': 0,
+            'connects': 0,
+            'errors': 0,
+            'oversized_lines': 0,
+            'last_line_at': None,
+            'last_error': None,
+        }
+
+    def connect(self):
+        logger.info(f"Connecting to {self.device_id} on {self.port}...")
+        self.ser = self._opener(self.port, **self.options)
+        self._buffer.clear()
+        self.stats['connected'] = True
+        self.stats['connects'] += 1
+        logger.info(f"Connected to {self.device_id}.")
+
+    def fileno(self):
+        # None when the port cannot be polled (Windows COM ports, loop:// URLs)
+        try:
+            return self.ser.fileno()
+        except (AttributeError, OSError):
+            return None
+
+    def read(self):
+        # Everything already received, or block up to the port timeout for one byte
+        return self.ser.read(max(1, self.ser.in_waiting))
+
+    def feed(self, data):
+        """Append received bytes and return the complete lines they finish."""
+        self.stats['bytes'] += len(data)
+        self._buffer += data
+        if b'\n' not in data:
+            if len(self._buffer) > self.max_line:
+                # No newline in sight: the stream is garbage, resynchronise on the next one
+                self._buffer.clear()
+                self.stats['oversized_lines'] += 1
+            return []
+        *lines, rest = self._buffer.split(b'\n')
+        self._buffer = bytearray(rest)
+        self.failures = 0
+        self.stats['lines'] += len(lines)
+        self.stats['last_line_at'] = time.time()
+        return [line.decode('utf-8', errors='replace').strip() for line in lines]
+
+    def fail(self, error):
+        """Close the port and schedule the next attempt with exponential backoff."""
+        delay = min(self.backoff_max, self.backoff_initial * 2 ** self.failures)
+        delay += random.uniform(0, delay * 0.1)
+        self.failures += 1
+        # Set before ser is cleared: the selector thread reconnects once ser is None
+        self.next_attempt = time.monotonic() + delay
+        ser, self.ser = self.ser, None
+        if ser is not None:
+            try:
+                ser.close()
+            except Exception:
+                pass
+        self.stats['connected'] = False
+        self.stats['errors'] += 1
+        self.stats['last_error'] = str(error)
+        logger.error(f"Serial error on {self.device_id} ({self.port}): {error}; retrying in {delay:.1f}s")
+
+    def snapshot(self):
+        report = dict(self.stats)
+        report.update({'port': self.port, 'failures': self.failures})
+        return report
+
+
+class SerialIngest:
+    """Reads any number of serial analysers without busy-waiting.
+
+    Ports that expose a file descriptor (Linux/macOS devices, ptys) are multiplexed on
+    one selector thread that sleeps until a port is readable or a reconnect is due.
+    Ports that cannot be polled (Windows COM ports, pyserial loop:// URLs) get a thread
+    of their own that blocks in read() for up to the port timeout. Every complete line
+    is handed to on_line(device_id, line) on the reading thread.
+    """
+
+    def __init__(self, ports, on_line, opener=serial.serial_for_url, baudrate=9600, timeout=2,
+                 backoff_initial=0.5, backoff_max=30.0):
+        self.on_line = on_line
+        self.ports = [
+            SerialPort(
+                spec['device_id'], spec['port'], opener,
+                backoff_initial=backoff_initial, backoff_max=backoff_max,
+                baudrate=spec.get('baudrate', baudrate), timeout=spec.get('timeout', timeout),
+            )
+            for spec in ports
+        ]
+        self._selector = selectors.DefaultSelector()
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._select_loop, name='serial-ingest', daemon=True)]
+        self._threads[0].start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        for port in self.ports:
+            if port.ser is not None:
+                self._unregister(port)
+                port.ser.close()
+                port.ser = None
+                port.stats['connected'] = False
+
+    def snapshot(self):
+        return {port.device_id: port.snapshot() for port in self.ports}
+
+    @property
+    def connected(self):
+        return any(port.stats['connected'] for port in self.ports)
+
+    def _deliver(self, port, data):
+        for line in port.feed(data):
+            if line:
+                try:
+                    self.on_line(port.device_id, line)
+                except Exception as e:
+                    logger.error(f"Line handler failed for {port.device_id}: {e}")
+
+    def _unregister(self, port):
+        try:
+            self._selector.unregister(port.ser)
+        except (KeyError, ValueError):
+            pass
+
+    def _connect(self, port):
+        try:
+            port.connect()
+        except Exception as e:
+            port.fail(e)
+            return
+        if port.fileno() is None:
+            # Hand the port to a blocking reader thread until it fails
+            thread = threading.Thread(target=self._blocking_loop, args=(port,),
+                                      name=f'serial-{port.device_id}', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+        else:
+            self._selector.register(port.ser, selectors.EVENT_READ, port)
+
+    def _select_loop(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            waits = [1.0]
+            for port in self.ports:
+                if port.ser is None:
+                    if port.next_attempt <= now:
+                        self._connect(port)
+                    if port.ser is None:
+                        waits.append(port.next_attempt - now)
+            # Sleep until a port has data or the next reconnect is due (at most 1s so
+            # stop() is noticed); with no polled ports registered, just wait
+            timeout = max(0.0, min(waits))
+            if not self._selector.get_map():
+                self._stop.wait(timeout)
+                continue
+            for key, _ in self._selector.select(timeout):
+                port = key.data
+                try:
+                    data = port.read()
+                except Exception as e:
+                    self._unregister(port)
+                    port.fail(e)
+                    continue
+                self._deliver(port, data)
+
+    def _blocking_loop(self, port):
+        while not self._stop.is_set():
+            try:
+                data = port.read()
+            except Exception as e:
+                # The selector thread owns reconnects for every port
+                port.fail(e)
+                return
+            if data:
+                self._deliver(port, data)
+
+
+def open_pty():
+    """A pseudo-terminal pair standing in for an Arduino: write lines to the returned
+    master fd and point SerialIngest at the slave device path."""
+    import os
+    import pty
+    import tty
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    return master, os.ttyname(slave)
+
+
+if __name__ == '__main__':
+    # Self-check with pty stand-ins: python serial_ingest.py --devices 3 --lines 1000
+    import os
+
+    parser = argparse.ArgumentParser(description="Exercise the serial ingest loop against pty analysers")
+    parser.add_argument('--devices', type=int, default=2)
+    parser.add_argument('--lines', type=int, default=1000)
+    args = parser.parse_args()
+
+    received = {}
+    ptys = [open_pty() for _ in range(args.devices)]
+    ingest = SerialIngest(
+        [{'device_id': f'analyser-{i}', 'port': path} for i, (_, path) in enumerate(ptys)],
+        lambda device_id, line: received.__setitem__(device_id, received.get(device_id, 0) + 1),
+    )
+    ingest.start()
+    # pyserial discards pending input when it opens a port, so wait for every port first
+    while not all(port.stats['connected'] for port in ingest.ports):
+        time.sleep(0.01)
+    start = time.perf_counter()
+    line = b"TA=0.150,Temp=24.0,pH=6.60,Conductivity=1.00,Status=Fresh\r\n"
+    for _ in range(args.lines):
+        for master, _ in ptys:
+            os.write(master, line)
+    while sum(received.values()) < args.lines * args.devices and time.perf_counter() - start < 30:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    ingest.stop()
+    print(f"{sum(received.values())} lines from {len(received)} devices in {elapsed:.2f}s")
+    for device_id, stats in ingest.snapshot().items():
+        print(f"  {device_id}: {stats}")
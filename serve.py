@@ -0,0 +1,160 @@
+import argparse
+import logging
+import multiprocessing
+import signal
+import socket
+import threading
+import time
+from multiprocessing.connection import wait
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Seconds between publications of the ingest status the workers report
+STATUS_INTERVAL = 1.0
+
+
+def listen(host, port, backlog=128):
+    # Bound once here; every worker accepts on the same socket and the kernel hands
+    # each connection to whichever is waiting
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def run_worker(sock, ring_name, ready, access_log=True):
+    """HTTP worker process: the Flask app serving from the shared ring. It never opens
+    a serial port, loads a model or writes readings, so any number can run."""
+    CONFIG['serving']['role'] = 'worker'
+    import insert_data
+    from shared_ring import SharedReadingRingBuffer
+    from startup import STARTUP
+    from werkzeug.serving import make_server
+
+    if not access_log:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    STARTUP.run([('shared_buffer', lambda: insert_data.use_shared_buffer(
+        SharedReadingRingBuffer.attach(ring_name, untrack=False)))])
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, insert_data.app, threaded=True, fd=sock.fileno())
+    STARTUP.mark('listening')
+    ready.release()
+    # The ingest process stops the workers; Ctrl+C reaches every process in the group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    server.serve_forever()
+    insert_data.DATA_BUFFER.close()
+
+
+class WorkerPool:
+    """Starts `size` HTTP workers on a listening socket and replaces any that die."""
+
+    def __init__(self, sock, ring_name, size, access_log=True):
+        # spawn, not fork: workers start clean of the ingest process' threads and connections
+        self._context = multiprocessing.get_context('spawn')
+        self._ready = self._context.Semaphore(0)
+        self.sock = sock
+        self.ring_name = ring_name
+        self.size = size
+        self.access_log = access_log
+        self.workers = []
+        self.restarts = 0
+
+    def _spawn(self, index):
+        worker = self._context.Process(target=run_worker, name=f'http-worker-{index}', daemon=True,
+                                       args=(self.sock, self.ring_name, self._ready, self.access_log))
+        worker.start()
+        return worker
+
+    def start(self):
+        self.workers = [self._spawn(i) for i in range(self.size)]
+
+    def wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        for _ in range(self.size):
+            if not self._ready.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise TimeoutError(f"HTTP workers not listening after {timeout}s")
+
+    def supervise(self, stop):
+        while not stop.is_set():
+            wait([w.sentinel for w in self.workers], timeout=1.0)
+            for i, worker in enumerate(self.workers):
+                if worker.exitcode is not None and not stop.is_set():
+                    logger.warning(f"{worker.name} exited with {worker.exitcode}; restarting it")
+                    self.workers[i] = self._spawn(i)
+                    self.restarts += 1
+
+    def stop(self, timeout=5):
+        for worker in self.workers:
+            worker.terminate()
+        for worker in self.workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.kill()
+
+
+def publish_status(app, ring, stop):
+    while not stop.wait(STATUS_INTERVAL):
+        try:
+            ring.publish_status(app.ingest_snapshot())
+        except Exception as e:
+            logger.error(f"Publishing ingest status failed: {e}")
+
+
+def serve(host='127.0.0.1', port=5000, workers=None, ring_name=None, access_log=True):
+    """Run the service as one ingest process (this one) and `workers` HTTP processes."""
+    from shared_ring import check_platform
+
+    # Before touching the serial ports: fail fast where the shared ring is unsafe
+    check_platform()
+    settings = CONFIG['serving']
+    workers = workers or settings['workers']
+    ring_name = ring_name or settings['ring']
+    settings['role'] = 'ingest'
+    import insert_data
+    from shared_ring import SharedReadingRingBuffer
+
+    ring = SharedReadingRingBuffer.create(ring_name, insert_data.DATA_BUFFER.fields, CONFIG['buffer']['capacity'])
+    insert_data.use_shared_buffer(ring)
+    sock = listen(host, port)
+    pool = WorkerPool(sock, ring_name, workers, access_log)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        pool.start()
+        insert_data.warm_up()
+        insert_data.SENSOR_WRITER.start()
+        insert_data.SERIAL_INGEST.start()
+        ring.publish_status(insert_data.ingest_snapshot())
+        threading.Thread(target=publish_status, args=(insert_data, ring, stop), name='status-publisher',
+                         daemon=True).start()
+        pool.wait_ready()
+        logger.info(f"Serving http://{host}:{port} from {workers} worker processes")
+        pool.supervise(stop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        pool.stop()
+        insert_data.SERIAL_INGEST.stop()
+        insert_data.SENSOR_WRITER.stop()
+        sock.close()
+        ring.close()
+        ring.unlink()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Serve the dashboard from several HTTP worker processes fed by one ingest process")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=CONFIG['serving']['workers'])
+    parser.add_argument('--ring', default=CONFIG['serving']['ring'], help="shared memory name of the reading ring")
+    parser.add_argument('--no-access-log', action='store_true', help="don't log every request in the workers")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers, args.ring, access_log=not args.no_access_log)
@@ -0,0 +1,208 @@
+import json
+import logging
+import platform
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from ring_buffer import ReadingRingBuffer
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x4D494C4B52494E47  # 'MILKRING'
+# int64 header: magic, capacity, then generation and length of each JSON slot
+HEADER_SLOTS = 8
+LABELS_GEN, STATUS_GEN = 2, 4
+SLOT_BYTES = 64 * 1024
+LABELS_OFFSET = HEADER_SLOTS * 8
+# CPUs whose stores become visible to other cores in program order (TSO)
+ORDERED_STORE_MACHINES = ('x86_64', 'amd64', 'i386', 'i686', 'x86')
+STATUS_OFFSET = LABELS_OFFSET + SLOT_BYTES
+RING_OFFSET = STATUS_OFFSET + SLOT_BYTES
+
+
+class JSONSlot:
+    """A JSON value in shared memory with one writing process and any number of
+    readers. The generation is odd while a write is in progress; readers retry until
+    they copy the bytes between two reads of the same even generation, and only
+    decode when it changed since their last read."""
+
+    def __init__(self, header, gen_index, view):
+        self._header = header
+        self._gen = gen_index
+        self._view = view
+        self._seen = None
+        self._value = None
+
+    def write(self, value):
+        data = json.dumps(value, separators=(',', ':'), default=str).encode()
+        if len(data) > len(self._view):
+            raise ValueError(f"{len(data)} bytes do not fit a {len(self._view)} byte slot")
+        header = self._header
+        header[self._gen] += 1
+        self._view[:len(data)] = data
+        header[self._gen + 1] = len(data)
+        header[self._gen] += 1
+
+    def read(self, retries=100):
+        header = self._header
+        for _ in range(retries):
+            gen = int(header[self._gen])
+            if gen == self._seen:
+                return self._value
+            if gen % 2:
+                time.sleep(0)
+                continue
+            data = bytes(self._view[:int(header[self._gen + 1])])
+            if int(header[self._gen]) == gen:
+                self._value = json.loads(data) if data else None
+                self._seen = gen
+                return self._value
+        # Kept losing to the writer: the previous value is at most one write old
+        return self._value
+
+    def release(self):
+        self._view.release()
+
+
+def check_platform(machine=None):
+    """Raise RuntimeError unless this CPU keeps stores in order, which the ring's
+    lock-free readers in other processes depend on (see SharedReadingRingBuffer)."""
+    machine = (machine or platform.machine()).lower()
+    if machine not in ORDERED_STORE_MACHINES:
+        raise RuntimeError(
+            f"The shared reading ring needs an x86-64 CPU; on {machine or 'this machine'} a worker could "
+            "read a row before it is fully written. Run the single-process service (insert_data.py) instead.")
+
+
+def _attach(name, untrack=True):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the segment with the resource tracker,
+        # and a process' own tracker would unlink it under the ingest process on exit.
+        # Processes the creator started through multiprocessing share its tracker and
+        # must leave the registration alone.
+        shm = shared_memory.SharedMemory(name=name)
+        if untrack:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedReadingRingBuffer(ReadingRingBuffer):
+    """ReadingRingBuffer in a named shared-memory segment, for serve.py.
+
+    The ingest process creates it and is the only writer: it appends each reading
+    with its prediction (an extra code column into `labels`). HTTP worker processes
+    attach by name and read the rows in place with the same seqlock protocol the
+    threads of one process use. That relies on the row being visible before the
+    count, which holds on x86-64 and for the single aligned int64 store of the count.
+    Python has no portable store barrier, so create() refuses to run on CPUs with
+    weaker ordering (ARM, POWER, RISC-V); serve the single-process app there.
+    Labels and devices live in a JSON slot that is republished before any row using
+    a new code; readers resync it after each copy. A second slot carries the ingest
+    process' status for /api/system/status.
+    """
+
+    def __init__(self, shm, fields=None):
+        self._shm = shm
+        self._header = np.ndarray(HEADER_SLOTS, dtype=np.int64, buffer=shm.buf)
+        self._labels_slot = JSONSlot(self._header, LABELS_GEN, shm.buf[LABELS_OFFSET:STATUS_OFFSET])
+        self._status_slot = JSONSlot(self._header, STATUS_GEN, shm.buf[STATUS_OFFSET:RING_OFFSET])
+        self._ring_view = shm.buf[RING_OFFSET:]
+        if fields is None:
+            if int(self._header[0]) != MAGIC:
+                raise ValueError(f"shared memory '{shm.name}' does not hold a reading ring")
+            fields = self._labels_slot.read()['fields']
+        super().__init__(fields, int(self._header[1]), extra_columns=('prediction',), buffer=self._ring_view)
+        self._prediction_col = self.columns.index('prediction')
+        self._sync_labels()
+
+    @classmethod
+    def create(cls, name, fields, capacity=3600):
+        check_platform()
+        fields = tuple(fields)
+        size = RING_OFFSET + ReadingRingBuffer.nbytes(len(fields) + 4, capacity)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by an ingest process that did not shut down cleanly
+            logger.warning(f"Replacing stale shared memory '{name}'")
+            stale = _attach(name, untrack=False)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray(HEADER_SLOTS, dtype=np.int64, buffer=shm.buf)
+        header[1] = capacity
+        JSONSlot(header, LABELS_GEN, shm.buf[LABELS_OFFSET:STATUS_OFFSET]).write(
+            {'fields': fields, 'labels': [], 'devices': []})
+        # Written last, so a worker attaching early never sees a half-initialised ring
+        header[0] = MAGIC
+        del header
+        return cls(shm, fields)
+
+    @classmethod
+    def attach(cls, name, untrack=True):
+        """Map an existing ring; untrack=False in processes started by its creator
+        through multiprocessing (see _attach)."""
+        return cls(_attach(name, untrack))
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def _publish_labels(self):
+        self._labels_slot.write({'fields': self.fields, 'labels': self.labels, 'devices': self.devices})
+
+    def _sync_labels(self):
+        state = self._labels_slot.read()
+        if len(state['labels']) != len(self.labels):
+            self.labels = state['labels']
+            self._label_codes = {label: i for i, label in enumerate(self.labels)}
+        if len(state['devices']) != len(self.devices):
+            self.devices = state['devices']
+            self._device_codes = {device: i for i, device in enumerate(self.devices)}
+
+    def append(self, values, status='Unknown', timestamp=None, device=None, prediction=None):
+        row = [time.time() if timestamp is None else timestamp]
+        row.extend(values[f] for f in self.fields)
+        with self._write_lock:
+            known = len(self.labels), len(self.devices)
+            row.append(self._code(status, self.labels, self._label_codes))
+            row.append(self._code(device, self.devices, self._device_codes))
+            row.append(-1 if prediction is None else self._code(prediction, self.labels, self._label_codes))
+            if (len(self.labels), len(self.devices)) != known:
+                # Before the row, so a reader that sees the row can decode it
+                self._publish_labels()
+            seq = self._count
+            self._data[seq % self.capacity] = row
+            self._count = seq + 1
+        return seq
+
+    def _read(self, pick, retries=10):
+        rows, start = super()._read(pick, retries)
+        # Codes in the copied rows were published before the count that exposed them
+        self._sync_labels()
+        return rows, start
+
+    def decode_predictions(self, rows):
+        labels = self.labels
+        return [labels[int(c)] if c >= 0 else None for c in rows[:, self._prediction_col]]
+
+    def publish_status(self, status):
+        self._status_slot.write(status)
+
+    def status(self):
+        return self._status_slot.read()
+
+    def close(self):
+        # Every view into the segment has to go before it can be unmapped
+        self._data = self._counter = self._header = None
+        self._labels_slot.release()
+        self._status_slot.release()
+        self._ring_view.release()
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
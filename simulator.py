@@ -0,0 +1,297 @@
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from functools import partial
+
+import numpy as np
+
+from sensor_protocol import CONTROL_MARKERS, parse_line
+
+# One reading per second per analyser is what the Arduino sketch produces (speed 1x)
+BASE_INTERVAL = 1.0
+STAGES = ('parse', 'buffer', 'predict', 'commit')
+
+
+def format_line(ta, temp, ph, cond, status):
+    return f"TA={ta:.3f},Temp={temp:.1f},pH={ph:.2f},Conductivity={cond:.2f},Status={status}"
+
+
+def replay_lines(path='milk_data.csv', loop=True):
+    """Protocol lines rebuilt from the readings in milk_data.csv, in file order."""
+    rows = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                values = [float(row[k]) for k in ('titrable_acidity', 'temperature', 'pH', 'conductivity')]
+            except (TypeError, ValueError):
+                continue
+            rows.append(format_line(*values, (row.get('status') or 'Unknown').strip().capitalize()))
+    if not rows:
+        raise ValueError(f"no readings in {path}")
+    while True:
+        yield from rows
+        if not loop:
+            return
+
+
+def synthetic_lines(seed=42):
+    """A random walk around typical fresh-milk values, drifting towards spoilage."""
+    rng = random.Random(seed)
+    ta, temp, ph, cond = 0.15, 24.0, 6.6, 1.0
+    while True:
+        ta = min(max(ta + rng.gauss(0.0002, 0.002), 0.10), 0.45)
+        temp = min(max(temp + rng.gauss(0, 0.1), 4.0), 40.0)
+        ph = min(max(ph + rng.gauss(-0.0005, 0.01), 5.8), 7.0)
+        cond = min(max(cond + rng.gauss(0.0005, 0.01), 0.5), 3.0)
+        yield format_line(ta, temp, ph, cond, 'Simulated')
+
+
+class NullConnection:
+    """Stands in for MySQL so the rest of the pipeline can be measured on its own."""
+
+    def cursor(self):
+        return self
+
+    def executemany(self, sql, rows):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    values = np.asarray(samples) * 1000
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'n': len(values), 'p50_ms': p50, 'p90_ms': p90, 'p99_ms': p99, 'max_ms': values.max()}
+
+
+class Simulation:
+    """Drives insert_data's ingest pipeline with simulated analysers and times every
+    reading from the moment its line is sent:
+
+        parse   -> line parsed into a Reading
+        buffer  -> appended to the ring buffer (what /api/realtime and SSE read)
+        predict -> model prediction for the reading
+        commit  -> its batch committed by the sensor writer
+
+    Lines go through a pty per device and the real SerialIngest loop ('pty'), or are
+    handed straight to the line handler from the sending thread ('direct'). Rows written
+    to a database are stored with status 'Simulated' and is_simulated set, so training
+    never takes them for real readings; device ids are prefixed 'sim-', so they can be
+    removed afterwards with DELETE FROM milk_test WHERE device_id LIKE 'sim-%'.
+    """
+
+    def __init__(self, lines, speed=1.0, devices=1, transport='pty', db='null', csv_path=None):
+        from config import CONFIG
+
+        # The live service may be running on this checkout: leave its archive alone
+        CONFIG['archive']['readonly'] = True
+        import insert_data
+        from db_pool import ConnectionPool
+        from sensor_writer import SensorWriter, insert_wide
+        import rollups
+        from storage import get_backend
+
+        # The service loads its models in the warm-up; the replay needs them at once
+        insert_data.MODEL_REGISTRY.load_all()
+        self.app = insert_data
+        self.lines = lines
+        self.speed = speed
+        self.devices = [f'sim-{i + 1}' for i in range(devices)]
+        self.transport = transport
+        self._sent = {device: deque() for device in self.devices}
+        self._committing = {}
+        self._lock = threading.Lock()
+        self.latency = {stage: [] for stage in STAGES}
+        self.rejected = 0
+        self.sent = 0
+
+        if db != 'null':
+            backend = get_backend(db)
+            backend.init_schema()
+            pool = ConnectionPool(backend.connect)
+            get_connection, release = pool.connect, insert_data.release_db_connection
+            on_batch = partial(rollups.update_rollups, dialect=backend.dialect)
+            insert, is_data_error = insert_wide, backend.is_data_error
+            if backend.layout == 'normalised':
+                from bulk_ingest import insert_normalised as insert
+        else:
+            get_connection, release, on_batch = NullConnection, lambda conn: None, None
+            insert, is_data_error = insert_wide, None
+        self.csv_path = csv_path or os.path.join(tempfile.mkdtemp(prefix='milk-sim-'), 'milk_data.csv')
+        # The writer is swapped for one that records commit times and keeps the
+        # simulated rows out of the real milk_data.csv
+        self.writer = SensorWriter(get_connection, release, csv_path=self.csv_path,
+                                   on_batch=on_batch, on_commit=self._on_commit, insert=insert,
+                                   is_data_error=is_data_error,
+                                   dead_letter_path=os.path.join(os.path.dirname(self.csv_path),
+                                                                 'rejected_readings.csv'))
+        insert_data.SENSOR_WRITER = self.writer
+        self._clock = datetime.now()
+
+    def _created_at(self):
+        # Unique timestamps, so a committed row maps back to exactly one sent line
+        with self._lock:
+            self._clock = max(datetime.now(), self._clock + timedelta(microseconds=1))
+            return self._clock
+
+    def handle_line(self, device_id, line):
+        # Mirrors insert_data.handle_serial_line with a timestamp after each stage
+        reading = parse_line(line, device_id)
+        if reading is None:
+            if not any(marker in line for marker in CONTROL_MARKERS):
+                # Keep the sent-time queue aligned with the lines
+                self._sent[device_id].popleft()
+                self.rejected += 1
+            return
+        sent_at = self._sent[device_id].popleft()
+        parsed = time.perf_counter()
+        if not reading.is_finite:
+            self.rejected += 1
+            return
+        reading.created_at = self._created_at()
+        self.app.buffer_sensor_data(reading)
+        buffered = time.perf_counter()
+        self.app.predict_reading(list(reading.values))
+        predicted = time.perf_counter()
+        with self._lock:
+            self._committing[reading.created_at] = sent_at
+            self.latency['parse'].append(parsed - sent_at)
+            self.latency['buffer'].append(buffered - sent_at)
+            self.latency['predict'].append(predicted - sent_at)
+        # Replayed lines carry real statuses; stored, they must not pass as real readings
+        reading.status = 'Simulated'
+        if not self.app.insert_sensor_data(reading):
+            with self._lock:
+                self._committing.pop(reading.created_at, None)
+
+    def _on_commit(self, rows):
+        now = time.perf_counter()
+        with self._lock:
+            for row in rows:
+                sent_at = self._committing.pop(row[5], None)
+                if sent_at is not None:
+                    self.latency['commit'].append(now - sent_at)
+
+    def run(self, duration=10.0):
+        ingest = None
+        masters = {}
+        if self.transport == 'pty':
+            from serial_ingest import SerialIngest, open_pty
+
+            ports = []
+            for device in self.devices:
+                master, path = open_pty()
+                masters[device] = master
+                ports.append({'device_id': device, 'port': path})
+            ingest = SerialIngest(ports, self.handle_line)
+            ingest.start()
+            # pyserial drops pending input on open, so wait for every port first
+            while not all(port.stats['connected'] for port in ingest.ports):
+                time.sleep(0.01)
+            for master in masters.values():
+                os.write(master, b"SIMULATION_MODE\r\n")
+
+        self.writer.start()
+        interval = BASE_INTERVAL / self.speed
+        start = time.perf_counter()
+        deadline = start + duration
+        tick = 0
+        while True:
+            due = start + tick * interval
+            if due >= deadline:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            for device in self.devices:
+                line = next(self.lines)
+                self._sent[device].append(time.perf_counter())
+                if ingest is not None:
+                    os.write(masters[device], line.encode() + b"\r\n")
+                else:
+                    self.handle_line(device, line)
+                self.sent += 1
+            tick += 1
+        send_time = time.perf_counter() - start
+
+        # Let the ingest thread and the writer drain what was sent
+        drain_deadline = time.perf_counter() + 30
+        while time.perf_counter() < drain_deadline:
+            with self._lock:
+                done = len(self.latency['parse']) + self.rejected >= self.sent and not self._committing
+            if done:
+                break
+            time.sleep(0.05)
+        if ingest is not None:
+            ingest.stop()
+            for master in masters.values():
+                os.close(master)
+        self.writer.stop()
+
+        return {
+            'speed': self.speed,
+            'devices': len(self.devices),
+            'transport': self.transport,
+            'target_rate': len(self.devices) * self.speed / BASE_INTERVAL,
+            'sent': self.sent,
+            'send_rate': self.sent / send_time if send_time else None,
+            'processed': len(self.latency['parse']),
+            'committed': len(self.latency['commit']),
+            'rejected': self.rejected,
+            'writer': self.writer.snapshot(),
+            'latency': {stage: percentiles(samples) for stage, samples in self.latency.items()},
+        }
+
+
+def print_report(report):
+    print(f"\n{report['transport']} x{report['speed']:g} ({report['devices']} device(s), "
+          f"target {report['target_rate']:,.0f}/s, sent {report['sent']} at {report['send_rate']:,.0f}/s, "
+          f"committed {report['committed']}, dropped {report['writer']['dropped']})")
+    for stage in STAGES:
+        stats = report['latency'][stage]
+        if stats:
+            print(f"  {stage:<8} p50 {stats['p50_ms']:8.2f} ms  p90 {stats['p90_ms']:8.2f} ms  "
+                  f"p99 {stats['p99_ms']:8.2f} ms  max {stats['max_ms']:8.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay or synthesise sensor traffic through the ingest pipeline")
+    parser.add_argument('--source', choices=['replay', 'synthetic'], default='replay')
+    parser.add_argument('--csv', default='milk_data.csv', help="readings to replay")
+    parser.add_argument('--speeds', default='1,10,100,1000',
+                        help="comma-separated multiples of the real rate (1 reading/s per device)")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds of traffic per speed")
+    parser.add_argument('--devices', type=int, default=1)
+    parser.add_argument('--transport', choices=['pty', 'direct'], default='pty')
+    parser.add_argument('--db', choices=['null', 'mysql', 'sqlite'], default='null',
+                        help="'null' measures everything but the database; 'mysql'/'sqlite' write "
+                             "to CONFIG['db'] / CONFIG['storage']['sqlite_path']")
+    parser.add_argument('--json', help="also write the reports to this file")
+    args = parser.parse_args()
+
+    reports = []
+    for speed in [float(s) for s in args.speeds.split(',')]:
+        lines = replay_lines(args.csv) if args.source == 'replay' else synthetic_lines()
+        simulation = Simulation(lines, speed, args.devices, args.transport, args.db)
+        report = simulation.run(args.duration)
+        print_report(report)
+        reports.append(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2, default=float)
@@ -0,0 +1,141 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Backoff between retries of required stages that failed, e.g. MySQL down at boot
+RETRY_MIN_SECONDS = 1.0
+RETRY_MAX_SECONDS = 60.0
+
+
+class StartupTracker:
+    """Per-stage timings of service start-up, readable while it is still going.
+
+    Stages are timed where they run: module-level set-up on the main thread, and the
+    warm-up (heavy imports, model loading, DB connections) either before the server
+    listens or on a background thread so / and the health checks answer at once.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._stages = {}
+        self._imports = {}
+        self._events = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._retry_thread = None
+
+    def _offset(self):
+        return time.perf_counter() - self.started
+
+    @contextmanager
+    def stage(self, name):
+        record = {'status': 'running', 'start_s': self._offset(), 'seconds': None, 'error': None,
+                  'thread': threading.current_thread().name}
+        with self._lock:
+            self._stages[name] = record
+        start = time.perf_counter()
+        try:
+            yield record
+            record['status'] = 'done'
+        except Exception as e:
+            record['status'] = 'failed'
+            record['error'] = str(e)
+            raise
+        finally:
+            record['seconds'] = time.perf_counter() - start
+
+    def mark(self, event):
+        """Record when something happened, e.g. 'listening'."""
+        self._events[event] = self._offset()
+
+    def import_modules(self, names):
+        # Cumulative time per module, like the second column of `python -X importtime`;
+        # a module something earlier already pulled in costs ~0
+        for name in names:
+            already = name in sys.modules
+            start = time.perf_counter()
+            importlib.import_module(name)
+            self._imports[name] = {'seconds': time.perf_counter() - start, 'cached': already}
+
+    def run(self, steps, required=None, retry=True):
+        """Run (name, fn) steps in order; a failing step is logged and the rest still run.
+        The service only becomes ready if every `required` step (all by default) succeeded;
+        failed required steps are retried with backoff in the background until they do."""
+        required = {name for name, _ in steps} if required is None else set(required)
+        for name, fn in steps:
+            if self._stages.get(name, {}).get('status') == 'done':
+                continue
+            try:
+                with self.stage(name):
+                    fn()
+            except Exception as e:
+                logger.error(f"Startup stage '{name}' failed: {e}")
+                if name in required:
+                    with self._lock:
+                        self._failed[name] = str(e)
+                continue
+            with self._lock:
+                self._failed.pop(name, None)
+        with self._lock:
+            failed = dict(self._failed)
+        if failed:
+            self.mark('failed')
+            logger.error(f"Start-up finished after {self._offset():.2f}s without {', '.join(failed)}; not ready")
+            if retry:
+                self._retry_thread = threading.Thread(target=self._retry, args=(steps, required),
+                                                      name='startup-retry', daemon=True)
+                self._retry_thread.start()
+            return
+        self._ready.set()
+        self.mark('ready')
+        logger.info(f"Start-up complete after {self._offset():.2f}s")
+
+    def _retry(self, steps, required):
+        delay = RETRY_MIN_SECONDS
+        while not self._ready.is_set():
+            time.sleep(delay)
+            with self._lock:
+                failed = set(self._failed)
+            logger.info(f"Retrying start-up stages: {', '.join(sorted(failed))}")
+            self.run([step for step in steps if step[0] in failed], required, retry=False)
+            delay = min(delay * 2, RETRY_MAX_SECONDS)
+
+    def run_background(self, steps, required=None):
+        self._thread = threading.Thread(target=self.run, args=(steps, required), name='warm-up', daemon=True)
+        self._thread.start()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    @property
+    def failed(self):
+        """Required stages that failed, with their errors."""
+        with self._lock:
+            return dict(self._failed)
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def snapshot(self):
+        with self._lock:
+            stages = {name: dict(record) for name, record in self._stages.items()}
+        return {
+            'ready': self.ready,
+            'failed': self.failed,
+            'uptime_s': self._offset(),
+            'events': dict(self._events),
+            'stages': stages,
+            'imports': dict(self._imports),
+        }
+
+
+# Created when insert_data starts importing, so offsets are from the start of the service
+STARTUP = StartupTracker()
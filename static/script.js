@@ -1,8 +1,11 @@
 // Configuration
 const config = {
-    updateInterval: 2000, // 2 seconds
+    updateInterval: 2000, // 2 seconds, only used when EventSource is unavailable
+    historicalInterval: 60000,
+    maxPoints: 20,
     apiEndpoints: {
         realtime: '/api/realtime',
+        stream: '/api/stream',
         historical: '/api/data',
         systemStatus: '/api/system/status'
     }
@@ -156,9 +159,63 @@ function initializeCharts() {
     });
 }
 
+// Latest readings received from the stream, oldest first
+const series = {
+    nextSeq: 0,
+    time: [], ta: [], temp: [], ph: [], cond: [], status: [],
+    prediction: null
+};
+
 function startDataUpdates() {
-    updateData();
-    setInterval(updateData, config.updateInterval);
+    fetchHistoricalData();
+    setInterval(fetchHistoricalData, config.historicalInterval);
+
+    if (!window.EventSource) {
+        updateData();
+        setInterval(updateData, config.updateInterval);
+        return;
+    }
+
+    const source = new EventSource(`${config.apiEndpoints.stream}?limit=${config.maxPoints}`);
+
+    source.onopen = () => clearConnectionError();
+
+    source.addEventListener('snapshot', event => {
+        const data = JSON.parse(event.data);
+        clearConnectionError();
+        ['time', 'ta', 'temp', 'ph', 'cond', 'status'].forEach(key => {
+            series[key] = data[key];
+        });
+        series.nextSeq = data.seq;
+        series.prediction = data.prediction;
+        renderData(series);
+    });
+
+    source.addEventListener('reading', event => {
+        const reading = JSON.parse(event.data);
+        // The stream may repeat readings already contained in the snapshot
+        if (reading.seq < series.nextSeq) return;
+        series.nextSeq = reading.seq + 1;
+        ['time', 'ta', 'temp', 'ph', 'cond', 'status'].forEach(key => {
+            series[key].push(reading[key]);
+            if (series[key].length > config.maxPoints) series[key].shift();
+        });
+        series.prediction = reading.prediction;
+        renderData(series);
+    });
+
+    source.onerror = () => {
+        // EventSource reconnects on its own; just surface the state
+        document.getElementById('connectionAlert').className = 'alert alert-danger alert-dismissible fade show mb-0';
+        document.getElementById('connectionStatus').textContent = 'Connection Error';
+        document.getElementById('connectionDetails').textContent = 'Reconnecting to live stream...';
+    };
+}
+
+function clearConnectionError() {
+    document.getElementById('connectionAlert').className = 'alert alert-success alert-dismissible fade show mb-0';
+    document.getElementById('connectionStatus').textContent = 'Connected';
+    document.getElementById('connectionDetails').textContent = 'Receiving live readings';
 }
 
 function updateData() {
@@ -166,27 +223,7 @@ function updateData() {
 
     fetch(config.apiEndpoints.realtime)
         .then(response => response.json())
-        .then(data => {
-            document.getElementById('lastUpdateTime').textContent =
-                new Date(data.timestamp).toLocaleTimeString();
-
-            if (data.ta.length > 0) {
-                document.getElementById('taValue').textContent = data.ta[data.ta.length - 1].toFixed(3);
-                document.getElementById('tempValue').textContent = data.temp[data.temp.length - 1].toFixed(1);
-                document.getElementById('phValue').textContent = data.ph[data.ph.length - 1].toFixed(2);
-                document.getElementById('condValue').textContent = data.cond[data.cond.length - 1].toFixed(2);
-                document.getElementById('dataStatus').textContent = `Status: ${data.status[data.status.length - 1]}`;
-            }
-
-            updateChartData(charts.ta, data.time, data.ta);
-            updateChartData(charts.temp, data.time, data.temp);
-            updateChartData(charts.ph, data.time, data.ph);
-            updateChartData(charts.cond, data.time, data.cond);
-
-            updateCombinedChart(data);
-            updateDataTable(data);
-            document.getElementById('loadingIndicator').style.display = 'none';
-        })
+        .then(data => renderData(data))
         .catch(error => {
             console.error('Error fetching real-time data:', error);
             document.getElementById('connectionAlert').className = 'alert alert-danger alert-dismissible fade show mb-0';
@@ -194,7 +231,31 @@ function updateData() {
             document.getElementById('connectionDetails').textContent = error.message;
             document.getElementById('loadingIndicator').style.display = 'none';
         });
+}
+
+function renderData(data) {
+    document.getElementById('lastUpdateTime').textContent =
+        data.timestamp ? new Date(data.timestamp).toLocaleTimeString() : new Date().toLocaleTimeString();
+
+    if (data.ta.length > 0) {
+        document.getElementById('taValue').textContent = data.ta[data.ta.length - 1].toFixed(3);
+        document.getElementById('tempValue').textContent = data.temp[data.temp.length - 1].toFixed(1);
+        document.getElementById('phValue').textContent = data.ph[data.ph.length - 1].toFixed(2);
+        document.getElementById('condValue').textContent = data.cond[data.cond.length - 1].toFixed(2);
+        document.getElementById('dataStatus').textContent = `Status: ${data.status[data.status.length - 1]}`;
+    }
+
+    updateChartData(charts.ta, data.time, data.ta);
+    updateChartData(charts.temp, data.time, data.temp);
+    updateChartData(charts.ph, data.time, data.ph);
+    updateChartData(charts.cond, data.time, data.cond);
+
+    updateCombinedChart(data);
+    updateDataTable(data);
+    document.getElementById('loadingIndicator').style.display = 'none';
+}
 
+function fetchHistoricalData() {
     fetch(config.apiEndpoints.historical)
         .then(response => response.json())
         .then(data => {
@@ -0,0 +1,336 @@
+import argparse
+import functools
+import logging
+import math
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('mysql', 'sqlite')
+
+# FROM clause exposing the wide milk_test columns (titrable_acidity, temperature, pH,
+# conductivity, status, is_simulated, device_id, created_at) for each layout, so
+# queries over readings are written once. The normalised derived table is merged
+# into the outer query by MySQL, so filters on created_at still use idx_created.
+READINGS_SQL = {
+    'wide': 'milk_test',
+    'normalised': """(
+            SELECT m.id, m.titrable_acidity, t.temperature_value AS temperature, p.ph_value AS pH,
+                   c.conductivity_value AS conductivity, m.status, m.is_simulated, m.device_id,
+                   m.created_at
+            FROM milk_test m
+            JOIN conductivity c ON c.milk_test_id = m.id
+            LEFT JOIN temperature t ON t.milk_test_id = m.id
+            LEFT JOIN ph p ON p.milk_test_id = m.id
+        ) AS readings""",
+}
+
+# MySQL errors caused by the rows themselves rather than the server or connection.
+# CHECK violations (3819) and truncated ENUM/values (1265) come back as a plain
+# DatabaseError, so the class alone is not enough.
+MYSQL_DATA_ERRNOS = frozenset((
+    1048,  # column cannot be null
+    1062,  # duplicate key
+    1264,  # out of range value
+    1265,  # data truncated (e.g. unknown ENUM value)
+    1366,  # incorrect value
+    1406,  # data too long
+    1452,  # foreign key
+    3819,  # check constraint violated
+    4025,  # check constraint violated (MariaDB)
+))
+
+# Append-heavy ingest: WAL lets dashboards read while the writer commits, and with
+# WAL, synchronous=NORMAL only fsyncs at checkpoints yet stays consistent after a crash
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA wal_autocheckpoint=4000',
+)
+
+_ROLLUP_COLUMNS = ',\n    '.join(
+    f"{m}_sum REAL NOT NULL DEFAULT 0, {m}_min REAL, {m}_max REAL, {m}_sumsq REAL NOT NULL DEFAULT 0"
+    for m in ('ta', 'temp', 'ph', 'cond')
+)
+
+# The wide milk_test layout (milk_partitioning.sql) and the rollup tables. The
+# created_at index covers every column the history and rollup queries read, so time
+# range scans never touch the table itself.
+SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS milk_test (
+    id INTEGER PRIMARY KEY,
+    created_at DATETIME NOT NULL,
+    device_id TEXT,
+    status TEXT NOT NULL DEFAULT 'Unknown',
+    is_simulated INTEGER NOT NULL DEFAULT 0,
+    titrable_acidity REAL NOT NULL,
+    temperature REAL,
+    pH REAL,
+    conductivity REAL
+);
+CREATE INDEX IF NOT EXISTS idx_created
+    ON milk_test (created_at, titrable_acidity, temperature, pH, conductivity, status);
+CREATE INDEX IF NOT EXISTS idx_device_created ON milk_test (device_id, created_at);
+
+CREATE TABLE IF NOT EXISTS milk_rollup_minute (
+    bucket_start DATETIME NOT NULL,
+    status TEXT NOT NULL DEFAULT 'Unknown',
+    n INTEGER NOT NULL DEFAULT 0,
+    {_ROLLUP_COLUMNS},
+    PRIMARY KEY (bucket_start, status)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS milk_rollup_hour (
+    bucket_start DATETIME NOT NULL,
+    status TEXT NOT NULL DEFAULT 'Unknown',
+    n INTEGER NOT NULL DEFAULT 0,
+    {_ROLLUP_COLUMNS},
+    PRIMARY KEY (bucket_start, status)
+) WITHOUT ROWID;
+"""
+
+# Datetimes are stored as ISO text, which sorts chronologically
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+
+
+def _as_datetime(value):
+    return value if isinstance(value, datetime) or value is None else datetime.fromisoformat(value)
+
+
+def _unix_timestamp(value):
+    value = _as_datetime(value)
+    return None if value is None else value.timestamp()
+
+
+def _date_format(value, fmt):
+    value = _as_datetime(value)
+    # The MySQL specifiers the queries use that strftime spells differently
+    return None if value is None else value.strftime(fmt.replace('%i', '%M').replace('%s', '%S'))
+
+
+def _nullable(fn):
+    return lambda *args: None if any(a is None for a in args) else fn(*args)
+
+
+# MySQL functions used by history.py and rollups.py, so their SQL runs unchanged
+SQLITE_FUNCTIONS = (
+    ('UNIX_TIMESTAMP', 1, _unix_timestamp),
+    ('DATE_FORMAT', 2, _date_format),
+    ('FLOOR', 1, _nullable(math.floor)),
+    ('SQRT', 1, _nullable(math.sqrt)),
+    ('POW', 2, _nullable(math.pow)),
+    ('GREATEST', -1, _nullable(max)),
+    ('LEAST', -1, _nullable(min)),
+)
+
+_PARAM_RE = re.compile(r'%([s%])')
+
+
+@functools.lru_cache(maxsize=256)
+def _translate(sql):
+    # mysql.connector paramstyle (%s, %% for a literal %) -> sqlite3 qmark
+    return _PARAM_RE.sub(lambda m: '?' if m.group(1) == 's' else '%', sql)
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that accepts the %s-style SQL written for mysql.connector."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=None):
+        # Like mysql.connector, SQL without params is sent untouched
+        if params is None:
+            self._cursor.execute(sql)
+        else:
+            self._cursor.execute(_translate(sql), params)
+
+    def executemany(self, sql, rows):
+        self._cursor.executemany(_translate(sql), rows)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """The subset of the mysql.connector connection API the pool, the writer and the
+    query helpers use."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        # The sqlite3 connection itself, for SQLAlchemy (see SQLiteEngineConnection)
+        self.dbapi = conn
+
+    def cursor(self, **kwargs):
+        # buffered/dictionary cursors are mysql.connector options; sqlite3 always streams
+        return SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self):
+        self._conn.execute('SELECT 1')
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteEngineConnection:
+    """What SQLAlchemy gets from a pooled SQLite connection: the sqlite3 connection
+    underneath (SQLAlchemy writes its own qmark SQL), with close() handing the pooled
+    connection back."""
+
+    def __init__(self, conn):
+        self._pooled = conn
+        self._dbapi = conn.dbapi
+
+    def __getattr__(self, name):
+        return getattr(self._dbapi, name)
+
+    def close(self):
+        self._pooled.close()
+
+
+class SQLiteBackend:
+    """Embedded storage for ingest boxes without a MySQL server. One file, the wide
+    layout, WAL journaling; the writer's batches are its transactions and sqlite3's
+    statement cache keeps the INSERT prepared between them."""
+    name = 'sqlite'
+    dialect = 'sqlite'
+    layout = 'wide'
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path, tuned=True):
+        self.path = path
+        # tuned=False keeps SQLite's defaults (rollback journal, synchronous=FULL)
+        self.tuned = tuned
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=False, cached_statements=256)
+        if self.tuned:
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(pragma)
+        for name, n_args, fn in SQLITE_FUNCTIONS:
+            conn.create_function(name, n_args, fn, deterministic=True)
+        return SQLiteConnection(conn)
+
+    def init_schema(self):
+        conn = self.connect()
+        try:
+            conn._conn.executescript(SQLITE_SCHEMA)
+        finally:
+            conn.close()
+
+    def is_data_error(self, error):
+        # NOT NULL / CHECK / UNIQUE violations
+        return isinstance(error, (sqlite3.IntegrityError, sqlite3.DataError))
+
+    def url(self, driver=None):
+        return f"sqlite:///{os.path.abspath(self.path)}"
+
+    def create_engine(self, creator=None):
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import NullPool
+
+        if creator is None:
+            return create_engine(self.url())
+        # NullPool so checkin goes straight back to the caller's pool
+        return create_engine('sqlite://', creator=lambda: SQLiteEngineConnection(creator()), poolclass=NullPool)
+
+
+class MySQLBackend:
+    name = 'mysql'
+    dialect = 'mysql'
+
+    def __init__(self, db=None, layout=None):
+        import mysql.connector
+
+        self._connector = mysql.connector
+        self.db = db or CONFIG['db']
+        self.layout = layout or CONFIG['storage']['layout']
+        self.errors = (mysql.connector.Error,)
+
+    def connect(self):
+        return self._connector.connect(**self.db)
+
+    def init_schema(self):
+        # Managed by milk_sensor_data.sql / milk_partitioning.sql
+        pass
+
+    def is_data_error(self, error):
+        connector = self._connector
+        return (isinstance(error, (connector.DataError, connector.IntegrityError))
+                or getattr(error, 'errno', None) in MYSQL_DATA_ERRNOS)
+
+    def url(self, driver='pymysql'):
+        db = self.db
+        return f"mysql+{driver}://{db['user']}:{db['password']}@{db['host']}/{db['database']}"
+
+    def create_engine(self, creator=None):
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import NullPool
+
+        if creator is None:
+            return create_engine(self.url())
+        # NullPool so checkin goes straight back to the caller's pool
+        return create_engine('mysql+mysqlconnector://', creator=creator, poolclass=NullPool)
+
+
+def get_backend(name=None):
+    """The storage backend named in CONFIG['storage']['backend'] (or `name`)."""
+    name = name or CONFIG['storage']['backend']
+    if name == 'sqlite':
+        # Relative to the code, like the archive, so the service and the tools open the
+        # same file whatever their working directory
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), CONFIG['storage']['sqlite_path'])
+        return SQLiteBackend(path)
+    if name == 'mysql':
+        return MySQLBackend()
+    raise ValueError(f"Unknown storage backend {name!r}; expected one of {BACKENDS}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Create the schema of the configured storage backend")
+    parser.add_argument('--backend', choices=BACKENDS)
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend)
+    backend.init_schema()
+    print(f"{backend.name} storage ready" + (f" at {backend.path}" if backend.name == 'sqlite' else ''))
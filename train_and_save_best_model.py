@@ -1,21 +1,23 @@
 import pandas as pd
-import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.svm import SVC
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, classification_report
-import joblib
+from data_loading import iter_csv_chunks, normalise_status, reservoir_sample
+from model_bundle import BUNDLE_PATH, ModelBundle, make_pipeline, save_bundle
+from model_selection import Candidate, refit_best, select_model
 
-# Load dataset
-df = pd.read_csv('cleaned_milk_data.csv')
-
-# Convert 'status' to lowercase
-df['status'] = df['status'].str.lower()
+# Upper bound on rows held in memory; longer histories are uniformly sampled
+SAMPLE_SIZE = 500000
 
-# Keep only the rows where status is 'bad', 'spoiled', or 'acceptable'
+# Keep only the rows where status is 'bad', 'spoiled', or 'acceptable' (lowercased)
 valid_status = ['bad', 'spoiled', 'acceptable']
-df = df[df['status'].isin(valid_status)]
+
+# Load dataset
+chunks = (normalise_status(chunk, valid_status, case='lower')
+          for chunk in iter_csv_chunks('cleaned_milk_data.csv'))
+df = reservoir_sample(chunks, SAMPLE_SIZE)
 
 # Drop rows with NaN values (if any)
 df = df.dropna()
@@ -24,34 +26,52 @@ df = df.dropna()
 X = df[['titrable_acidity', 'temperature', 'pH', 'conductivity']]
 y = df['status'].map({'bad': 0, 'spoiled': 1, 'acceptable': 2})
 
-# Split data
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Initialize models
-models = {
-    'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42),
-    'SVM': SVC(random_state=42),
-    'Logistic Regression': LogisticRegression(max_iter=1000, random_state=42),
-    'Gradient Boosting': GradientBoostingClassifier(random_state=42)
-}
-
-# Train and Evaluate models
-accuracies = {}
-
-for name, model in models.items():
-    model.fit(X_train, y_train)
-    predictions = model.predict(X_test)
-    
-    acc = accuracy_score(y_test, predictions)
-    accuracies[name] = acc
-    
-    print(f"\n{name} Accuracy: {acc:.4f}")
-    print(f"{name} Classification Report:")
-    print(classification_report(y_test, predictions, zero_division=1))  # Added zero_division=1 to suppress warnings
-
-# Select and save the best model
-best_model_name = max(accuracies, key=accuracies.get)
-best_model = models[best_model_name]
-joblib.dump(best_model, 'best_milk_quality_model.pkl')
-
-print(f"\nBest model ({best_model_name}) saved as 'best_milk_quality_model.pkl'")
+# Hold out 20% for a final report on the winner; model selection only sees the rest
+X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+# Candidate models and hyperparameter grids; scaled=True candidates get standardised folds
+candidates = [
+    Candidate('Random Forest', RandomForestClassifier(random_state=42),
+              {'n_estimators': [50, 100], 'max_depth': [None, 8]}),
+    Candidate('SVM', SVC(random_state=42), {'C': [0.1, 1, 10]}, scaled=True),
+    Candidate('Logistic Regression', LogisticRegression(max_iter=1000, random_state=42),
+              {'C': [0.1, 1, 10]}, scaled=True),
+    Candidate('Gradient Boosting', GradientBoostingClassifier(random_state=42),
+              {'n_estimators': [100], 'max_depth': [2, 3]}),
+]
+
+# 5-fold CV across a process pool; hopeless configs are pruned after the first fold
+leaderboard, ranked = select_model(X_train, y_train, candidates, n_splits=5, n_jobs=-1)
+leaderboard.to_csv('model_leaderboard.csv', index=False)
+
+with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.max_colwidth', 40):
+    print("\nLeaderboard (cross-validated, best first):")
+    print(leaderboard[['model', 'params', 'accuracy_mean', 'accuracy_std', 'fit_s',
+                       'predict_row_us', 'predict_batch_us_per_row', 'pruned']])
+
+# Hold-out report for the winner
+best_model_name = leaderboard.loc[0, 'model']
+holdout_model = refit_best(ranked[0], X_train, y_train)
+predictions = holdout_model.predict(X_test)
+print(f"\n{best_model_name} hold-out Accuracy: {accuracy_score(y_test, predictions):.4f}")
+print(f"{best_model_name} Classification Report:")
+print(classification_report(y_test, predictions, zero_division=1))  # Added zero_division=1 to suppress warnings
+
+# Refit the winner on all data and save it as the production bundle
+best_model = refit_best(ranked[0], X, y)
+bundle = ModelBundle(
+    make_pipeline(best_model),
+    features=list(X.columns),
+    labels=valid_status,
+    metadata={
+        'source': 'train_and_save_best_model.py',
+        'model': best_model_name,
+        'params': leaderboard.loc[0, 'params'],
+        'cv_accuracy': float(leaderboard.loc[0, 'accuracy_mean']),
+        'training_rows': len(X),
+    }
+)
+save_bundle(bundle, BUNDLE_PATH)
+
+print(f"\nBest model ({best_model_name}) saved as bundle v{bundle.version} in '{BUNDLE_PATH}'")
+print("Leaderboard saved to 'model_leaderboard.csv'")
@@ -1,24 +1,19 @@
 # train_model.py
 
 import pandas as pd
-import pymysql
-from sqlalchemy import create_engine
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report
-import joblib
+from data_loading import iter_sql_chunks, reservoir_sample
+from model_bundle import BUNDLE_PATH, ModelBundle, make_pipeline, save_bundle
 
-# Database connection
-db_connection_str = 'mysql+pymysql://root:@localhost/milk_sensor_data'  # Updated database name
-engine = create_engine(db_connection_str)
+# Upper bound on rows held in memory; history beyond this is uniformly sampled
+SAMPLE_SIZE = 500000
 
-# Load dataset
-df = pd.read_sql('SELECT * FROM milk_test', con=engine)
-
-# Optional: drop ID column
-if 'id' in df.columns:
-    df = df.drop(columns=['id'])
+# Load dataset: stream milk_test through a server-side cursor, keep a bounded sample
+df = reservoir_sample(iter_sql_chunks(), SAMPLE_SIZE)
+df = df.dropna()
 
 # Feature and target (Update here)
 X = df[['titrable_acidity', 'temperature', 'pH', 'conductivity']]  # Use all four features
@@ -44,9 +39,13 @@ model.fit(X_train_scaled, y_train)
 y_pred = model.predict(X_test_scaled)
 print(classification_report(y_test, y_pred))
 
-# Save model, scaler, and label encoder
-joblib.dump(model, 'milk_quality_model.pkl')
-joblib.dump(scaler, 'scaler.pkl')
-joblib.dump(label_encoder, 'label_encoder.pkl')  # Save the label encoder
+# Save scaler + model as one pipeline, with the label map, in a single versioned bundle
+bundle = ModelBundle(
+    make_pipeline(model, scaler),
+    features=list(X.columns),
+    labels=label_encoder.classes_,
+    metadata={'source': 'train_model.py', 'training_rows': len(X_train)}
+)
+save_bundle(bundle, BUNDLE_PATH)
 
-print("✅ Model, Scaler, and Label Encoder saved!")
+print(f"✅ Model bundle v{bundle.version} saved as '{BUNDLE_PATH}'!")